@@ -21,12 +21,13 @@ SOURCE_FILES = [
     'pollreactor.c', 'msgblock.c', 'trdispatch.c',
     'kin_cartesian.c', 'kin_corexy.c', 'kin_corexz.c', 'kin_delta.c',
     'kin_deltesian.c', 'kin_polar.c', 'kin_rotary_delta.c', 'kin_winch.c',
-    'kin_extruder.c', 'kin_shaper.c', 'kin_idex.c',
+    'kin_extruder.c', 'kin_shaper.c', 'kin_idex.c', 'stepgen.c',
+    'stepcache.c', 'lookahead.c', 'bulkqueue.c',
 ]
 DEST_LIB = "c_helper.so"
 OTHER_FILES = [
     'list.h', 'serialqueue.h', 'stepcompress.h', 'itersolve.h', 'pyhelper.h',
-    'trapq.h', 'pollreactor.h', 'msgblock.h'
+    'trapq.h', 'pollreactor.h', 'msgblock.h', 'stepcache.h'
 ]
 
 defs_stepcompress = """
@@ -78,6 +79,16 @@ defs_itersolve = """
     void itersolve_set_position(struct stepper_kinematics *sk
         , double x, double y, double z);
     double itersolve_get_commanded_pos(struct stepper_kinematics *sk);
+    void itersolve_set_step_cache(struct stepper_kinematics *sk
+        , struct stepcache *cache);
+
+    struct stepcache *stepcache_alloc(int32_t max_steps);
+    void stepcache_free(struct stepcache *cache);
+
+    struct stepgen_pool *stepgen_pool_alloc(int num_threads);
+    void stepgen_pool_free(struct stepgen_pool *sp);
+    int32_t stepgen_pool_generate(struct stepgen_pool *sp
+        , struct stepper_kinematics **sks, int count, double flush_time);
 """
 
 defs_trapq = """
@@ -87,6 +98,11 @@ defs_trapq = """
         double start_x, start_y, start_z;
         double x_r, y_r, z_r;
     };
+    struct trapq_batch_move {
+        double accel_t, cruise_t, decel_t;
+        double start_pos[4], axes_d[4], axes_r[4];
+        double start_v, cruise_v, accel;
+    };
 
     struct trapq *trapq_alloc(void);
     void trapq_free(struct trapq *tq);
@@ -95,10 +111,14 @@ defs_trapq = """
         , double start_pos_x, double start_pos_y, double start_pos_z
         , double axes_r_x, double axes_r_y, double axes_r_z
         , double start_v, double cruise_v, double accel);
+    double trapq_append_batch(struct trapq *tq, struct trapq *etq
+        , double print_time, struct trapq_batch_move *moves, int count);
     void trapq_finalize_moves(struct trapq *tq, double print_time
         , double clear_history_time);
     void trapq_set_position(struct trapq *tq, double print_time
         , double pos_x, double pos_y, double pos_z);
+    void trapq_set_history_compaction(struct trapq *tq
+        , int compact_history);
     int trapq_extract_old(struct trapq *tq, struct pull_move *p, int max
         , double start_time, double end_time);
 """
@@ -191,10 +211,22 @@ defs_serialqueue = """
     void serialqueue_set_clock_est(struct serialqueue *sq, double est_freq
         , double conv_time, uint64_t conv_clock, uint64_t last_clock);
     void serialqueue_get_stats(struct serialqueue *sq, char *buf, int len);
+    double serialqueue_get_backlog_time(struct serialqueue *sq);
     int serialqueue_extract_old(struct serialqueue *sq, int sentq
         , struct pull_queue_message *q, int max);
 """
 
+defs_lookahead = """
+    struct junction_move {
+        double axes_r[4], move_d, accel, junction_deviation;
+        double max_cruise_v2, delta_v2, smooth_delta_v2, is_kinematic_move;
+    };
+
+    void lookahead_calc_junctions(struct junction_move *moves, int count
+        , double instant_corner_v
+        , double *max_start_v2, double *max_smoothed_v2);
+"""
+
 defs_trdispatch = """
     void trdispatch_start(struct trdispatch *td, uint32_t dispatch_reason);
     void trdispatch_stop(struct trdispatch *td);
@@ -208,6 +240,19 @@ defs_trdispatch = """
         , uint64_t expire_ticks, uint64_t min_extend_ticks);
 """
 
+defs_bulkqueue = """
+    struct bulk_block {
+        uint32_t sequence, len;
+        uint8_t data[56];
+    };
+
+    struct bulkqueue *bulkqueue_alloc(struct serialqueue *sq
+        , uint32_t data_msgtag, uint32_t oid);
+    void bulkqueue_free(struct bulkqueue *bq);
+    int bulkqueue_pull(struct bulkqueue *bq, struct bulk_block **blocks
+        , uint32_t *dropped);
+"""
+
 defs_pyhelper = """
     void set_python_logging_callback(void (*func)(const char *));
     double get_monotonic(void);
@@ -219,7 +264,8 @@ defs_std = """
 
 defs_all = [
     defs_pyhelper, defs_serialqueue, defs_std, defs_stepcompress,
-    defs_itersolve, defs_trapq, defs_trdispatch,
+    defs_itersolve, defs_trapq, defs_lookahead, defs_trdispatch,
+    defs_bulkqueue,
     defs_kin_cartesian, defs_kin_corexy, defs_kin_corexz, defs_kin_delta,
     defs_kin_deltesian, defs_kin_polar, defs_kin_rotary_delta, defs_kin_winch,
     defs_kin_extruder, defs_kin_shaper, defs_kin_idex,
@@ -0,0 +1,168 @@
+// Storage of bulk sensor data messages
+//
+// Copyright (C) 2026  agent <agent@local>
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+//
+// Bulk sensors (eg, accelerometers) report thousands of measurements
+// per second via "sensor_bulk_data" messages.  This code registers a
+// serialqueue fastreader that copies the contents of these messages
+// directly into a buffer, so that the host does not need to parse and
+// queue each message in Python.  Two buffers are used - new messages
+// are added to one while the host code processes the other.  If the
+// host does not process the messages in time, new messages are dropped
+// once BULK_MAX_BLOCKS messages are pending.
+
+#include <pthread.h> // pthread_mutex_lock
+#include <stddef.h> // offsetof
+#include <stdlib.h> // malloc
+#include <string.h> // memset
+#include "compiler.h" // ARRAY_SIZE
+#include "msgblock.h" // message_alloc_and_encode
+#include "pyhelper.h" // report_errno
+#include "serialqueue.h" // serialqueue_add_fastreader
+
+#define BULK_DATA_MAX 56
+#define BULK_INITIAL_BLOCKS 512
+#define BULK_MAX_BLOCKS (BULK_INITIAL_BLOCKS * 64)
+
+struct bulk_block {
+    uint32_t sequence, len;
+    uint8_t data[BULK_DATA_MAX];
+};
+
+struct bulkqueue {
+    struct fastreader fr;
+    struct serialqueue *sq;
+
+    pthread_mutex_t lock; // protects variables below
+    struct bulk_block *blocks, *pull_blocks;
+    int count, alloc, pull_alloc;
+    uint32_t dropped;
+};
+
+// Parse an integer that was encoded as a "variable length quantity"
+static uint32_t
+parse_int(uint8_t **pp)
+{
+    uint8_t *p = *pp, c = *p++;
+    uint32_t v = c & 0x7f;
+    if ((c & 0x60) == 0x60)
+        v |= -0x20;
+    while (c & 0x80) {
+        c = *p++;
+        v = (v<<7) | (c & 0x7f);
+    }
+    *pp = p;
+    return v;
+}
+
+// Handle a sensor_bulk_data message (callback from serialqueue fastreader)
+static void
+handle_bulk_data(struct fastreader *fr, uint8_t *data, int len)
+{
+    struct bulkqueue *bq = container_of(fr, struct bulkqueue, fr);
+
+    // Parse: sensor_bulk_data oid=%c sequence=%hu data=%*s
+    uint8_t *p = &data[MESSAGE_HEADER_SIZE + fr->prefix_len];
+    uint8_t *end = &data[len - MESSAGE_TRAILER_SIZE];
+    uint32_t sequence = parse_int(&p);
+    if (p >= end)
+        return;
+    uint32_t data_len = *p++;
+    if (p + data_len != end || data_len > BULK_DATA_MAX)
+        return;
+
+    // Store message
+    pthread_mutex_lock(&bq->lock);
+    if (bq->count >= bq->alloc) {
+        int alloc = bq->alloc * 2;
+        struct bulk_block *blocks = NULL;
+        if (alloc <= BULK_MAX_BLOCKS)
+            blocks = realloc(bq->blocks, alloc * sizeof(*bq->blocks));
+        if (!blocks) {
+            bq->dropped++;
+            pthread_mutex_unlock(&bq->lock);
+            return;
+        }
+        bq->blocks = blocks;
+        bq->alloc = alloc;
+    }
+    struct bulk_block *b = &bq->blocks[bq->count++];
+    b->sequence = sequence;
+    b->len = data_len;
+    memcpy(b->data, p, data_len);
+    pthread_mutex_unlock(&bq->lock);
+}
+
+// Create a new 'struct bulkqueue' object
+struct bulkqueue * __visible
+bulkqueue_alloc(struct serialqueue *sq, uint32_t data_msgtag, uint32_t oid)
+{
+    struct bulkqueue *bq = malloc(sizeof(*bq));
+    if (!bq)
+        return NULL;
+    memset(bq, 0, sizeof(*bq));
+    int ret = pthread_mutex_init(&bq->lock, NULL);
+    if (ret) {
+        report_errno("bulkqueue_alloc pthread_mutex_init", ret);
+        free(bq);
+        return NULL;
+    }
+    bq->sq = sq;
+    bq->alloc = bq->pull_alloc = BULK_INITIAL_BLOCKS;
+    bq->blocks = malloc(bq->alloc * sizeof(*bq->blocks));
+    bq->pull_blocks = malloc(bq->pull_alloc * sizeof(*bq->pull_blocks));
+    if (!bq->blocks || !bq->pull_blocks) {
+        free(bq->blocks);
+        free(bq->pull_blocks);
+        free(bq);
+        return NULL;
+    }
+
+    // Setup fastreader to match (and consume) sensor_bulk_data messages
+    uint32_t data_prefix[] = {data_msgtag, oid};
+    struct queue_message *dummy = message_alloc_and_encode(
+        data_prefix, ARRAY_SIZE(data_prefix));
+    memcpy(bq->fr.prefix, dummy->msg, dummy->len);
+    bq->fr.prefix_len = dummy->len;
+    free(dummy);
+    bq->fr.func = handle_bulk_data;
+    bq->fr.consume = 1;
+    serialqueue_add_fastreader(sq, &bq->fr);
+    return bq;
+}
+
+// Free all memory associated with a 'struct bulkqueue' object
+void __visible
+bulkqueue_free(struct bulkqueue *bq)
+{
+    if (!bq)
+        return;
+    serialqueue_rm_fastreader(bq->sq, &bq->fr);
+    free(bq->blocks);
+    free(bq->pull_blocks);
+    free(bq);
+}
+
+// Return the messages received since the last call (and the number of
+// messages dropped since the last call).  The returned blocks are only
+// valid until the next call to bulkqueue_pull().
+int __visible
+bulkqueue_pull(struct bulkqueue *bq, struct bulk_block **blocks
+               , uint32_t *dropped)
+{
+    pthread_mutex_lock(&bq->lock);
+    *dropped = bq->dropped;
+    bq->dropped = 0;
+    struct bulk_block *pull_blocks = bq->blocks;
+    int count = bq->count, alloc = bq->alloc;
+    bq->blocks = bq->pull_blocks;
+    bq->alloc = bq->pull_alloc;
+    bq->count = 0;
+    bq->pull_blocks = pull_blocks;
+    bq->pull_alloc = alloc;
+    pthread_mutex_unlock(&bq->lock);
+    *blocks = pull_blocks;
+    return count;
+}
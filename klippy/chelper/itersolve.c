@@ -10,6 +10,7 @@
 #include "compiler.h" // __visible
 #include "itersolve.h" // itersolve_generate_steps
 #include "pyhelper.h" // errorf
+#include "stepcache.h" // stepcache_replay
 #include "stepcompress.h" // queue_append_start
 #include "trapq.h" // struct move
 
@@ -26,8 +27,8 @@ struct timepos {
 
 // Generate step times for a portion of a move
 static int32_t
-itersolve_gen_steps_range(struct stepper_kinematics *sk, struct move *m
-                          , double abs_start, double abs_end)
+gen_steps_range(struct stepper_kinematics *sk, struct move *m
+                , double abs_start, double abs_end, struct stepcache *rec)
 {
     sk_calc_callback calc_position_cb = sk->calc_position_cb;
     double half_step = .5 * sk->step_dist;
@@ -97,9 +98,12 @@ itersolve_gen_steps_range(struct stepper_kinematics *sk, struct move *m
                 low_time = guess.time;
             }
             if (!have_bracket || high_time - low_time > .000000001) {
-                if (!is_dir_change && rel_dist >= -half_step)
+                if (!is_dir_change && rel_dist >= -half_step) {
                     // Avoid rollback if stepper fully reaches step position
                     stepcompress_commit(sk->sc);
+                    if (rec)
+                        stepcache_record_commit(rec);
+                }
                 // Guess is not close enough - guess again with new time
                 continue;
             }
@@ -108,6 +112,8 @@ itersolve_gen_steps_range(struct stepper_kinematics *sk, struct move *m
         int ret = stepcompress_append(sk->sc, sdir, m->print_time, guess.time);
         if (ret)
             return ret;
+        if (rec)
+            stepcache_record_step(rec, sdir, guess.time);
         target = sdir ? target+half_step+half_step : target-half_step-half_step;
         // Reset bounds checking
         double seek_time_delta = 1.5 * (guess.time - last_time);
@@ -127,6 +133,41 @@ itersolve_gen_steps_range(struct stepper_kinematics *sk, struct move *m
     return 0;
 }
 
+// Generate step times for a portion of a move (using the step cache
+// when the full move is requested)
+static int32_t
+itersolve_gen_steps_range(struct stepper_kinematics *sk, struct move *m
+                          , double abs_start, double abs_end)
+{
+    struct stepcache *cache = sk->cache;
+    // Kinematics that look at nearby moves (pre/post active) can't be
+    // cached as the steps of a move do not only depend on that move
+    if (!cache || abs_start - m->print_time > 0.
+        || abs_end - m->print_time < m->move_t || sk->post_cb
+        || sk->gen_steps_pre_active || sk->gen_steps_post_active)
+        return gen_steps_range(sk, m, abs_start, abs_end, NULL);
+    struct stepcache_key key;
+    memset(&key, 0, sizeof(key));
+    key.move_t = m->move_t;
+    key.start_v = m->start_v;
+    key.half_accel = m->half_accel;
+    key.start_pos = m->start_pos;
+    key.axes_r = m->axes_r;
+    key.step_dist = sk->step_dist;
+    key.commanded_pos = sk->commanded_pos;
+    key.sdir = stepcompress_get_step_dir(sk->sc);
+    int32_t ret = stepcache_replay(cache, &key, sk->sc, m->print_time
+                                   , &sk->commanded_pos);
+    if (ret != 1)
+        return ret;
+    stepcache_record_start(cache);
+    ret = gen_steps_range(sk, m, abs_start, abs_end, cache);
+    if (ret)
+        return ret;
+    stepcache_record_finish(cache, &key, sk->commanded_pos);
+    return 0;
+}
+
 
 /****************************************************************
  * Interface functions
@@ -278,3 +319,20 @@ itersolve_get_commanded_pos(struct stepper_kinematics *sk)
 {
     return sk->commanded_pos;
 }
+
+void __visible
+itersolve_set_step_cache(struct stepper_kinematics *sk
+                         , struct stepcache *cache)
+{
+    sk->cache = cache;
+    itersolve_reset_step_cache(sk);
+}
+
+// Discard cached step times (must be called if the kinematic
+// parameters of the stepper are changed)
+void __visible
+itersolve_reset_step_cache(struct stepper_kinematics *sk)
+{
+    if (sk->cache)
+        stepcache_reset(sk->cache);
+}
@@ -23,6 +23,8 @@ struct stepper_kinematics {
 
     sk_calc_callback calc_position_cb;
     sk_post_callback post_cb;
+
+    struct stepcache *cache;
 };
 
 int32_t itersolve_generate_steps(struct stepper_kinematics *sk
@@ -37,5 +39,8 @@ double itersolve_calc_position_from_coord(struct stepper_kinematics *sk
 void itersolve_set_position(struct stepper_kinematics *sk
                             , double x, double y, double z);
 double itersolve_get_commanded_pos(struct stepper_kinematics *sk);
+void itersolve_set_step_cache(struct stepper_kinematics *sk
+                              , struct stepcache *cache);
+void itersolve_reset_step_cache(struct stepper_kinematics *sk);
 
 #endif // itersolve.h
@@ -125,6 +125,7 @@ extruder_set_pressure_advance(struct stepper_kinematics *sk
                               , double pressure_advance, double smooth_time)
 {
     struct extruder_stepper *es = container_of(sk, struct extruder_stepper, sk);
+    itersolve_reset_step_cache(sk);
     double hst = smooth_time * .5;
     es->half_smooth_time = hst;
     es->sk.gen_steps_pre_active = es->sk.gen_steps_post_active = hst;
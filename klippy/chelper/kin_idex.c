@@ -39,6 +39,7 @@ dual_carriage_set_sk(struct stepper_kinematics *sk
 {
     struct dual_carriage_stepper *dc = container_of(
             sk, struct dual_carriage_stepper, sk);
+    itersolve_reset_step_cache(sk);
     dc->sk.calc_position_cb = dual_carriage_calc_position;
     dc->sk.active_flags = orig_sk->active_flags;
     dc->orig_sk = orig_sk;
@@ -50,6 +51,7 @@ dual_carriage_set_transform(struct stepper_kinematics *sk, char axis
 {
     struct dual_carriage_stepper *dc = container_of(
             sk, struct dual_carriage_stepper, sk);
+    itersolve_reset_step_cache(sk);
     if (axis == 'x') {
         dc->x_scale = scale;
         dc->x_offs = offs;
@@ -161,6 +161,7 @@ input_shaper_set_sk(struct stepper_kinematics *sk
                     , struct stepper_kinematics *orig_sk)
 {
     struct input_shaper *is = container_of(sk, struct input_shaper, sk);
+    itersolve_reset_step_cache(sk);
     if (orig_sk->active_flags == AF_X)
         is->sk.calc_position_cb = shaper_x_calc_position;
     else if (orig_sk->active_flags == AF_Y)
@@ -202,6 +203,7 @@ input_shaper_set_shaper_params(struct stepper_kinematics *sk, char axis
     if (axis != 'x' && axis != 'y')
         return -1;
     struct input_shaper *is = container_of(sk, struct input_shaper, sk);
+    itersolve_reset_step_cache(sk);
     struct shaper_pulses *sp = axis == 'x' ? &is->sx : &is->sy;
     int status = 0;
     // Ignore input shaper update if the axis is not active
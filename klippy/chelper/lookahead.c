@@ -0,0 +1,85 @@
+// Junction speed calculation for the toolhead look-ahead queue
+//
+// Copyright (C) 2026  agent <agent@local>
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+//
+// This is a port of Move.calc_junction() in toolhead.py that operates
+// on a packed array of moves.  The calculations are performed in the
+// same order as the Python code so that the results are identical.
+
+#include <math.h> // sqrt, pow
+#include "compiler.h" // __visible
+
+struct junction_move {
+    double axes_r[4], move_d, accel, junction_deviation;
+    double max_cruise_v2, delta_v2, smooth_delta_v2, is_kinematic_move;
+};
+
+// Equivalent of the Python min() function
+static inline double
+py_min(double a, double b)
+{
+    return b < a ? b : a;
+}
+
+// Python's "v**2" uses the C library pow() function, which may differ
+// from v*v in the last bit.  The exponent is volatile so that the
+// compiler does not convert the pow() call to a multiplication.
+static double
+py_square(double v)
+{
+    volatile double two = 2.;
+    return pow(v, two);
+}
+
+// Calculate the maximum junction speed (squared) between a move and
+// the move prior to it.  The results for the first move are not
+// calculated - they must be provided by the caller.
+void __visible
+lookahead_calc_junctions(struct junction_move *moves, int count
+                         , double instant_corner_v
+                         , double *max_start_v2, double *max_smoothed_v2)
+{
+    int i;
+    for (i=1; i<count; i++) {
+        struct junction_move *m = &moves[i], *pm = &moves[i-1];
+        max_start_v2[i] = max_smoothed_v2[i] = 0.;
+        if (!m->is_kinematic_move || !pm->is_kinematic_move)
+            continue;
+        // Extruder maximum junction (see PrinterExtruder.calc_junction)
+        double extruder_v2 = m->max_cruise_v2;
+        double diff_r = m->axes_r[3] - pm->axes_r[3];
+        if (diff_r)
+            extruder_v2 = py_square(instant_corner_v / fabs(diff_r));
+        // Find max velocity using "approximated centripetal velocity"
+        double junction_cos_theta = -(m->axes_r[0] * pm->axes_r[0]
+                                      + m->axes_r[1] * pm->axes_r[1]
+                                      + m->axes_r[2] * pm->axes_r[2]);
+        if (junction_cos_theta > 0.999999)
+            continue;
+        if (junction_cos_theta < -0.999999)
+            junction_cos_theta = -0.999999;
+        double sin_theta_d2 = sqrt(0.5*(1.0-junction_cos_theta));
+        double R_jd = sin_theta_d2 / (1. - sin_theta_d2);
+        // Approximated circle must contact moves no further away than mid-move
+        double tan_theta_d2 = (sin_theta_d2
+                               / sqrt(0.5*(1.0+junction_cos_theta)));
+        double move_centripetal_v2 = .5 * m->move_d * tan_theta_d2 * m->accel;
+        double prev_move_centripetal_v2 = (.5 * pm->move_d * tan_theta_d2
+                                           * pm->accel);
+        // Apply limits
+        double start_v2 = R_jd * m->junction_deviation * m->accel;
+        start_v2 = py_min(start_v2
+                          , R_jd * pm->junction_deviation * pm->accel);
+        start_v2 = py_min(start_v2, move_centripetal_v2);
+        start_v2 = py_min(start_v2, prev_move_centripetal_v2);
+        start_v2 = py_min(start_v2, extruder_v2);
+        start_v2 = py_min(start_v2, m->max_cruise_v2);
+        start_v2 = py_min(start_v2, pm->max_cruise_v2);
+        start_v2 = py_min(start_v2, max_start_v2[i-1] + pm->delta_v2);
+        max_start_v2[i] = start_v2;
+        max_smoothed_v2[i] = py_min(
+            start_v2, max_smoothed_v2[i-1] + pm->smooth_delta_v2);
+    }
+}
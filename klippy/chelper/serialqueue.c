@@ -12,6 +12,7 @@
 // clock times, prioritizes commands, and handles retransmissions.  A
 // background thread is launched to do this work and minimize latency.
 
+#define _GNU_SOURCE // sendmmsg
 #include <linux/can.h> // // struct can_frame
 #include <math.h> // fabs
 #include <pthread.h> // pthread_mutex_lock
@@ -20,6 +21,7 @@
 #include <stdio.h> // snprintf
 #include <stdlib.h> // malloc
 #include <string.h> // memset
+#include <sys/socket.h> // sendmmsg
 #include <termios.h> // tcflush
 #include <unistd.h> // pipe
 #include "compiler.h" // __visible
@@ -92,6 +94,7 @@ struct serialqueue {
 #define MIN_REQTIME_DELTA 0.250
 #define MIN_BACKGROUND_DELTA 0.005
 #define IDLE_QUERY_TIME 1.0
+#define CANBUS_BATCH_FRAMES 32
 
 #define DEBUG_QUEUE_SENT 100
 #define DEBUG_QUEUE_RECEIVE 100
@@ -215,6 +218,20 @@ update_receive_seq(struct serialqueue *sq, double eventtime, uint64_t rseq)
     }
 }
 
+// Find the fastreader (if any) registered for a received message
+static struct fastreader *
+lookup_fastreader(struct serialqueue *sq, int len)
+{
+    struct fastreader *fr;
+    list_for_each_entry(fr, &sq->fast_readers, node) {
+        if (len >= fr->prefix_len + MESSAGE_MIN
+            && memcmp(&sq->input_buf[MESSAGE_HEADER_SIZE]
+                      , fr->prefix, fr->prefix_len) == 0)
+            return fr;
+    }
+    return NULL;
+}
+
 // Process a well formed input message
 static void
 handle_message(struct serialqueue *sq, double eventtime, int len)
@@ -238,6 +255,7 @@ handle_message(struct serialqueue *sq, double eventtime, int len)
     sq->bytes_read += len;
 
     // Check for pending messages on notify_queue
+    struct fastreader *fr = NULL;
     int must_wake = 0;
     while (!list_empty(&sq->notify_queue)) {
         struct queue_message *qm = list_first_entry(
@@ -263,23 +281,21 @@ handle_message(struct serialqueue *sq, double eventtime, int len)
             // Duplicate Ack is a Nak - do fast retransmit
             pollreactor_update_timer(sq->pr, SQPT_RETRANSMIT, PR_NOW);
     } else {
-        // Data message - add to receive queue
-        struct queue_message *qm = message_fill(sq->input_buf, len);
-        qm->sent_time = (rseq > sq->retransmit_seq
-                         ? sq->last_receive_sent_time : 0.);
-        qm->receive_time = get_monotonic(); // must be time post read()
-        qm->receive_time -= calculate_bittime(sq, len);
-        list_add_tail(&qm->node, &sq->receive_queue);
-        must_wake = 1;
+        // Data message - add to receive queue (unless consumed by fastreader)
+        fr = lookup_fastreader(sq, len);
+        if (!fr || !fr->consume) {
+            struct queue_message *qm = message_fill(sq->input_buf, len);
+            qm->sent_time = (rseq > sq->retransmit_seq
+                             ? sq->last_receive_sent_time : 0.);
+            qm->receive_time = get_monotonic(); // must be time post read()
+            qm->receive_time -= calculate_bittime(sq, len);
+            list_add_tail(&qm->node, &sq->receive_queue);
+            must_wake = 1;
+        }
     }
 
     // Check fast readers
-    struct fastreader *fr;
-    list_for_each_entry(fr, &sq->fast_readers, node) {
-        if (len < fr->prefix_len + MESSAGE_MIN
-            || memcmp(&sq->input_buf[MESSAGE_HEADER_SIZE]
-                      , fr->prefix, fr->prefix_len) != 0)
-            continue;
+    if (fr) {
         // Release main lock and invoke callback
         pthread_mutex_lock(&sq->fast_reader_dispatch_lock);
         if (must_wake)
@@ -295,22 +311,58 @@ handle_message(struct serialqueue *sq, double eventtime, int len)
     pthread_mutex_unlock(&sq->lock);
 }
 
+// Setup a set of message headers that each reference one CAN frame
+static void
+can_frames_setup(struct can_frame *frames, struct iovec *iovs
+                 , struct mmsghdr *msgs, int count)
+{
+    memset(frames, 0, count * sizeof(*frames));
+    memset(msgs, 0, count * sizeof(*msgs));
+    int i;
+    for (i=0; i<count; i++) {
+        iovs[i].iov_base = &frames[i];
+        iovs[i].iov_len = sizeof(frames[i]);
+        msgs[i].msg_hdr.msg_iov = &iovs[i];
+        msgs[i].msg_hdr.msg_iovlen = 1;
+    }
+}
+
+// Read all available CAN frames (up to CANBUS_BATCH_FRAMES) from the fd
+static int
+can_read(struct serialqueue *sq)
+{
+    struct can_frame frames[CANBUS_BATCH_FRAMES];
+    struct iovec iovs[CANBUS_BATCH_FRAMES];
+    struct mmsghdr msgs[CANBUS_BATCH_FRAMES];
+    int count = (sizeof(sq->input_buf) - sq->input_pos) / CAN_MAX_DLEN;
+    if (count > CANBUS_BATCH_FRAMES)
+        count = CANBUS_BATCH_FRAMES;
+    can_frames_setup(frames, iovs, msgs, count);
+    int ret = recvmmsg(sq->serial_fd, msgs, count, 0, NULL);
+    if (ret <= 0)
+        return ret;
+    int i;
+    for (i=0; i<ret; i++) {
+        struct can_frame *cf = &frames[i];
+        if (cf->can_id != sq->client_id + 1 || cf->can_dlc > CAN_MAX_DLEN)
+            continue;
+        memcpy(&sq->input_buf[sq->input_pos], cf->data, cf->can_dlc);
+        sq->input_pos += cf->can_dlc;
+    }
+    return ret;
+}
+
 // Callback for input activity on the serial fd
 static void
 input_event(struct serialqueue *sq, double eventtime)
 {
     if (sq->serial_fd_type == SQT_CAN) {
-        struct can_frame cf;
-        int ret = read(sq->serial_fd, &cf, sizeof(cf));
+        int ret = can_read(sq);
         if (ret <= 0) {
             report_errno("can read", ret);
             pollreactor_do_exit(sq->pr);
             return;
         }
-        if (cf.can_id != sq->client_id + 1)
-            return;
-        memcpy(&sq->input_buf[sq->input_pos], cf.data, cf.can_dlc);
-        sq->input_pos += cf.can_dlc;
     } else {
         int ret = read(sq->serial_fd, &sq->input_buf[sq->input_pos]
                        , sizeof(sq->input_buf) - sq->input_pos);
@@ -366,28 +418,39 @@ do_write(struct serialqueue *sq, void *buf, int buflen)
             report_errno("write", ret);
         return;
     }
-    // Write to CAN fd
-    struct can_frame cf;
+    // Write to CAN fd (submitting a batch of frames per system call)
+    struct can_frame frames[CANBUS_BATCH_FRAMES];
+    struct iovec iovs[CANBUS_BATCH_FRAMES];
+    struct mmsghdr msgs[CANBUS_BATCH_FRAMES];
+    can_frames_setup(frames, iovs, msgs, CANBUS_BATCH_FRAMES);
     while (buflen) {
-        int size = buflen > 8 ? 8 : buflen;
-        cf.can_id = sq->client_id;
-        cf.can_dlc = size;
-        memcpy(cf.data, buf, size);
-        int ret = write(sq->serial_fd, &cf, sizeof(cf));
-        if (ret < 0) {
-            report_errno("can write", ret);
-            double curtime = get_monotonic();
-            if (!sq->last_write_fail_time) {
-                sq->last_write_fail_time = curtime;
-            } else if (curtime > sq->last_write_fail_time + 10.0) {
-                errorf("Halting reads due to CAN write errors.");
-                pollreactor_do_exit(sq->pr);
+        int count = 0;
+        while (buflen && count < CANBUS_BATCH_FRAMES) {
+            int size = buflen > CAN_MAX_DLEN ? CAN_MAX_DLEN : buflen;
+            struct can_frame *cf = &frames[count++];
+            cf->can_id = sq->client_id;
+            cf->can_dlc = size;
+            memcpy(cf->data, buf, size);
+            buf += size;
+            buflen -= size;
+        }
+        int pos = 0;
+        while (pos < count) {
+            int ret = sendmmsg(sq->serial_fd, &msgs[pos], count - pos, 0);
+            if (ret < 0) {
+                report_errno("can write", ret);
+                double curtime = get_monotonic();
+                if (!sq->last_write_fail_time) {
+                    sq->last_write_fail_time = curtime;
+                } else if (curtime > sq->last_write_fail_time + 10.0) {
+                    errorf("Halting reads due to CAN write errors.");
+                    pollreactor_do_exit(sq->pr);
+                }
+                return;
             }
-            return;
+            sq->last_write_fail_time = 0.0;
+            pos += ret;
         }
-        sq->last_write_fail_time = 0.0;
-        buf += size;
-        buflen -= size;
     }
 }
 
@@ -942,6 +1005,18 @@ serialqueue_get_stats(struct serialqueue *sq, char *buf, int len)
              , stats.ready_bytes, stats.upcoming_bytes);
 }
 
+// Return the estimated time to transmit all messages ready to be sent
+double __visible
+serialqueue_get_backlog_time(struct serialqueue *sq)
+{
+    double backlog_time = 0.;
+    pthread_mutex_lock(&sq->lock);
+    if (sq->ready_bytes)
+        backlog_time = calculate_bittime(sq, sq->ready_bytes);
+    pthread_mutex_unlock(&sq->lock);
+    return backlog_time;
+}
+
 // Extract old messages stored in the debug queues
 int __visible
 serialqueue_extract_old(struct serialqueue *sq, int sentq
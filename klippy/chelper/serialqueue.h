@@ -16,6 +16,8 @@ struct fastreader {
     fastreader_cb func;
     int prefix_len;
     uint8_t prefix[MESSAGE_MAX];
+    // Don't pass matching messages to serialqueue_pull()
+    int consume;
 };
 
 struct pull_queue_message {
@@ -50,6 +52,7 @@ void serialqueue_set_clock_est(struct serialqueue *sq, double est_freq
 void serialqueue_get_clock_est(struct serialqueue *sq
                                , struct clock_estimate *ce);
 void serialqueue_get_stats(struct serialqueue *sq, char *buf, int len);
+double serialqueue_get_backlog_time(struct serialqueue *sq);
 int serialqueue_extract_old(struct serialqueue *sq, int sentq
                             , struct pull_queue_message *q, int max);
 
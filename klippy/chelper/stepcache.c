@@ -0,0 +1,217 @@
+// Cache of generated step times for repeated moves
+//
+// Copyright (C) 2026  agent <agent@local>
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+//
+// Prints that repeat the same motion (eg, looped production files)
+// request the same step times from the iterative solver many times.
+// The step times of a move only depend on the move parameters and the
+// state of the stepper at the start of the move, so the stepcompress
+// calls made for a move are recorded and later replayed (at a new
+// print_time) instead of running the solver again.
+
+#include <stddef.h> // offsetof
+#include <stdlib.h> // malloc
+#include <string.h> // memcmp
+#include "compiler.h" // __visible
+#include "list.h" // list_add_head
+#include "stepcache.h" // stepcache_alloc
+#include "stepcompress.h" // stepcompress_append
+
+#define COMMIT_EVENT -1
+
+struct step_event {
+    double time;
+    int32_t sdir;
+};
+
+struct stepcache_entry {
+    struct list_node lru_node;
+    struct stepcache_entry *hash_next;
+    struct stepcache_key key;
+    uint32_t hash;
+    int32_t count;
+    double end_pos;
+    struct step_event events[];
+};
+
+struct stepcache {
+    struct stepcache_entry **buckets;
+    uint32_t bucket_mask;
+    struct list_head lru;
+    int32_t max_steps, steps;
+    // Recording of the move currently being generated
+    struct step_event *rec;
+    int32_t rec_count, rec_alloc;
+};
+
+// Each entry uses one slot of the cache size (plus one per step event)
+static inline int32_t
+entry_size(struct stepcache_entry *e)
+{
+    return e->count + 1;
+}
+
+static uint32_t
+hash_key(struct stepcache_key *key)
+{
+    uint64_t *p = (void*)key, h = 0;
+    int i;
+    for (i=0; i<sizeof(*key) / sizeof(*p); i++) {
+        h = (h ^ p[i]) * 0x100000001b3ULL;
+        h ^= h >> 29;
+    }
+    return h ^ (h >> 32);
+}
+
+// Remove an entry from the cache and free it
+static void
+remove_entry(struct stepcache *cache, struct stepcache_entry *e)
+{
+    uint32_t bucket = e->hash & cache->bucket_mask;
+    struct stepcache_entry **pe = &cache->buckets[bucket];
+    while (*pe != e)
+        pe = &(*pe)->hash_next;
+    *pe = e->hash_next;
+    list_del(&e->lru_node);
+    cache->steps -= entry_size(e);
+    free(e);
+}
+
+// Allocate a new step cache storing up to 'max_steps' step events
+struct stepcache * __visible
+stepcache_alloc(int32_t max_steps)
+{
+    struct stepcache *cache = malloc(sizeof(*cache));
+    memset(cache, 0, sizeof(*cache));
+    uint32_t num_buckets = 64;
+    while (num_buckets < max_steps / 16)
+        num_buckets *= 2;
+    cache->buckets = malloc(num_buckets * sizeof(*cache->buckets));
+    memset(cache->buckets, 0, num_buckets * sizeof(*cache->buckets));
+    cache->bucket_mask = num_buckets - 1;
+    list_init(&cache->lru);
+    cache->max_steps = max_steps;
+    return cache;
+}
+
+// Discard all cached moves
+void
+stepcache_reset(struct stepcache *cache)
+{
+    while (!list_empty(&cache->lru)) {
+        struct stepcache_entry *e = list_last_entry(
+            &cache->lru, struct stepcache_entry, lru_node);
+        remove_entry(cache, e);
+    }
+}
+
+// Free all memory associated with a step cache
+void __visible
+stepcache_free(struct stepcache *cache)
+{
+    if (!cache)
+        return;
+    stepcache_reset(cache);
+    free(cache->buckets);
+    free(cache->rec);
+    free(cache);
+}
+
+// Replay the step events of a previously generated move.  Returns 1
+// if the move is not in the cache.
+int32_t
+stepcache_replay(struct stepcache *cache, struct stepcache_key *key
+                 , struct stepcompress *sc, double print_time
+                 , double *end_pos)
+{
+    uint32_t hash = hash_key(key);
+    struct stepcache_entry *e = cache->buckets[hash & cache->bucket_mask];
+    for (; e; e = e->hash_next)
+        if (e->hash == hash && !memcmp(&e->key, key, sizeof(*key)))
+            break;
+    if (!e)
+        return 1;
+    list_del(&e->lru_node);
+    list_add_head(&e->lru_node, &cache->lru);
+    struct step_event *ev = e->events, *end = &e->events[e->count];
+    for (; ev < end; ev++) {
+        int32_t ret;
+        if (ev->sdir == COMMIT_EVENT)
+            ret = stepcompress_commit(sc);
+        else
+            ret = stepcompress_append(sc, ev->sdir, print_time, ev->time);
+        if (ret)
+            return ret;
+    }
+    *end_pos = e->end_pos;
+    return 0;
+}
+
+static void
+record_event(struct stepcache *cache, int sdir, double time)
+{
+    if (cache->rec_count >= cache->rec_alloc) {
+        if (cache->rec_count > cache->max_steps)
+            // Move too large to cache
+            return;
+        int alloc = cache->rec_alloc ? cache->rec_alloc * 2 : 256;
+        cache->rec = realloc(cache->rec, alloc * sizeof(*cache->rec));
+        cache->rec_alloc = alloc;
+    }
+    cache->rec[cache->rec_count++] = (struct step_event){ time, sdir };
+}
+
+// Start recording the step events of a move
+void
+stepcache_record_start(struct stepcache *cache)
+{
+    cache->rec_count = 0;
+}
+
+// Note a call to stepcompress_append()
+void
+stepcache_record_step(struct stepcache *cache, int sdir, double time)
+{
+    record_event(cache, sdir, time);
+}
+
+// Note a call to stepcompress_commit()
+void
+stepcache_record_commit(struct stepcache *cache)
+{
+    int32_t count = cache->rec_count;
+    if (count && cache->rec[count-1].sdir == COMMIT_EVENT)
+        // Repeated commits have no effect
+        return;
+    record_event(cache, COMMIT_EVENT, 0.);
+}
+
+// Store the recorded step events (evicting old moves if needed)
+void
+stepcache_record_finish(struct stepcache *cache, struct stepcache_key *key
+                        , double end_pos)
+{
+    int32_t count = cache->rec_count;
+    if (count + 1 > cache->max_steps)
+        return;
+    while (cache->steps + count + 1 > cache->max_steps) {
+        struct stepcache_entry *old = list_last_entry(
+            &cache->lru, struct stepcache_entry, lru_node);
+        remove_entry(cache, old);
+    }
+    int size = sizeof(struct stepcache_entry) + count * sizeof(*cache->rec);
+    struct stepcache_entry *e = malloc(size);
+    e->key = *key;
+    e->hash = hash_key(key);
+    e->count = count;
+    e->end_pos = end_pos;
+    memcpy(e->events, cache->rec, count * sizeof(*cache->rec));
+    struct stepcache_entry **bucket = &cache->buckets[
+        e->hash & cache->bucket_mask];
+    e->hash_next = *bucket;
+    *bucket = e;
+    list_add_head(&e->lru_node, &cache->lru);
+    cache->steps += entry_size(e);
+}
@@ -0,0 +1,27 @@
+#ifndef STEPCACHE_H
+#define STEPCACHE_H
+
+#include <stdint.h> // int32_t
+#include "trapq.h" // struct coord
+
+struct stepcache_key {
+    double move_t, start_v, half_accel;
+    struct coord start_pos, axes_r;
+    double step_dist, commanded_pos;
+    int32_t sdir, pad;
+};
+
+struct stepcompress;
+struct stepcache *stepcache_alloc(int32_t max_steps);
+void stepcache_free(struct stepcache *cache);
+void stepcache_reset(struct stepcache *cache);
+int32_t stepcache_replay(struct stepcache *cache, struct stepcache_key *key
+                         , struct stepcompress *sc, double print_time
+                         , double *end_pos);
+void stepcache_record_start(struct stepcache *cache);
+void stepcache_record_step(struct stepcache *cache, int sdir, double time);
+void stepcache_record_commit(struct stepcache *cache);
+void stepcache_record_finish(struct stepcache *cache
+                             , struct stepcache_key *key, double end_pos);
+
+#endif // stepcache.h
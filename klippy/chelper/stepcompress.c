@@ -82,17 +82,15 @@ struct points {
     int32_t minp, maxp;
 };
 
-// Given a requested step time, return the minimum and maximum
-// acceptable times
+// Given a requested step time (and the time of the step prior to
+// it), return the minimum and maximum acceptable times
 static inline struct points
-minmax_point(struct stepcompress *sc, uint32_t *pos)
+minmax_point(uint32_t point, uint32_t prevpoint, uint32_t max_error)
 {
-    uint32_t lsc = sc->last_step_clock, point = *pos - lsc;
-    uint32_t prevpoint = pos > sc->queue_pos ? *(pos-1) - lsc : 0;
-    uint32_t max_error = (point - prevpoint) / 2;
-    if (max_error > sc->max_error)
-        max_error = sc->max_error;
-    return (struct points){ point - max_error, point };
+    uint32_t point_error = (point - prevpoint) / 2;
+    if (point_error > max_error)
+        point_error = max_error;
+    return (struct points){ point - point_error, point };
 }
 
 // The maximum add delta between two valid quadratic sequences of the
@@ -105,10 +103,11 @@ minmax_point(struct stepcompress *sc, uint32_t *pos)
 static struct step_move
 compress_bisect_add(struct stepcompress *sc)
 {
-    uint32_t *qlast = sc->queue_next;
-    if (qlast > sc->queue_pos + 65535)
-        qlast = sc->queue_pos + 65535;
-    struct points point = minmax_point(sc, sc->queue_pos);
+    uint32_t *qpos = sc->queue_pos, *qlast = sc->queue_next;
+    if (qlast > qpos + 65535)
+        qlast = qpos + 65535;
+    uint32_t lsc = sc->last_step_clock, max_error = sc->max_error;
+    struct points point = minmax_point(*qpos - lsc, 0, max_error);
     int32_t outer_mininterval = point.minp, outer_maxinterval = point.maxp;
     int32_t add = 0, minadd = -0x8000, maxadd = 0x7fff;
     int32_t bestinterval = 0, bestcount = 1, bestadd = 1, bestreach = INT32_MIN;
@@ -119,16 +118,22 @@ compress_bisect_add(struct stepcompress *sc)
         struct points nextpoint;
         int32_t nextmininterval = outer_mininterval;
         int32_t nextmaxinterval = outer_maxinterval, interval = nextmaxinterval;
-        int32_t nextcount = 1;
+        int32_t nextcount = 1, addoffset = 0;
+        uint32_t prevpoint = point.maxp;
         for (;;) {
             nextcount++;
-            if (&sc->queue_pos[nextcount-1] >= qlast) {
+            if (&qpos[nextcount-1] >= qlast) {
                 int32_t count = nextcount - 1;
                 return (struct step_move){ interval, count, add };
             }
-            nextpoint = minmax_point(sc, sc->queue_pos + nextcount - 1);
-            int32_t nextaddfactor = nextcount*(nextcount-1)/2;
-            int32_t c = add*nextaddfactor;
+            // The bounds of each step only depend on the prior step
+            // time, so track them while walking the queue
+            uint32_t nextp = qpos[nextcount-1] - lsc;
+            nextpoint = minmax_point(nextp, prevpoint, max_error);
+            prevpoint = nextp;
+            // Running total of add*nextcount*(nextcount-1)/2
+            addoffset += add*(nextcount-1);
+            int32_t c = addoffset;
             if (nextmininterval*nextcount < nextpoint.minp - c)
                 nextmininterval = idiv_up(nextpoint.minp - c, nextcount);
             if (nextmaxinterval*nextcount > nextpoint.maxp - c)
@@ -213,10 +218,13 @@ check_line(struct stepcompress *sc, struct step_move move)
                , sc->oid, move.interval, move.count, move.add);
         return ERROR_RET;
     }
+    uint32_t lsc = sc->last_step_clock, prevpoint = 0;
     uint32_t interval = move.interval, p = 0;
     uint16_t i;
     for (i=0; i<move.count; i++) {
-        struct points point = minmax_point(sc, sc->queue_pos + i);
+        uint32_t nextp = sc->queue_pos[i] - lsc;
+        struct points point = minmax_point(nextp, prevpoint, sc->max_error);
+        prevpoint = nextp;
         p += interval;
         if (p < point.minp || p > point.maxp) {
             errorf("stepcompress o=%d i=%d c=%d a=%d: Point %d: %d not in %d:%d"
@@ -0,0 +1,149 @@
+// Generate steps for multiple steppers using a pool of worker threads
+//
+// Copyright (C) 2026  agent <agent@local>
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+//
+// The step generation (itersolve and stepcompress) of each stepper
+// only updates state owned by that stepper, so different steppers may
+// be processed at the same time.  The only shared state is the trapq
+// sentinel which is updated before the worker threads are started.
+
+#include <pthread.h> // pthread_mutex_lock
+#include <stdlib.h> // malloc
+#include <string.h> // memset
+#include "compiler.h" // __visible
+#include "itersolve.h" // itersolve_generate_steps
+#include "pyhelper.h" // report_errno
+#include "trapq.h" // trapq_check_sentinels
+
+struct stepgen_pool {
+    pthread_mutex_t lock; // protects variables below
+    pthread_cond_t cond, done_cond;
+    int num_threads, exiting, generation;
+    pthread_t *threads;
+    // Current request
+    struct stepper_kinematics **sks;
+    int count, next, finished;
+    int32_t ret;
+    double flush_time;
+};
+
+// Process steppers of the current request until none remain
+static void
+pool_work(struct stepgen_pool *sp)
+{
+    while (sp->next < sp->count) {
+        struct stepper_kinematics *sk = sp->sks[sp->next++];
+        double flush_time = sp->flush_time;
+        pthread_mutex_unlock(&sp->lock);
+        int32_t ret = itersolve_generate_steps(sk, flush_time);
+        pthread_mutex_lock(&sp->lock);
+        if (ret && !sp->ret)
+            sp->ret = ret;
+        sp->finished++;
+        if (sp->finished >= sp->count)
+            pthread_cond_signal(&sp->done_cond);
+    }
+}
+
+// Main code for worker threads
+static void *
+pool_thread(void *data)
+{
+    struct stepgen_pool *sp = data;
+    pthread_mutex_lock(&sp->lock);
+    int generation = sp->generation;
+    for (;;) {
+        while (!sp->exiting && sp->generation == generation)
+            pthread_cond_wait(&sp->cond, &sp->lock);
+        if (sp->exiting)
+            break;
+        generation = sp->generation;
+        pool_work(sp);
+    }
+    pthread_mutex_unlock(&sp->lock);
+    return NULL;
+}
+
+// Free all resources associated with a stepgen_pool
+void __visible
+stepgen_pool_free(struct stepgen_pool *sp)
+{
+    if (!sp)
+        return;
+    pthread_mutex_lock(&sp->lock);
+    sp->exiting = 1;
+    pthread_cond_broadcast(&sp->cond);
+    pthread_mutex_unlock(&sp->lock);
+    int i;
+    for (i=0; i<sp->num_threads; i++) {
+        int ret = pthread_join(sp->threads[i], NULL);
+        if (ret)
+            report_errno("pthread_join", ret);
+    }
+    free(sp->threads);
+    free(sp);
+}
+
+// Create a new 'struct stepgen_pool' with the given number of threads
+struct stepgen_pool * __visible
+stepgen_pool_alloc(int num_threads)
+{
+    struct stepgen_pool *sp = malloc(sizeof(*sp));
+    memset(sp, 0, sizeof(*sp));
+    int ret = pthread_mutex_init(&sp->lock, NULL);
+    if (ret)
+        goto fail;
+    ret = pthread_cond_init(&sp->cond, NULL);
+    if (ret)
+        goto fail;
+    ret = pthread_cond_init(&sp->done_cond, NULL);
+    if (ret)
+        goto fail;
+    sp->threads = malloc(sizeof(*sp->threads) * num_threads);
+    for (; sp->num_threads < num_threads; sp->num_threads++) {
+        ret = pthread_create(&sp->threads[sp->num_threads], NULL
+                             , pool_thread, sp);
+        if (ret) {
+            report_errno("pthread_create", ret);
+            stepgen_pool_free(sp);
+            return NULL;
+        }
+    }
+    return sp;
+
+fail:
+    report_errno("init", ret);
+    return NULL;
+}
+
+// Generate steps for a list of steppers (the caller also does work)
+int32_t __visible
+stepgen_pool_generate(struct stepgen_pool *sp
+                      , struct stepper_kinematics **sks, int count
+                      , double flush_time)
+{
+    // Steppers may share a trapq - update its sentinels up front
+    int i;
+    for (i=0; i<count; i++)
+        if (sks[i]->tq)
+            trapq_check_sentinels(sks[i]->tq);
+
+    pthread_mutex_lock(&sp->lock);
+    sp->sks = sks;
+    sp->count = count;
+    sp->next = sp->finished = 0;
+    sp->ret = 0;
+    sp->flush_time = flush_time;
+    sp->generation++;
+    pthread_cond_broadcast(&sp->cond);
+    pool_work(sp);
+    while (sp->finished < sp->count)
+        pthread_cond_wait(&sp->done_cond, &sp->lock);
+    int32_t ret = sp->ret;
+    sp->sks = NULL;
+    sp->count = 0;
+    pthread_mutex_unlock(&sp->lock);
+    return ret;
+}
@@ -11,15 +11,39 @@
 #include "compiler.h" // unlikely
 #include "trapq.h" // move_get_coord
 
+#define MOVE_SLAB_SIZE 256
+
+// Moves are allocated in blocks to reduce malloc() overhead
+struct move_slab {
+    struct move_slab *next;
+    struct move moves[MOVE_SLAB_SIZE];
+};
+
 // Allocate a new 'move' object
 struct move *
-move_alloc(void)
+move_alloc(struct trapq *tq)
 {
-    struct move *m = malloc(sizeof(*m));
+    if (list_empty(&tq->free_moves)) {
+        struct move_slab *slab = malloc(sizeof(*slab));
+        slab->next = tq->slabs;
+        tq->slabs = slab;
+        int i;
+        for (i=0; i<MOVE_SLAB_SIZE; i++)
+            list_add_tail(&slab->moves[i].node, &tq->free_moves);
+    }
+    struct move *m = list_first_entry(&tq->free_moves, struct move, node);
+    list_del(&m->node);
     memset(m, 0, sizeof(*m));
     return m;
 }
 
+// Return a 'move' object to the trapq's pool of unused moves
+void
+move_free(struct trapq *tq, struct move *m)
+{
+    list_add_head(&m->node, &tq->free_moves);
+}
+
 // Return the distance moved given a time in a move
 inline double
 move_get_distance(struct move *m, double move_time)
@@ -48,7 +72,9 @@ trapq_alloc(void)
     memset(tq, 0, sizeof(*tq));
     list_init(&tq->moves);
     list_init(&tq->history);
-    struct move *head_sentinel = move_alloc(), *tail_sentinel = move_alloc();
+    list_init(&tq->free_moves);
+    struct move *head_sentinel = move_alloc(tq);
+    struct move *tail_sentinel = move_alloc(tq);
     tail_sentinel->print_time = tail_sentinel->move_t = NEVER_TIME;
     list_add_head(&head_sentinel->node, &tq->moves);
     list_add_tail(&tail_sentinel->node, &tq->moves);
@@ -59,15 +85,10 @@ trapq_alloc(void)
 void __visible
 trapq_free(struct trapq *tq)
 {
-    while (!list_empty(&tq->moves)) {
-        struct move *m = list_first_entry(&tq->moves, struct move, node);
-        list_del(&m->node);
-        free(m);
-    }
-    while (!list_empty(&tq->history)) {
-        struct move *m = list_first_entry(&tq->history, struct move, node);
-        list_del(&m->node);
-        free(m);
+    while (tq->slabs) {
+        struct move_slab *slab = tq->slabs;
+        tq->slabs = slab->next;
+        free(slab);
     }
     free(tq);
 }
@@ -101,7 +122,7 @@ trapq_add_move(struct trapq *tq, struct move *m)
     struct move *prev = list_prev_entry(tail_sentinel, node);
     if (prev->print_time + prev->move_t < m->print_time) {
         // Add a null move to fill time gap
-        struct move *null_move = move_alloc();
+        struct move *null_move = move_alloc(tq);
         null_move->start_pos = m->start_pos;
         if (!prev->print_time && m->print_time > MAX_NULL_MOVE)
             // Limit the first null move to improve numerical stability
@@ -126,7 +147,7 @@ trapq_append(struct trapq *tq, double print_time
     struct coord start_pos = { .x=start_pos_x, .y=start_pos_y, .z=start_pos_z };
     struct coord axes_r = { .x=axes_r_x, .y=axes_r_y, .z=axes_r_z };
     if (accel_t) {
-        struct move *m = move_alloc();
+        struct move *m = move_alloc(tq);
         m->print_time = print_time;
         m->move_t = accel_t;
         m->start_v = start_v;
@@ -139,7 +160,7 @@ trapq_append(struct trapq *tq, double print_time
         start_pos = move_get_coord(m, accel_t);
     }
     if (cruise_t) {
-        struct move *m = move_alloc();
+        struct move *m = move_alloc(tq);
         m->print_time = print_time;
         m->move_t = cruise_t;
         m->start_v = cruise_v;
@@ -152,7 +173,7 @@ trapq_append(struct trapq *tq, double print_time
         start_pos = move_get_coord(m, cruise_t);
     }
     if (decel_t) {
-        struct move *m = move_alloc();
+        struct move *m = move_alloc(tq);
         m->print_time = print_time;
         m->move_t = decel_t;
         m->start_v = cruise_v;
@@ -163,6 +184,78 @@ trapq_append(struct trapq *tq, double print_time
     }
 }
 
+// Add a batch of toolhead moves to the toolhead and extruder queues
+double __visible
+trapq_append_batch(struct trapq *tq, struct trapq *etq, double print_time
+                   , struct trapq_batch_move *moves, int count)
+{
+    int i;
+    for (i=0; i<count; i++) {
+        struct trapq_batch_move *m = &moves[i];
+        // Extrude only moves have no x, y, or z movement
+        if (m->axes_d[0] || m->axes_d[1] || m->axes_d[2])
+            trapq_append(tq, print_time, m->accel_t, m->cruise_t, m->decel_t
+                         , m->start_pos[0], m->start_pos[1], m->start_pos[2]
+                         , m->axes_r[0], m->axes_r[1], m->axes_r[2]
+                         , m->start_v, m->cruise_v, m->accel);
+        if (m->axes_d[3] && etq) {
+            // Extruder queue: x is extruder movement, y is pressure
+            // advance flag
+            double axis_r = m->axes_r[3];
+            int can_pressure_advance = (axis_r > 0.
+                                        && (m->axes_d[0] || m->axes_d[1]));
+            trapq_append(etq, print_time, m->accel_t, m->cruise_t, m->decel_t
+                         , m->start_pos[3], 0., 0.
+                         , 1., can_pressure_advance, 0.
+                         , m->start_v * axis_r, m->cruise_v * axis_r
+                         , m->accel * axis_r);
+        }
+        print_time = print_time + m->accel_t + m->cruise_t + m->decel_t;
+    }
+    return print_time;
+}
+
+#define MERGE_TIME_EPSILON 0.000000001
+#define MERGE_POS_EPSILON 0.000000001
+
+// Check if a constant velocity move continues the latest history move
+static int
+history_can_merge(struct move *prev, struct move *m)
+{
+    if (prev->half_accel || m->half_accel || prev->start_v != m->start_v
+        || prev->axes_r.x != m->axes_r.x || prev->axes_r.y != m->axes_r.y
+        || prev->axes_r.z != m->axes_r.z)
+        return 0;
+    double end_time = prev->print_time + prev->move_t;
+    if (fabs(m->print_time - end_time) > MERGE_TIME_EPSILON)
+        return 0;
+    struct coord end_pos = move_get_coord(prev, prev->move_t);
+    return (fabs(m->start_pos.x - end_pos.x) < MERGE_POS_EPSILON
+            && fabs(m->start_pos.y - end_pos.y) < MERGE_POS_EPSILON
+            && fabs(m->start_pos.z - end_pos.z) < MERGE_POS_EPSILON);
+}
+
+// Add an expired move to the history list
+static void
+history_add_move(struct trapq *tq, struct move *m)
+{
+    if (!m->start_v && !m->half_accel) {
+        // Moves without motion are not stored in the history
+        move_free(tq, m);
+        return;
+    }
+    if (tq->compact_history && !list_empty(&tq->history)) {
+        struct move *prev = list_first_entry(&tq->history, struct move, node);
+        if (history_can_merge(prev, m)) {
+            // Extend the previous constant velocity move
+            prev->move_t = m->print_time + m->move_t - prev->print_time;
+            move_free(tq, m);
+            return;
+        }
+    }
+    list_add_head(&m->node, &tq->history);
+}
+
 // Expire any moves older than `print_time` from the trapezoid velocity queue
 void __visible
 trapq_finalize_moves(struct trapq *tq, double print_time
@@ -180,10 +273,7 @@ trapq_finalize_moves(struct trapq *tq, double print_time
         if (m->print_time + m->move_t > print_time)
             break;
         list_del(&m->node);
-        if (m->start_v || m->half_accel)
-            list_add_head(&m->node, &tq->history);
-        else
-            free(m);
+        history_add_move(tq, m);
     }
     // Free old moves from history list
     if (list_empty(&tq->history))
@@ -194,7 +284,7 @@ trapq_finalize_moves(struct trapq *tq, double print_time
         if (m == latest || m->print_time + m->move_t > clear_history_time)
             break;
         list_del(&m->node);
-        free(m);
+        move_free(tq, m);
     }
 }
 
@@ -215,11 +305,11 @@ trapq_set_position(struct trapq *tq, double print_time
             break;
         }
         list_del(&m->node);
-        free(m);
+        move_free(tq, m);
     }
 
     // Add a marker to the trapq history
-    struct move *m = move_alloc();
+    struct move *m = move_alloc(tq);
     m->print_time = print_time;
     m->start_pos.x = pos_x;
     m->start_pos.y = pos_y;
@@ -227,6 +317,14 @@ trapq_set_position(struct trapq *tq, double print_time
     list_add_head(&m->node, &tq->history);
 }
 
+// Merge consecutive constant velocity moves with the same direction
+// when they are added to the history
+void __visible
+trapq_set_history_compaction(struct trapq *tq, int compact_history)
+{
+    tq->compact_history = compact_history;
+}
+
 // Return history of movement queue
 int __visible
 trapq_extract_old(struct trapq *tq, struct pull_move *p, int max
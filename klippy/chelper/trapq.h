@@ -22,6 +22,10 @@ struct move {
 
 struct trapq {
     struct list_head moves, history;
+    // Pool of unused move objects
+    struct list_head free_moves;
+    struct move_slab *slabs;
+    int compact_history;
 };
 
 struct pull_move {
@@ -31,7 +35,14 @@ struct pull_move {
     double x_r, y_r, z_r;
 };
 
-struct move *move_alloc(void);
+struct trapq_batch_move {
+    double accel_t, cruise_t, decel_t;
+    double start_pos[4], axes_d[4], axes_r[4];
+    double start_v, cruise_v, accel;
+};
+
+struct move *move_alloc(struct trapq *tq);
+void move_free(struct trapq *tq, struct move *m);
 double move_get_distance(struct move *m, double move_time);
 struct coord move_get_coord(struct move *m, double move_time);
 struct trapq *trapq_alloc(void);
@@ -43,10 +54,14 @@ void trapq_append(struct trapq *tq, double print_time
                   , double start_pos_x, double start_pos_y, double start_pos_z
                   , double axes_r_x, double axes_r_y, double axes_r_z
                   , double start_v, double cruise_v, double accel);
+double trapq_append_batch(struct trapq *tq, struct trapq *etq
+                          , double print_time
+                          , struct trapq_batch_move *moves, int count);
 void trapq_finalize_moves(struct trapq *tq, double print_time
                           , double clear_history_time);
 void trapq_set_position(struct trapq *tq, double print_time
                         , double pos_x, double pos_y, double pos_z);
+void trapq_set_history_compaction(struct trapq *tq, int compact_history);
 int trapq_extract_old(struct trapq *tq, struct pull_move *p, int max
                       , double start_time, double end_time);
 
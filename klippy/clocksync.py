@@ -8,6 +8,9 @@ import logging, math
 RTT_AGE = .000010 / (60. * 60.)
 DECAY = 1. / 30.
 TRANSMIT_EXTRA = .001
+QUERY_TIME = .9839
+FAST_QUERY_TIME = .2459
+DEGRADED_STDDEV = .000250
 
 class ClockSync:
     def __init__(self, reactor):
@@ -27,6 +30,17 @@ class ClockSync:
         self.clock_avg = self.clock_covariance = 0.
         self.prediction_variance = 0.
         self.last_prediction_time = 0.
+        # Clock sync health tracking
+        self.rtt_avg = self.rtt_variance = 0.
+        self.error_variance = self.max_prediction_error = 0.
+        self.last_freq_time = 0.
+        self.drift_avg = 0.
+        self.ignored_samples = self.prediction_resets = 0
+        self.is_monitoring = self.is_degraded = False
+        self.adaptive_query = False
+        self.query_time = QUERY_TIME
+    def set_adaptive_query(self, adaptive_query):
+        self.adaptive_query = adaptive_query
     def connect(self, serial):
         self.serial = serial
         self.mcu_freq = serial.msgparser.get_constant_float('CLOCK_FREQ')
@@ -37,6 +51,7 @@ class ClockSync:
         self.time_avg = params['#sent_time']
         self.clock_est = (self.time_avg, self.clock_avg, self.mcu_freq)
         self.prediction_variance = (.001 * self.mcu_freq)**2
+        self.rtt_avg = params['#receive_time'] - params['#sent_time']
         # Enable periodic get_clock timer
         for i in range(8):
             self.reactor.pause(self.reactor.monotonic() + 0.050)
@@ -46,6 +61,7 @@ class ClockSync:
         self.get_clock_cmd = serial.get_msgparser().create_command('get_clock')
         self.cmd_queue = serial.alloc_command_queue()
         serial.register_response(self._handle_clock, 'clock')
+        self.is_monitoring = True
         self.reactor.update_timer(self.get_clock_timer, self.reactor.NOW)
     def connect_file(self, serial, pace=False):
         self.serial = serial
@@ -61,7 +77,7 @@ class ClockSync:
         self.queries_pending += 1
         # Use an unusual time for the next event so clock messages
         # don't resonate with other periodic events.
-        return eventtime + .9839
+        return eventtime + self.query_time
     def _handle_clock(self, params):
         self.queries_pending = 0
         # Extend clock to 64bit
@@ -80,10 +96,19 @@ class ClockSync:
             self.min_rtt_time = sent_time
             logging.debug("new minimum rtt %.3f: hrtt=%.6f freq=%d",
                           sent_time, half_rtt, self.clock_est[2])
+        diff_rtt = 2. * half_rtt - self.rtt_avg
+        self.rtt_avg += DECAY * diff_rtt
+        self.rtt_variance = (1. - DECAY) * (
+            self.rtt_variance + diff_rtt**2 * DECAY)
         # Filter out samples that are extreme outliers
         exp_clock = ((sent_time - self.time_avg) * self.clock_est[2]
                      + self.clock_avg)
         clock_diff2 = (clock - exp_clock)**2
+        error = (clock - exp_clock) / self.mcu_freq
+        self.error_variance = (1. - DECAY) * (
+            self.error_variance + error**2 * DECAY)
+        self.max_prediction_error = max(
+            abs(error), (1. - DECAY) * self.max_prediction_error)
         if (clock_diff2 > 25. * self.prediction_variance
             and clock_diff2 > (.000500 * self.mcu_freq)**2):
             if clock > exp_clock and sent_time < self.last_prediction_time+10.:
@@ -91,12 +116,15 @@ class ClockSync:
                               " freq=%d diff=%d stddev=%.3f",
                               sent_time, self.clock_est[2], clock - exp_clock,
                               math.sqrt(self.prediction_variance))
+                self.ignored_samples += 1
+                self._check_health()
                 return
             logging.info("Resetting prediction variance %.3f:"
                          " freq=%d diff=%d stddev=%.3f",
                          sent_time, self.clock_est[2], clock - exp_clock,
                          math.sqrt(self.prediction_variance))
             self.prediction_variance = (.001 * self.mcu_freq)**2
+            self.prediction_resets += 1
         else:
             self.last_prediction_time = sent_time
             self.prediction_variance = (
@@ -115,10 +143,40 @@ class ClockSync:
         pred_stddev = math.sqrt(self.prediction_variance)
         self.serial.set_clock_est(new_freq, self.time_avg + TRANSMIT_EXTRA,
                                   int(self.clock_avg - 3. * pred_stddev), clock)
+        self._note_freq(sent_time, new_freq) # Must be before clock_est update
         self.clock_est = (self.time_avg + self.min_half_rtt,
                           self.clock_avg, new_freq)
+        self._check_health()
         #logging.debug("regr %.3f: freq=%.3f d=%d(%.3f)",
         #              sent_time, new_freq, clock - exp_clock, pred_stddev)
+    # Clock sync health tracking (invoked from background thread)
+    def _note_freq(self, sent_time, new_freq):
+        # Track rate of change of the estimated frequency (in ppm/s)
+        last_freq, last_time = self.clock_est[2], self.last_freq_time
+        self.last_freq_time = sent_time
+        if not last_time or sent_time <= last_time:
+            return
+        drift = ((new_freq - last_freq) * 1000000. / self.mcu_freq
+                 / (sent_time - last_time))
+        self.drift_avg += DECAY * (drift - self.drift_avg)
+    def _check_health(self):
+        if not self.is_monitoring:
+            return
+        error_rms = math.sqrt(self.error_variance)
+        if not self.is_degraded:
+            if error_rms <= DEGRADED_STDDEV:
+                return
+            self.is_degraded = True
+            logging.warning("%sClock sync degraded: error=%.6f rtt=%.6f",
+                            self.serial.warn_prefix, error_rms, self.rtt_avg)
+            if self.adaptive_query:
+                # Query more often to track the mcu clock more closely
+                self.query_time = FAST_QUERY_TIME
+        elif error_rms < .5 * DEGRADED_STDDEV:
+            self.is_degraded = False
+            logging.info("%sClock sync recovered: error=%.6f rtt=%.6f",
+                         self.serial.warn_prefix, error_rms, self.rtt_avg)
+            self.query_time = QUERY_TIME
     # clock frequency conversions
     def print_time_to_clock(self, print_time):
         return int(print_time * self.mcu_freq)
@@ -140,7 +198,7 @@ class ClockSync:
         clock_diff -= (clock_diff & 0x80000000) << 1
         return last_clock + clock_diff
     def is_active(self):
-        return self.queries_pending <= 4
+        return self.queries_pending <= 4. * QUERY_TIME / self.query_time
     def dump_debug(self):
         sample_time, clock, freq = self.clock_est
         return ("clocksync state: mcu_freq=%d last_clock=%d"
@@ -155,6 +213,21 @@ class ClockSync:
     def stats(self, eventtime):
         sample_time, clock, freq = self.clock_est
         return "freq=%d" % (freq,)
+    def get_status(self, eventtime):
+        sample_time, clock, freq = self.clock_est
+        return {
+            'rtt': self.rtt_avg, 'rtt_stddev': math.sqrt(self.rtt_variance),
+            'min_rtt': 2. * self.min_half_rtt,
+            'prediction_stddev': (math.sqrt(self.prediction_variance)
+                                  / self.mcu_freq),
+            'prediction_error_rms': math.sqrt(self.error_variance),
+            'max_prediction_error': self.max_prediction_error,
+            'freq_ppm': (freq - self.mcu_freq) * 1000000. / self.mcu_freq,
+            'drift_ppm_per_s': self.drift_avg,
+            'ignored_samples': self.ignored_samples,
+            'prediction_resets': self.prediction_resets,
+            'query_interval': self.query_time,
+            'is_degraded': self.is_degraded }
     def calibrate_clock(self, print_time, eventtime):
         return (0., self.mcu_freq)
 
@@ -166,6 +239,7 @@ class SecondarySync(ClockSync):
         self.main_sync = main_sync
         self.clock_adj = (0., 1.)
         self.last_sync_time = 0.
+        self.sync_error = self.max_sync_error = 0.
     def connect(self, serial):
         ClockSync.connect(self, serial)
         self.clock_adj = (0., self.mcu_freq)
@@ -192,12 +266,22 @@ class SecondarySync(ClockSync):
     def stats(self, eventtime):
         adjusted_offset, adjusted_freq = self.clock_adj
         return "%s adj=%d" % (ClockSync.stats(self, eventtime), adjusted_freq)
+    def get_status(self, eventtime):
+        status = ClockSync.get_status(self, eventtime)
+        status['sync_error'] = self.sync_error
+        status['max_sync_error'] = self.max_sync_error
+        return status
     def calibrate_clock(self, print_time, eventtime):
         # Calculate: est_print_time = main_sync.estimatated_print_time()
         ser_time, ser_clock, ser_freq = self.main_sync.clock_est
         main_mcu_freq = self.main_sync.mcu_freq
         est_main_clock = (eventtime - ser_time) * ser_freq + ser_clock
         est_print_time = est_main_clock / main_mcu_freq
+        # Track difference between local and main mcu print_time estimates
+        self.sync_error = (self.clock_to_print_time(self.get_clock(eventtime))
+                           - est_print_time)
+        self.max_sync_error = max(abs(self.sync_error),
+                                  (1. - DECAY) * self.max_sync_error)
         # Determine sync1_print_time and sync2_print_time
         sync1_print_time = max(print_time, est_print_time)
         sync2_print_time = max(sync1_print_time + 4., self.last_sync_time,
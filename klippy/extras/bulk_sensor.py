@@ -4,6 +4,11 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import logging, threading, struct
+import chelper
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # This "bulk sensor" module facilitates the processing of sensor chip
 # measurements that do not require the host to respond with low
@@ -112,24 +117,98 @@ class BatchWebhooksClient:
         self.cconn.send(tmp)
         return True
 
+# Layout of a 'struct bulk_block' (see chelper/bulkqueue.c)
+BULK_BLOCK_FIELDS = [('sequence', '=u4'), ('len', '=u4'), ('data', 'u1', 56)]
+
 # Helper class to store incoming messages in a queue
 class BulkDataQueue:
     def __init__(self, mcu, msg_name="sensor_bulk_data", oid=None):
+        self.mcu = mcu
+        self.oid = oid
         # Measurement storage (accessed from background thread)
         self.lock = threading.Lock()
         self.raw_samples = []
         # Register callback with mcu
         mcu.register_response(self._handle_data, msg_name, oid)
+        # Store sensor_bulk_data messages in C code (if possible)
+        self.ffi_main, self.ffi_lib = chelper.get_ffi()
+        self.bulkqueue = self.serialqueue = None
+        self.pull_ptr = self.ffi_main.new('struct bulk_block **')
+        self.dropped_ptr = self.ffi_main.new('uint32_t *')
+        if msg_name == "sensor_bulk_data" and oid is not None:
+            mcu.register_config_callback(self._build_config)
+            printer = mcu.get_printer()
+            printer.register_event_handler("klippy:disconnect",
+                                           self._handle_disconnect)
+    def _build_config(self):
+        data_cmd = self.mcu.try_lookup_command(
+            "sensor_bulk_data oid=%c sequence=%hu data=%*s")
+        serialqueue = self.mcu.get_serialqueue()
+        if data_cmd is None or serialqueue is None:
+            return
+        bq = self.ffi_lib.bulkqueue_alloc(
+            serialqueue, data_cmd.get_command_tag(), self.oid)
+        if bq == self.ffi_main.NULL:
+            return
+        self.bulkqueue = bq
+        # The serialqueue memory is released when its last reference is
+        # dropped - keep a reference until the bulkqueue is freed
+        self.serialqueue = serialqueue
+    def _handle_disconnect(self):
+        # The mcu disconnect handler (registered prior to this one) has
+        # stopped the serialqueue thread, so no fastreader callback can
+        # be in progress
+        if self.bulkqueue is not None:
+            self.ffi_lib.bulkqueue_free(self.bulkqueue)
+        self.bulkqueue = self.serialqueue = None
     def _handle_data(self, params):
         with self.lock:
             self.raw_samples.append(params)
-    def pull_queue(self):
+    def _pull_python_queue(self):
         with self.lock:
             raw_samples = self.raw_samples
             self.raw_samples = []
         return raw_samples
+    def _pull_blocks(self):
+        if self.bulkqueue is None:
+            return None, 0
+        count = self.ffi_lib.bulkqueue_pull(self.bulkqueue, self.pull_ptr,
+                                            self.dropped_ptr)
+        if self.dropped_ptr[0]:
+            logging.warning("Dropped %d sensor_bulk_data messages (oid %d)",
+                            self.dropped_ptr[0], self.oid)
+        return self.pull_ptr[0], count
+    def pull_queue(self):
+        raw_samples = self._pull_python_queue()
+        blocks, count = self._pull_blocks()
+        if count:
+            buffer = self.ffi_main.buffer
+            raw_samples.extend([{'sequence': b.sequence,
+                                 'data': buffer(b.data, b.len)[:]}
+                                for b in blocks[0:count]])
+        return raw_samples
+    def pull_blocks(self):
+        # Return messages as a numpy array of BULK_BLOCK_FIELDS.  The
+        # array may reference memory that is reused by the next pull.
+        dtype = numpy.dtype(BULK_BLOCK_FIELDS)
+        raw_samples = self._pull_python_queue()
+        blocks, count = self._pull_blocks()
+        res = numpy.zeros(0, dtype)
+        if count:
+            res = numpy.frombuffer(self.ffi_main.buffer(
+                blocks, count * dtype.itemsize), dtype)
+        if not raw_samples:
+            return res
+        extra = numpy.zeros(len(raw_samples), dtype)
+        for i, params in enumerate(raw_samples):
+            data = bytearray(params['data'])
+            extra['sequence'][i] = params['sequence']
+            extra['len'][i] = len(data)
+            extra['data'][i, :len(data)] = data
+        return numpy.concatenate([extra, res])
     def clear_queue(self):
-        self.pull_queue()
+        self._pull_python_queue()
+        self._pull_blocks()
 
 
 ######################################################################
@@ -200,6 +279,24 @@ class ClockSyncRegression:
 
 MAX_BULK_MSG_SIZE = 52
 
+# Return the numpy dtype equivalent of a struct format (if possible)
+def lookup_sample_dtype(unpack_fmt):
+    if numpy is None:
+        return None
+    order, fmt = '=', unpack_fmt
+    if fmt[:1] in '@=<>!':
+        order, fmt = {'!': '>', '@': '='}.get(fmt[0], fmt[0]), fmt[1:]
+    if not fmt or not fmt.isalpha():
+        return None
+    try:
+        dtype = numpy.dtype([('f%d' % (i,), order + c)
+                             for i, c in enumerate(fmt)])
+    except TypeError:
+        return None
+    if dtype.itemsize != struct.calcsize(unpack_fmt):
+        return None
+    return dtype
+
 # Read sensor_bulk_data and calculate timestamps for devices that take
 # samples at a fixed frequency (and produce fixed data size samples).
 class FixedFreqReader:
@@ -208,6 +305,7 @@ class FixedFreqReader:
         self.clock_sync = ClockSyncRegression(mcu, chip_clock_smooth)
         unpack = struct.Struct(unpack_fmt)
         self.unpack_from = unpack.unpack_from
+        self.sample_dtype = lookup_sample_dtype(unpack_fmt)
         self.bytes_per_sample = unpack.size
         self.samples_per_block = MAX_BULK_MSG_SIZE // self.bytes_per_sample
         self.last_sequence = self.max_query_duration = 0
@@ -264,8 +362,47 @@ class FixedFreqReader:
             self.clock_sync.reset(avg_mcu_clock, chip_clock)
         else:
             self.clock_sync.update(avg_mcu_clock, chip_clock)
+    # Convert sensor_bulk_data responses into arrays of sample times
+    # and sample fields (requires numpy)
+    def pull_sample_arrays(self):
+        np = numpy
+        dtype = self.sample_dtype
+        # Query MCU for sample timing and update clock synchronization
+        self._update_clock()
+        # Pull sensor_bulk_data messages from local queue
+        blocks = self.bulk_queue.pull_blocks()
+        if not len(blocks):
+            return [np.zeros(0)] + [np.zeros(0, dtype[name])
+                                    for name in dtype.names]
+        time_base, chip_base, inv_freq = self.clock_sync.get_time_translation()
+        samples_per_block = self.samples_per_block
+        # Determine the sequence number of every message
+        seq_diff = (blocks['sequence'].astype(np.int64)
+                    - self.last_sequence) & 0xffff
+        seq_diff -= (seq_diff & 0x8000) << 1
+        seqs = self.last_sequence + seq_diff
+        # Extract samples and calculate their timestamps
+        max_count = blocks.dtype['data'].shape[0] // dtype.itemsize
+        counts = blocks['len'] // dtype.itemsize
+        data = np.ascontiguousarray(
+            blocks['data'][:, :max_count * dtype.itemsize]).view(dtype)
+        index = np.arange(max_count)
+        valid = index < counts[:, np.newaxis]
+        msg_cdiff = seqs * samples_per_block - chip_base
+        ptimes = time_base + (msg_cdiff[:, np.newaxis] + index) * inv_freq
+        samples = data[valid]
+        nonempty = np.flatnonzero(counts)
+        if len(nonempty):
+            last_index = int(counts[nonempty[-1]]) - 1
+            self.clock_sync.set_last_chip_clock(
+                int(seqs[-1]) * samples_per_block + last_index)
+        return [ptimes[valid]] + [np.ascontiguousarray(samples[name])
+                                  for name in dtype.names]
     # Convert sensor_bulk_data responses into list of samples
     def pull_samples(self):
+        if self.sample_dtype is not None:
+            arrays = self.pull_sample_arrays()
+            return list(zip(*[a.tolist() for a in arrays]))
         # Query MCU for sample timing and update clock synchronization
         self._update_clock()
         # Pull sensor_bulk_data messages from local queue
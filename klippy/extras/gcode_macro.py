@@ -140,6 +140,7 @@ class GCodeMacro:
                                         name, self.cmd_SET_GCODE_VARIABLE,
                                         desc=self.cmd_SET_GCODE_VARIABLE_help)
         self.in_script = False
+        self.status_version = 0
         self.variables = {
             "running": False
         }
@@ -162,6 +163,8 @@ class GCodeMacro:
         pdesc = "Renamed builtin of '%s'" % (self.alias,)
         self.gcode.register_command(self.rename_existing, prev_cmd, desc=pdesc)
         self.gcode.register_command(self.alias, self.cmd, desc=self.cmd_desc)
+    def get_status_version(self):
+        return self.status_version
     def get_status(self, eventtime):
         res = dict(self.variables)
         res.update({
@@ -183,6 +186,7 @@ class GCodeMacro:
         v = dict(self.variables)
         v[variable] = literal
         self.variables = v
+        self.status_version += 1
     def cmd(self, gcmd):
         if self.in_script:
             raise gcmd.error("Macro %s called recursively" % (self.alias,))
@@ -191,10 +195,12 @@ class GCodeMacro:
         kwparams['params'] = gcmd.get_command_parameters()
         kwparams['rawparams'] = gcmd.get_raw_command_parameters()
         self.in_script = True
+        self.status_version += 1
         try:
             self.template.run_gcode_from_command(kwparams)
         finally:
             self.in_script = False
+            self.status_version += 1
 
 def load_config_prefix(config):
     return GCodeMacro(config)
@@ -110,9 +110,7 @@ class GCodeMove:
         if self.is_printer_ready:
             self.last_position = self.position_with_transform()
     # G-Code movement commands
-    def cmd_G1(self, gcmd):
-        # Move
-        params = gcmd.get_command_parameters()
+    def _update_move_position(self, params, commandline):
         try:
             for pos, axis in enumerate('XYZ'):
                 if axis in params:
@@ -134,13 +132,34 @@ class GCodeMove:
             if 'F' in params:
                 gcode_speed = float(params['F'])
                 if gcode_speed <= 0.:
-                    raise gcmd.error("Invalid speed in '%s'"
-                                     % (gcmd.get_commandline(),))
+                    raise self.printer.command_error(
+                        "Invalid speed in '%s'" % (commandline,))
                 self.speed = gcode_speed * self.speed_factor
         except ValueError as e:
-            raise gcmd.error("Unable to parse move '%s'"
-                             % (gcmd.get_commandline(),))
+            raise self.printer.command_error("Unable to parse move '%s'"
+                                             % (commandline,))
+    def cmd_G1(self, gcmd):
+        # Move
+        params = gcmd.get_command_parameters()
+        self._update_move_position(params, gcmd.get_commandline())
         self.move_with_transform(self.last_position, self.speed)
+    # Batched G0/G1 moves
+    def can_batch_moves(self):
+        # Batches bypass the g-code handlers, so they may only be used
+        # when G0/G1 are handled here and no move transform is active
+        if self.move_transform is not None or not self.is_printer_ready:
+            return False
+        gcode = self.printer.lookup_object('gcode')
+        return (gcode.get_command_handler('G1') == self.cmd_G1
+                and gcode.get_command_handler('G0') == self.cmd_G1)
+    def move_batch(self, commands):
+        # Queue a series of (commandline, params) G0/G1 moves.  The
+        # commands are consumed lazily, so a caller may track progress.
+        def gen_moves():
+            for commandline, params in commands:
+                self._update_move_position(params, commandline)
+                yield self.last_position, self.speed
+        self.printer.lookup_object('toolhead').move_batch(gen_moves())
     # G-Code coordinate manipulation
     def cmd_G20(self, gcmd):
         # Set units to inches
@@ -1,508 +1,256 @@
-import numpy as np
-
-import RPi.GPIO as GPIO
-GPIO.setmode(GPIO.BCM)
-
-class Wrapper():
+# Support for hx711 load cell amplifiers
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import logging
+from . import bulk_sensor
+
+BATCH_UPDATES = 0.100
+CALIBRATION_SAMPLES = 30
+
+# Number of extra sclk pulses that select channel and gain
+GAINS = {'A-128': 1, 'B-32': 2, 'A-64': 3}
+SAMPLE_RATES = {'10': 10, '80': 80}
+
+# The chip reports these values when the input is out of range
+SATURATED_VALUES = (0x7fffff, -0x800000)
+
+# Average of samples near the median (discards outliers)
+def filtered_mean(np, counts):
+    median = np.median(counts)
+    dev = np.abs(counts - median)
+    kept = counts[dev <= 3. * np.median(dev)]
+    return float(kept.mean())
+
+# Fixed size store of recent samples with running statistics
+class SampleRing:
+    def __init__(self, np, size):
+        self.np = np
+        self.size = size
+        self.times = np.zeros(size)
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.pos = self.count = 0
+        # Raw counts are integers, so the running sums are exact
+        self.total = self.total_sq = 0
+    def clear(self):
+        self.pos = self.count = 0
+        self.total = self.total_sq = 0
+    def extend(self, times, counts):
+        np = self.np
+        size = self.size
+        if len(counts) > size:
+            times = times[-size:]
+            counts = counts[-size:]
+        num = len(counts)
+        # Remove evicted samples from running statistics
+        evict = self.count + num - size
+        if evict > 0:
+            idx = (self.pos - self.count + np.arange(evict)) % size
+            old = self.counts[idx]
+            self.total -= int(old.sum())
+            self.total_sq -= int((old * old).sum())
+            self.count -= evict
+        idx = (self.pos + np.arange(num)) % size
+        self.times[idx] = times
+        self.counts[idx] = counts
+        self.total += int(counts.sum())
+        self.total_sq += int((counts * counts).sum())
+        self.pos = (self.pos + num) % size
+        self.count += num
+    def get_last(self):
+        i = (self.pos - 1) % self.size
+        return self.times[i], int(self.counts[i])
+    def get_mean(self):
+        return self.total / float(self.count)
+    def get_variance(self):
+        count = self.count
+        return ((count * self.total_sq - self.total**2)
+                / float(count * count))
+    def get_filtered_mean(self):
+        return filtered_mean(self.np, self.counts[:self.count])
+    def get_samples(self):
+        idx = (self.pos - self.count + self.np.arange(self.count)) % self.size
+        return self.times[idx], self.counts[idx]
+
+# Interface class to hx711 mcu support
+class HX711:
     def __init__(self, config):
-        self.values = []
-        self.weight = 0
-
+        self.printer = printer = config.get_printer()
         self.name = config.get_name()
-        self.control_pin = config.getint('control_pin')
-        self.data_pin = config.getint('data_pin')
-        self.ratio = config.getfloat('ratio')
-        self.offset = config.getint('offset')
-        self.max_saved_values = config.getint('max_saved_values')
-        
-        self.printer = config.get_printer()
-        self.reactor = self.printer.get_reactor()
-        self.hx = HX711(self.data_pin, self.control_pin, self.reactor)
-        
-        self.hx.set_scale_ratio(self.ratio)
-        self.hx.set_offset(self.offset)
-
-    def sample_hx711(self):
-        if len(self.values) > self.max_saved_values:
-            self.values.pop(0)
-        value = self.hx.get_weight_mean(readings=1)
-        if value:
-            self.values.append(value)
-            self.weight = sum(self.values) / len(self.values) if len(self.values) > 0 else 0
-
+        self.sample_rate = config.getchoice('sample_rate', SAMPLE_RATES, '10')
+        gain_pulses = config.getchoice('gain', GAINS, 'A-128')
+        self.ratio = config.getfloat('ratio', 1.)
+        if not self.ratio:
+            raise config.error("Option 'ratio' in section '%s' must not be 0"
+                               % (self.name,))
+        self.offset = config.getint('offset', 0)
+        max_saved_values = config.getint('max_saved_values', 10, minval=1)
+        try:
+            import numpy
+        except:
+            raise config.error("HX711 requires numpy module")
+        self.np = numpy
+        self.ring = SampleRing(numpy, max_saved_values)
+        self.last_weight = self.weight = self.stddev = 0.
+        self.weight_time = 0.
+        self.status = {"weight": 0., "values": []}
+        # Setup mcu sensor_hx711 bulk query code
+        ppins = printer.lookup_object('pins')
+        dout_params = ppins.lookup_pin(config.get('dout_pin'))
+        sclk_params = ppins.lookup_pin(config.get('sclk_pin'))
+        self.mcu = mcu = dout_params['chip']
+        if sclk_params['chip'] is not mcu:
+            raise config.error("hx711 '%s' pins must be on the same mcu"
+                               % (self.name,))
+        self.oid = oid = mcu.create_oid()
+        self.query_hx711_cmd = None
+        mcu.add_config_cmd("config_hx711 oid=%d dout_pin=%s sclk_pin=%s"
+                           " gain_pulses=%d" % (oid, dout_params['pin'],
+                                                sclk_params['pin'],
+                                                gain_pulses))
+        mcu.add_config_cmd("query_hx711 oid=%d rest_ticks=0"
+                           % (oid,), on_restart=True)
+        mcu.register_config_callback(self._build_config)
+        # Bulk sample message reading
+        chip_smooth = self.sample_rate * BATCH_UPDATES * 2
+        self.ffreader = bulk_sensor.FixedFreqReader(mcu, chip_smooth, "<i")
+        self.last_error_count = 0
+        # Process messages in batches
+        self.batch_bulk = bulk_sensor.BatchBulkHelper(
+            printer, self._process_batch,
+            self._start_measurements, self._finish_measurements, BATCH_UPDATES)
+        hdr = ('time', 'counts', 'weight')
+        self.batch_bulk.add_mux_endpoint("hx711/dump_hx711", "sensor",
+                                         self.name.split()[-1],
+                                         {'header': hdr})
+        printer.register_event_handler("klippy:ready", self._handle_ready)
+    def _build_config(self):
+        cmdqueue = self.mcu.alloc_command_queue()
+        self.query_hx711_cmd = self.mcu.lookup_command(
+            "query_hx711 oid=%c rest_ticks=%u", cq=cmdqueue)
+        self.ffreader.setup_query_command("query_hx711_status oid=%c",
+                                          oid=self.oid, cq=cmdqueue)
+    def _handle_ready(self):
+        if self.mcu.is_fileoutput():
+            return
+        # Continuously track the weight reported by the sensor
+        self.batch_bulk.add_client(self._handle_batch)
+    def _handle_batch(self, msg):
+        data = self.np.array(msg['data'])
+        self.ring.extend(data[:, 0], data[:, 1].astype(self.np.int64))
+        self._update_weight()
+        return True
+    def add_client(self, cb):
+        self.batch_bulk.add_client(cb)
+    def get_mcu(self):
+        return self.mcu
+    # Measurement decoding
+    def _convert_samples(self, samples):
+        offset = self.offset
+        inv_ratio = 1. / self.ratio
+        count = 0
+        for ptime, counts in samples:
+            if counts in SATURATED_VALUES:
+                self.last_error_count += 1
+                continue
+            samples[count] = (round(ptime, 6), counts,
+                              (counts - offset) * inv_ratio)
+            count += 1
+        del samples[count:]
+    # Start, stop, and process message batches
+    def _start_measurements(self):
+        # Poll the chip faster than its conversion rate
+        rest_ticks = self.mcu.seconds_to_clock(0.25 / self.sample_rate)
+        self.query_hx711_cmd.send([self.oid, rest_ticks])
+        logging.info("HX711 starting '%s' measurements", self.name)
+        # Initialize clock tracking
+        self.ffreader.note_start()
+        self.last_error_count = 0
+    def _finish_measurements(self):
+        # Halt bulk reading
+        self.query_hx711_cmd.send_wait_ack([self.oid, 0])
+        self.ffreader.note_end()
+        logging.info("HX711 finished '%s' measurements", self.name)
+    def _process_batch(self, eventtime):
+        samples = self.ffreader.pull_samples()
+        self._convert_samples(samples)
+        if not samples:
+            return {}
+        return {'data': samples, 'errors': self.last_error_count,
+                'overflows': self.ffreader.get_last_overflows()}
+    # Calibration
+    def _read_counts(self, count):
+        counts = []
+        def handle_batch(msg):
+            if len(counts) < count:
+                counts.extend([s[1] for s in msg['data']])
+            return len(counts) < count
+        self.batch_bulk.add_client(handle_batch)
+        reactor = self.printer.get_reactor()
+        eventtime = reactor.monotonic()
+        timeout = eventtime + 2. + count / float(self.sample_rate)
+        while len(counts) < count:
+            if eventtime > timeout:
+                # Stop the client on its next batch
+                count = 0
+                raise self.printer.command_error(
+                    "Timeout reading samples from %s" % (self.name,))
+            eventtime = reactor.pause(eventtime + BATCH_UPDATES)
+        return filtered_mean(self.np, self.np.array(counts[:count]))
     def empty_calibration(self):
-        self.hx.zero(readings=30)
-        offset = self.hx.get_current_offset()
-        config = self.printer.lookup_object('configfile')
-        config.set(self.name, 'offset', offset)
-
+        self.offset = int(round(self._read_counts(CALIBRATION_SAMPLES)))
+        self._reset_samples()
+        configfile = self.printer.lookup_object('configfile')
+        configfile.set(self.name, 'offset', "%d" % (self.offset,))
     def weight_calibration(self, known_weight):
-        value = float(known_weight) # in kilograms
-        data = self.hx.get_data_mean(readings=30)
-        self.hx.set_scale_ratio( data / value )
-        config = self.printer.lookup_object('configfile')
-        config.set(self.name, 'ratio', self.hx.get_current_scale_ratio())
-
+        if not known_weight:
+            raise self.printer.command_error(
+                "Calibration weight must not be zero")
+        counts = self._read_counts(CALIBRATION_SAMPLES)
+        self.ratio = (counts - self.offset) / float(known_weight)
+        if not self.ratio:
+            raise self.printer.command_error(
+                "Unable to calibrate %s (no change in reading)" % (self.name,))
+        self._reset_samples()
+        configfile = self.printer.lookup_object('configfile')
+        configfile.set(self.name, 'ratio', "%.6f" % (self.ratio,))
+    # Weight reporting
+    def _counts_to_weight(self, counts):
+        return (counts - self.offset) / self.ratio
+    def _update_weight(self):
+        # Statistics are only recalculated when new samples arrive
+        ring = self.ring
+        if not ring.count:
+            self.last_weight = self.weight = self.stddev = 0.
+            self.weight_time = 0.
+            self.status = {"weight": 0., "values": []}
+            return
+        self.last_weight = self._counts_to_weight(ring.get_last()[1])
+        self.weight = self._counts_to_weight(ring.get_filtered_mean())
+        self.stddev = ring.get_variance()**.5 / abs(self.ratio)
+        times, counts = ring.get_samples()
+        self.weight_time = float(times.mean())
+        values = self._counts_to_weight(counts).tolist()
+        self.status = {"weight": self.weight, "values": values}
+    def _reset_samples(self):
+        self.ring.clear()
+        self._update_weight()
     def get_weight(self, average=False):
-        return self.weight if average else self.values[-1]
-    
+        return self.weight if average else self.last_weight
+    def get_weight_time(self):
+        # Approximate print_time of the filtered weight
+        return self.weight_time
+    def get_stddev(self):
+        return self.stddev
     def get_values(self):
-        return self.values
-
+        return self.status['values']
+    def get_samples(self):
+        times, counts = self.ring.get_samples()
+        return list(zip(times.tolist(),
+                        self._counts_to_weight(counts).tolist()))
     def get_status(self, eventtime):
-        return {
-            "weight": self.weight,
-            "values": self.values
-        }
+        return self.status
 
 def load_config_prefix(config):
-    return Wrapper(config)
-
-# https://github.com/gandalf15/HX711/blob/master/python_examples/all_methods_example.py
-class HX711:
-    def __init__(self, dout_pin, pd_sck_pin, reactor, gain_channel_A=128, select_channel='A'):
-        self.reactor = reactor
-
-        if (isinstance(dout_pin, int)):
-            if (isinstance(pd_sck_pin, int)):
-                self._pd_sck = pd_sck_pin
-                self._dout = dout_pin
-            else:
-                raise TypeError('pd_sck_pin must be type int. '
-                                'Received pd_sck_pin: {}'.format(pd_sck_pin))
-        else:
-            raise TypeError('dout_pin must be type int. '
-                            'Received dout_pin: {}'.format(dout_pin))
-
-        self._gain_channel_A = 0
-        self._offset_A_128 = 0  # offset for channel A and gain 128
-        self._offset_A_64 = 0  # offset for channel A and gain 64
-        self._offset_B = 0  # offset for channel B
-        self._last_raw_data_A_128 = 0
-        self._last_raw_data_A_64 = 0
-        self._last_raw_data_B = 0
-        self._wanted_channel = ''
-        self._current_channel = ''
-        self._scale_ratio_A_128 = 1  # scale ratio for channel A and gain 128
-        self._scale_ratio_A_64 = 1  # scale ratio for channel A and gain 64
-        self._scale_ratio_B = 1  # scale ratio for channel B
-        self._debug_mode = False
-        self._data_filter = self.outliers_filter  # default it is used outliers_filter
-
-        GPIO.setup(self._pd_sck, GPIO.OUT)  # pin _pd_sck is output only
-        GPIO.setup(self._dout, GPIO.IN)  # pin _dout is input only
-        self.select_channel(select_channel)
-        self.set_gain_A(gain_channel_A)
-
-    def sleep(self, delay):
-        time = self.reactor.monotonic()
-        self.reactor.pause(time + delay)
-
-    def select_channel(self, channel):
-        channel = channel.capitalize()
-        if (channel == 'A'):
-            self._wanted_channel = 'A'
-        elif (channel == 'B'):
-            self._wanted_channel = 'B'
-        else:
-            raise ValueError('Parameter "channel" has to be "A" or "B". '
-                             'Received: {}'.format(channel))
-        # after changing channel or gain it has to wait 50 ms to allow adjustment.
-        # the data before is garbage and cannot be used.
-        self._read()
-        self.sleep(0.5)
-
-    def set_gain_A(self, gain):
-        if gain == 128:
-            self._gain_channel_A = gain
-        elif gain == 64:
-            self._gain_channel_A = gain
-        else:
-            raise ValueError('gain has to be 128 or 64. '
-                             'Received: {}'.format(gain))
-        # after changing channel or gain it has to wait 50 ms to allow adjustment.
-        # the data before is garbage and cannot be used.
-        self._read()
-        self.sleep(0.5)
-
-    def zero(self, readings=30):
-        if readings > 0 and readings < 100:
-            result = self.get_raw_data_mean(readings)
-            if result != False:
-                if (self._current_channel == 'A' and
-                        self._gain_channel_A == 128):
-                    self._offset_A_128 = result
-                    return False
-                elif (self._current_channel == 'A' and
-                      self._gain_channel_A == 64):
-                    self._offset_A_64 = result
-                    return False
-                elif (self._current_channel == 'B'):
-                    self._offset_B = result
-                    return False
-                else:
-                    if self._debug_mode:
-                        print('Cannot zero() channel and gain mismatch.\n'
-                              'current channel: {}\n'
-                              'gain A: {}\n'.format(self._current_channel,
-                                                    self._gain_channel_A))
-                    return True
-            else:
-                if self._debug_mode:
-                    print('From method "zero()".\n'
-                          'get_raw_data_mean(readings) returned False.\n')
-                return True
-        else:
-            raise ValueError('Parameter "readings" '
-                             'can be in range 1 up to 99. '
-                             'Received: {}'.format(readings))
-
-    def set_offset(self, offset, channel='', gain_A=0):
-        channel = channel.capitalize()
-        if isinstance(offset, int):
-            if channel == 'A' and gain_A == 128:
-                self._offset_A_128 = offset
-                return
-            elif channel == 'A' and gain_A == 64:
-                self._offset_A_64 = offset
-                return
-            elif channel == 'B':
-                self._offset_B = offset
-                return
-            elif channel == '':
-                if self._current_channel == 'A' and self._gain_channel_A == 128:
-                    self._offset_A_128 = offset
-                    return
-                elif self._current_channel == 'A' and self._gain_channel_A == 64:
-                    self._offset_A_64 = offset
-                    return
-                else:
-                    self._offset_B = offset
-                    return
-            else:
-                raise ValueError('Parameter "channel" has to be "A" or "B". '
-                                 'Received: {}'.format(channel))
-        else:
-            raise TypeError('Parameter "offset" has to be integer. '
-                            'Received: ' + str(offset) + '\n')
-
-    def set_scale_ratio(self, scale_ratio, channel='', gain_A=0):
-        channel = channel.capitalize()
-        if isinstance(gain_A, int):
-            if channel == 'A' and gain_A == 128:
-                self._scale_ratio_A_128 = scale_ratio
-                return
-            elif channel == 'A' and gain_A == 64:
-                self._scale_ratio_A_64 = scale_ratio
-                return
-            elif channel == 'B':
-                self._scale_ratio_B = scale_ratio
-                return
-            elif channel == '':
-                if self._current_channel == 'A' and self._gain_channel_A == 128:
-                    self._scale_ratio_A_128 = scale_ratio
-                    return
-                elif self._current_channel == 'A' and self._gain_channel_A == 64:
-                    self._scale_ratio_A_64 = scale_ratio
-                    return
-                else:
-                    self._scale_ratio_B = scale_ratio
-                    return
-            else:
-                raise ValueError('Parameter "channel" has to be "A" or "B". '
-                                 'received: {}'.format(channel))
-        else:
-            raise TypeError('Parameter "gain_A" has to be integer. '
-                            'Received: ' + str(gain_A) + '\n')
-
-    def set_data_filter(self, data_filter):
-        if callable(data_filter):
-            self._data_filter = data_filter
-        else:
-            raise TypeError('Parameter "data_filter" must be a function. '
-                            'Received: {}'.format(data_filter))
-
-    def set_debug_mode(self, flag=False):
-        if flag == False:
-            self._debug_mode = False
-            print('Debug mode DISABLED')
-            return
-        elif flag == True:
-            self._debug_mode = True
-            print('Debug mode ENABLED')
-            return
-        else:
-            raise ValueError('Parameter "flag" can be only BOOL value. '
-                             'Received: {}'.format(flag))
-
-    def _save_last_raw_data(self, channel, gain_A, data):
-        if channel == 'A' and gain_A == 128:
-            self._last_raw_data_A_128 = data
-        elif channel == 'A' and gain_A == 64:
-            self._last_raw_data_A_64 = data
-        elif channel == 'B':
-            self._last_raw_data_B = data
-        else:
-            return False
-
-    def _ready(self):
-        # if DOUT pin is low data is ready for reading
-        if GPIO.input(self._dout) == 0:
-            return True
-        else:
-            return False
-
-    def _set_channel_gain(self, num):
-        for _ in range(num):
-            start_counter = self.reactor.monotonic()
-            GPIO.output(self._pd_sck, True)
-            GPIO.output(self._pd_sck, False)
-            end_counter = self.reactor.monotonic()
-            # check if hx 711 did not turn off...
-            if end_counter - start_counter >= 0.00006:
-                # if pd_sck pin is HIGH for 60 us and more than the HX 711 enters power down mode.
-                if self._debug_mode:
-                    print('Not enough fast while setting gain and channel')
-                    print(
-                        'Time elapsed: {}'.format(end_counter - start_counter))
-                # hx711 has turned off. First few readings are inaccurate.
-                # Despite it, this reading was ok and data can be used.
-                result = self.get_raw_data_mean(6)  # set for the next reading.
-                if result == False:
-                    return False
-        return True
-
-    def _read(self):
-        GPIO.output(self._pd_sck, False)  # start by setting the pd_sck to 0
-        ready_counter = 0
-        while (not self._ready() and ready_counter <= 40):
-            self.sleep(0.01)  # sleep for 10 ms because data is not ready
-            ready_counter += 1
-            if ready_counter == 50:  # if counter reached max value then return False
-                if self._debug_mode:
-                    print('self._read() not ready after 40 trials\n')
-                return False
-
-        # read first 24 bits of data
-        data_in = 0  # 2's complement data from hx 711
-        for _ in range(24):
-            start_counter = self.reactor.monotonic()
-            # request next bit from hx 711
-            GPIO.output(self._pd_sck, True)
-            GPIO.output(self._pd_sck, False)
-            end_counter = self.reactor.monotonic()
-            if end_counter - start_counter >= 0.00006:  # check if the hx 711 did not turn off...
-                # if pd_sck pin is HIGH for 60 us and more than the HX 711 enters power down mode.
-                if self._debug_mode:
-                    print('Not enough fast while reading data')
-                    print(
-                        'Time elapsed: {}'.format(end_counter - start_counter))
-                return False
-            # Shift the bits as they come to data_in variable.
-            # Left shift by one bit then bitwise OR with the new bit.
-            data_in = (data_in << 1) | GPIO.input(self._dout)
-
-        if self._wanted_channel == 'A' and self._gain_channel_A == 128:
-            if not self._set_channel_gain(1):  # send only one bit which is 1
-                return False  # return False because channel was not set properly
-            else:
-                self._current_channel = 'A'  # else set current channel variable
-                self._gain_channel_A = 128  # and gain
-        elif self._wanted_channel == 'A' and self._gain_channel_A == 64:
-            if not self._set_channel_gain(3):  # send three ones
-                return False  # return False because channel was not set properly
-            else:
-                self._current_channel = 'A'  # else set current channel variable
-                self._gain_channel_A = 64
-        else:
-            if not self._set_channel_gain(2):  # send two ones
-                return False  # return False because channel was not set properly
-            else:
-                self._current_channel = 'B'  # else set current channel variable
-
-        if self._debug_mode:  # print 2's complement value
-            print('Binary value as received: {}'.format(bin(data_in)))
-
-        #check if data is valid
-        if (data_in == 0x7fffff
-                or  # 0x7fffff is the highest possible value from hx711
-                data_in == 0x800000
-           ):  # 0x800000 is the lowest possible value from hx711
-            if self._debug_mode:
-                print('Invalid data detected: {}\n'.format(data_in))
-            return False  # rturn false because the data is invalid
-
-        # calculate int from 2's complement
-        signed_data = 0
-        # 0b1000 0000 0000 0000 0000 0000 check if the sign bit is 1. Negative number.
-        if (data_in & 0x800000):
-            signed_data = -(
-                (data_in ^ 0xffffff) + 1)  # convert from 2's complement to int
-        else:  # else do not do anything the value is positive number
-            signed_data = data_in
-
-        if self._debug_mode:
-            print('Converted 2\'s complement value: {}'.format(signed_data))
-
-        return signed_data
-
-    def get_raw_data_mean(self, readings=30):
-        # do backup of current channel befor reading for later use
-        backup_channel = self._current_channel
-        backup_gain = self._gain_channel_A
-        data_list = []
-        # do required number of readings
-        for _ in range(readings):
-            data_list.append(self._read())
-        data_mean = False
-        if readings > 2 and self._data_filter:
-            filtered_data = self._data_filter(data_list)
-            if not filtered_data:
-                return False
-            if self._debug_mode:
-                print('data_list: {}'.format(data_list))
-                print('filtered_data list: {}'.format(filtered_data))
-                print('data_mean:', np.mean(filtered_data))
-            data_mean = np.mean(filtered_data)
-        else:
-            data_mean = np.mean(data_list)
-        self._save_last_raw_data(backup_channel, backup_gain, data_mean)
-        return int(data_mean)
-
-    def get_data_mean(self, readings=30):
-        result = self.get_raw_data_mean(readings)
-        if result != False:
-            if self._current_channel == 'A' and self._gain_channel_A == 128:
-                return result - self._offset_A_128
-            elif self._current_channel == 'A' and self._gain_channel_A == 64:
-                return result - self._offset_A_64
-            else:
-                return result - self._offset_B
-        else:
-            return False
-
-    def get_weight_mean(self, readings=30):
-        result = self.get_raw_data_mean(readings)
-        if result != False:
-            if self._current_channel == 'A' and self._gain_channel_A == 128:
-                return float(
-                    (result - self._offset_A_128) / self._scale_ratio_A_128)
-            elif self._current_channel == 'A' and self._gain_channel_A == 64:
-                return float(
-                    (result - self._offset_A_64) / self._scale_ratio_A_64)
-            else:
-                return float((result - self._offset_B) / self._scale_ratio_B)
-        else:
-            return False
-
-    def get_current_channel(self):
-        return self._current_channel
-
-    def get_data_filter(self):
-        return self._data_filter
-
-    def get_current_gain_A(self):
-        return self._gain_channel_A
-
-    def get_last_raw_data(self, channel='', gain_A=0):
-        channel = channel.capitalize()
-        if channel == 'A' and gain_A == 128:
-            return self._last_raw_data_A_128
-        elif channel == 'A' and gain_A == 64:
-            return self._last_raw_data_A_64
-        elif channel == 'B':
-            return self._last_raw_data_B
-        elif channel == '':
-            if self._current_channel == 'A' and self._gain_channel_A == 128:
-                return self._last_raw_data_A_128
-            elif self._current_channel == 'A' and self._gain_channel_A == 64:
-                return self._last_raw_data_A_64
-            else:
-                return self._last_raw_data_B
-        else:
-            raise ValueError(
-                'Parameter "channel" has to be "A" or "B". '
-                'Received: {} \nParameter "gain_A" has to be 128 or 64. Received {}'
-                .format(channel, gain_A))
-
-    def get_current_offset(self, channel='', gain_A=0):
-        channel = channel.capitalize()
-        if channel == 'A' and gain_A == 128:
-            return self._offset_A_128
-        elif channel == 'A' and gain_A == 64:
-            return self._offset_A_64
-        elif channel == 'B':
-            return self._offset_B
-        elif channel == '':
-            if self._current_channel == 'A' and self._gain_channel_A == 128:
-                return self._offset_A_128
-            elif self._current_channel == 'A' and self._gain_channel_A == 64:
-                return self._offset_A_64
-            else:
-                return self._offset_B
-        else:
-            raise ValueError(
-                'Parameter "channel" has to be "A" or "B". '
-                'Received: {} \nParameter "gain_A" has to be 128 or 64. Received {}'
-                .format(channel, gain_A))
-
-    def get_current_scale_ratio(self, channel='', gain_A=0):
-        channel = channel.capitalize()
-        if channel == 'A' and gain_A == 128:
-            return self._scale_ratio_A_128
-        elif channel == 'A' and gain_A == 64:
-            return self._scale_ratio_A_64
-        elif channel == 'B':
-            return self._scale_ratio_B
-        elif channel == '':
-            if self._current_channel == 'A' and self._gain_channel_A == 128:
-                return self._scale_ratio_A_128
-            elif self._current_channel == 'A' and self._gain_channel_A == 64:
-                return self._scale_ratio_A_64
-            else:
-                return self._scale_ratio_B
-        else:
-            raise ValueError(
-                'Parameter "channel" has to be "A" or "B". '
-                'Received: {} \nParameter "gain_A" has to be 128 or 64. Received {}'
-                .format(channel, gain_A))
-
-    def power_down(self):
-        GPIO.output(self._pd_sck, False)
-        GPIO.output(self._pd_sck, True)
-        self.sleep(0.01)
-
-    def power_up(self):
-        GPIO.output(self._pd_sck, False)
-        self.sleep(0.01)
-
-    def reset(self):
-        self.power_down()
-        self.power_up()
-        result = self.get_raw_data_mean(6)
-        if result:
-            return False
-        else:
-            return True
-
-
-    def outliers_filter(self, data_list, stdev_thresh = 1.0):
-        # filter out -1 which indicates no signal
-        # filter out booleans
-        data = [num for num in data_list if (num != -1 and num != False and num != True)] 
-        if not data:
-            return []
-
-        median = np.median(data)
-        dists_from_median = [(abs(measurement - median)) for measurement in data]
-        stdev = np.std(dists_from_median)
-        if stdev:
-            ratios_to_stdev = [(dist / stdev) for dist in dists_from_median]
-        else:
-            # stdev is 0. Therefore return just the median
-            return [median]
-        filtered_data = []
-        for i in range(len(data)):
-            if ratios_to_stdev[i] < stdev_thresh:
-                filtered_data.append(data[i])
-        return filtered_data
+    return HX711(config)
@@ -0,0 +1,172 @@
+# Append-only journal of print progress records
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import os, logging, threading, struct, json, zlib
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Each record has a fixed size so that a torn write (for example, due
+# to a power failure) can only damage the last record.  A record is a
+# header (magic, crc32, sequence, payload length) followed by a json
+# payload padded with zeros.  On recovery the last record with a valid
+# crc is used.
+RECORD_MAGIC = b'KPJ1'
+RECORD_HEADER = struct.Struct('<4sIQI')
+RECORD_SIZE = 2048
+MAX_RECORDS = 512
+
+class error(Exception):
+    pass
+
+def pack_record(seq, data):
+    payload = json.dumps(data, separators=(',', ':')).encode()
+    if len(payload) > RECORD_SIZE - RECORD_HEADER.size:
+        raise error("Progress record too large (%d bytes)" % (len(payload),))
+    crc = zlib.crc32(struct.pack('<Q', seq) + payload) & 0xffffffff
+    header = RECORD_HEADER.pack(RECORD_MAGIC, crc, seq, len(payload))
+    return (header + payload).ljust(RECORD_SIZE, b'\0')
+
+def unpack_record(rec):
+    if len(rec) < RECORD_HEADER.size:
+        return None
+    magic, crc, seq, plen = RECORD_HEADER.unpack_from(rec)
+    if magic != RECORD_MAGIC or plen > RECORD_SIZE - RECORD_HEADER.size:
+        return None
+    payload = rec[RECORD_HEADER.size:RECORD_HEADER.size + plen]
+    if zlib.crc32(struct.pack('<Q', seq) + payload) & 0xffffffff != crc:
+        return None
+    try:
+        return json.loads(payload.decode())
+    except ValueError:
+        return None
+
+def read_last_record(filename):
+    # Return the payload of the last intact record (or None)
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    if not data.startswith(RECORD_MAGIC):
+        # File created by older code (a single json dictionary)
+        try:
+            return json.loads(data.decode())
+        except ValueError:
+            return None
+    for pos in range((len(data) // RECORD_SIZE - 1) * RECORD_SIZE, -1,
+                     -RECORD_SIZE):
+        res = unpack_record(data[pos:pos + RECORD_SIZE])
+        if res is not None:
+            return res
+    return None
+
+# Write journal records from a background thread
+class ProgressJournal:
+    def __init__(self, filename, max_records=MAX_RECORDS):
+        self.filename = filename
+        self.max_records = max_records
+        self.has_records = os.path.exists(filename)
+        self.seq = 0
+        self.bg_queue = queue.Queue()
+        self.bg_thread = None
+        self.fd = None
+        self.file_records = 0
+    # Main thread interface
+    def append(self, data):
+        self.seq += 1
+        rec = pack_record(self.seq, data)
+        self.has_records = True
+        self._queue_request('append', rec)
+    def remove(self):
+        self.has_records = False
+        self._queue_request('remove', None)
+    def flush(self):
+        if self.bg_thread is not None:
+            self.bg_queue.join()
+    def exists(self):
+        return self.has_records
+    def read_last(self):
+        self.flush()
+        return read_last_record(self.filename)
+    def stop(self):
+        if self.bg_thread is not None:
+            self.bg_queue.put(None)
+            self.bg_thread.join()
+            self.bg_thread = None
+    def _queue_request(self, action, rec):
+        if self.bg_thread is None:
+            self.bg_thread = threading.Thread(target=self._bg_thread)
+            self.bg_thread.daemon = True
+            self.bg_thread.start()
+        self.bg_queue.put((action, rec))
+    # Background thread
+    def _open(self):
+        self.fd = os.open(self.filename, os.O_WRONLY|os.O_CREAT|os.O_APPEND,
+                          0o644)
+        fsize = os.fstat(self.fd).st_size
+        if fsize % RECORD_SIZE:
+            # Drop the remains of a torn write so records stay aligned
+            os.ftruncate(self.fd, fsize - fsize % RECORD_SIZE)
+        self.file_records = fsize // RECORD_SIZE
+    def _close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+    def _rotate(self, rec):
+        # Atomically replace the journal with one holding only 'rec'
+        tmpname = self.filename + '.tmp'
+        fd = os.open(tmpname, os.O_WRONLY|os.O_CREAT|os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, rec)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._close()
+        os.rename(tmpname, self.filename)
+        self._open()
+    def _process(self, action, rec):
+        if action == 'remove':
+            self._close()
+            if os.path.exists(self.filename):
+                os.remove(self.filename)
+            return False
+        if self.fd is None:
+            self._open()
+        if self.file_records >= self.max_records:
+            self._rotate(rec)
+            return False
+        os.write(self.fd, rec)
+        self.file_records += 1
+        return True
+    def _bg_thread(self):
+        while 1:
+            reqs = [self.bg_queue.get(True)]
+            # Batch all pending requests into a single fsync
+            while 1:
+                try:
+                    reqs.append(self.bg_queue.get_nowait())
+                except queue.Empty:
+                    break
+            need_sync = False
+            for req in reqs:
+                if req is None:
+                    continue
+                try:
+                    need_sync |= self._process(*req)
+                except:
+                    logging.exception("Unable to update progress journal")
+                    self._close()
+            if need_sync and self.fd is not None:
+                try:
+                    os.fsync(self.fd)
+                except:
+                    logging.exception("Unable to sync progress journal")
+            for req in reqs:
+                self.bg_queue.task_done()
+            if None in reqs:
+                self._close()
+                break
@@ -21,7 +21,10 @@ class ResurrectionButton:
         self.sdcard = self.printer.lookup_object('virtual_sdcard')
 
     def button_callback(self, eventtime, state):
-        self.sdcard.cmd_SAVE_PROGRESS(self.gcode)
+        try:
+            self.sdcard.cmd_SAVE_PROGRESS(self.gcode)
+        except self.gcode.error as e:
+            self.gcode.respond_raw("!! %s" % (e,))
         self.sdcard.force_pause()
         self.gcode.respond_raw('!! Power alert!')
         self.last_state = state
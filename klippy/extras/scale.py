@@ -1,4 +1,5 @@
 import logging
+from . import spool_estimator
 
 class Scale():
     def __init__(self, config):
@@ -10,46 +11,55 @@ class Scale():
         self.density = config.getfloat('density', 0)
 
         self.lifted_filament_alarm = config.getboolean('lifted_filament_alarm', default=False)
+        self.last_weight = None
+        self.check_interval = config.getfloat('check_interval', 5.,
+                                              minval=0.1)
+        self.estimator = None
+        if config.get('extruder', None) is not None:
+            self.estimator = spool_estimator.SpoolEstimator(config, self)
         
         self.gcode = self.printer.lookup_object('gcode')
         self.reactor = self.printer.get_reactor()
-        self.timer = self.reactor.register_timer(self._measure_n_check_timer, 5.)
+        self.timer = self.reactor.register_timer(self._measure_n_check_timer,
+                                                 self.check_interval)
 
     def _measure_n_check_timer(self, eventtime):
-        # measuring
-        for s in self.sensors:
-            s.sample_hx711()
-
-        # checking
+        # The sensors are sampled by the mcu - check the latest weight
+        values = [s.get_weight(average=True) for s in self.sensors]
+        weight = sum(values) / len(values) if values else 0.
+        if self.estimator is not None:
+            times = [s.get_weight_time() for s in self.sensors]
+            if times and min(times):
+                self.estimator.note_weight(eventtime,
+                                           sum(times) / len(times), weight)
         if self.lifted_filament_alarm:
-            all_values = [s.get_values() for s in self.sensors]
-            i_stop = min([len(x) for x in all_values])
-            mean_values = []
-            for i in range(i_stop):
-                temp = sum([x[i] for x in all_values])
-                mean_values.append(temp / len(all_values))
-                
-            if len(mean_values) > 1 and mean_values[-2] > self.tare and mean_values[-1] < 0.1:
+            last_weight = self.last_weight
+            self.last_weight = weight
+            if (last_weight is not None and last_weight > self.tare
+                and weight < 0.1):
                 self.gcode._respond_error("Errore: La bobina e' stata sollevata!")
                 if self.is_printing(eventtime):
                     self.gcode.run_script_from_command("PAUSE")
 
         # next execution time
         measured_time = self.reactor.monotonic()
-        return measured_time + 5.
+        return measured_time + self.check_interval
 
     def get_weight(self, eventtime):
         values = [s.get_weight(average=self.is_printing(eventtime)) for s in self.sensors]
         return sum(values) / len(values) if len(values) > 0 else 0
 
     def get_status(self, eventtime):
-        return {
+        status = {
             "weight": self.get_weight(eventtime),
             "tare": float(self.tare),
             "diameter": float(self.diameter),
             "density": float(self.density),
             "lifted_filament_alarm": self.lifted_filament_alarm
         }
+        if self.estimator is not None:
+            status.update(self.estimator.get_status(eventtime))
+        return status
     
     def empty_calibration(self):
         for s in self.sensors:
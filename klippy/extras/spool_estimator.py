@@ -0,0 +1,160 @@
+# Estimate filament use and spool run-out from load cell weights
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import math, logging
+
+FIT_DECAY = 0.98
+MIN_FIT_SPAN = 20.
+RATE_DECAY = 0.8
+REFILL_WEIGHT = 20.
+
+# Exponentially weighted linear regression updated one sample at a time
+class LinearFit:
+    def __init__(self, decay):
+        self.decay = decay
+        self.reset()
+    def reset(self):
+        self.weight = self.mean_x = self.mean_y = 0.
+        self.cov_xx = self.cov_xy = 0.
+    def update(self, x, y):
+        decay = self.decay
+        self.weight = weight = decay * self.weight + 1.
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / weight
+        self.mean_y += dy / weight
+        self.cov_xx = decay * self.cov_xx + dx * (x - self.mean_x)
+        self.cov_xy = decay * self.cov_xy + dx * (y - self.mean_y)
+    def get_span(self):
+        if not self.weight:
+            return 0.
+        return math.sqrt(max(0., self.cov_xx / self.weight))
+    def get_slope(self):
+        return self.cov_xy / self.cov_xx
+    def predict(self, x, slope):
+        return self.mean_y + slope * (x - self.mean_x)
+
+# Track weight against extruder position to predict spool run-out
+class SpoolEstimator:
+    def __init__(self, config, scale):
+        self.printer = printer = config.get_printer()
+        self.scale = scale
+        self.name = config.get_name()
+        self.extruder_name = config.get('extruder')
+        self.runout_distance = config.getfloat('runout_distance', 0.,
+                                               minval=0.)
+        if self.runout_distance:
+            printer.load_object(config, 'pause_resume')
+        self.gcode = printer.lookup_object('gcode')
+        self.extruder = self.sdcard = None
+        self.fit = LinearFit(FIT_DECAY)
+        self.reset()
+        printer.register_event_handler("klippy:connect", self._handle_connect)
+    def _handle_connect(self):
+        self.extruder = self.printer.lookup_object(self.extruder_name, None)
+        if self.extruder is None:
+            raise self.printer.config_error(
+                "Unknown extruder '%s' in section '%s'"
+                % (self.extruder_name, self.name))
+        self.sdcard = self.printer.lookup_object('virtual_sdcard', None)
+    def reset(self):
+        self.fit.reset()
+        self.last_time = self.last_epos = self.last_weight = None
+        self.last_file_pos = None
+        self.extrude_rate = self.file_bytes = self.file_epos = 0.
+        self.mass_per_mm = self.remaining_weight = None
+        self.remaining_length = self.runout_file_position = None
+        self.runout_paused = False
+    def _nominal_mass_per_mm(self):
+        # Density in g/cm^3 and diameter in mm (result in g/mm)
+        radius = .5 * self.scale.diameter
+        return self.scale.density * math.pi * radius * radius * .001
+    def note_weight(self, eventtime, print_time, weight):
+        if print_time == self.last_time or self.extruder is None:
+            return
+        epos = self.extruder.find_past_position(print_time)
+        fit = self.fit
+        if (self.last_weight is not None and fit.get_span() >= MIN_FIT_SPAN
+            and weight > fit.predict(epos, fit.get_slope()) + REFILL_WEIGHT):
+            # Spool was replaced or refilled
+            logging.info("%s: weight increased - restarting estimate",
+                         self.name)
+            self.reset()
+        fit.update(epos, weight)
+        # Track extrusion rate
+        if self.last_time is not None and print_time > self.last_time:
+            rate = (epos - self.last_epos) / (print_time - self.last_time)
+            self.extrude_rate = (RATE_DECAY * self.extrude_rate
+                                 + (1. - RATE_DECAY) * rate)
+        self.last_time = print_time
+        self.last_epos = epos
+        self.last_weight = weight
+        # Determine filament mass per mm of extrusion
+        mass_per_mm = self._nominal_mass_per_mm()
+        slope = -mass_per_mm
+        if fit.get_span() >= MIN_FIT_SPAN and fit.get_slope() < 0.:
+            slope = fit.get_slope()
+            mass_per_mm = -slope
+        if mass_per_mm <= 0.:
+            self.mass_per_mm = self.remaining_weight = None
+            self.remaining_length = self.runout_file_position = None
+            return
+        self.mass_per_mm = mass_per_mm
+        self.remaining_weight = max(0., fit.predict(epos, slope)
+                                    - self.scale.tare)
+        self.remaining_length = self.remaining_weight / mass_per_mm
+        self._update_file_position(epos)
+        self._check_runout(eventtime)
+    def _update_file_position(self, epos):
+        self.runout_file_position = None
+        sdcard = self.sdcard
+        if sdcard is None or not sdcard.is_active():
+            self.last_file_pos = None
+            return
+        file_pos = sdcard.get_file_position()
+        if self.last_file_pos is not None:
+            de = epos - self.file_epos
+            db = file_pos - self.last_file_pos
+            if de > 0. and db > 0:
+                # Decaying estimate of file bytes per mm of extrusion
+                self.file_bytes = (RATE_DECAY * self.file_bytes
+                                   + (1. - RATE_DECAY) * db / de)
+        self.last_file_pos = file_pos
+        self.file_epos = epos
+        if self.file_bytes:
+            self.runout_file_position = int(
+                file_pos + self.remaining_length * self.file_bytes)
+    def _check_runout(self, eventtime):
+        if not self.runout_distance:
+            return
+        if self.remaining_length > self.runout_distance:
+            self.runout_paused = False
+            return
+        if self.runout_paused or not self.scale.is_printing(eventtime):
+            return
+        self.runout_paused = True
+        logging.info("%s: predicted filament run-out (%.1fmm remaining)",
+                     self.name, self.remaining_length)
+        self.printer.get_reactor().register_callback(self._runout_pause)
+    def _runout_pause(self, eventtime):
+        pause_resume = self.printer.lookup_object('pause_resume')
+        pause_resume.send_pause_command()
+        self.gcode.respond_info("%s: filament run-out predicted (%.1fmm left)"
+                                % (self.name, self.remaining_length))
+        try:
+            self.gcode.run_script("PAUSE\nM400")
+        except Exception:
+            logging.exception("Script running error")
+    def get_status(self, eventtime):
+        mass_flow = None
+        if self.mass_per_mm is not None:
+            mass_flow = self.extrude_rate * self.mass_per_mm
+        return {
+            "mass_per_mm": self.mass_per_mm,
+            "remaining_weight": self.remaining_weight,
+            "remaining_length": self.remaining_length,
+            "mass_flow": mass_flow,
+            "runout_file_position": self.runout_file_position
+        }
@@ -3,10 +3,14 @@
 # Copyright (C) 2018-2024  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import os, sys, logging, io, json, re
+import os, logging, io, re, mmap
+import gcode
 from kinematics.extruder import PrinterExtruder
+from . import progress_journal
 
 VALID_GCODE_EXTS = ['gcode', 'g', 'gco']
+MOVE_BATCH_LINES = 50
+STATE_SCAN_CHUNK = 1024 * 1024
 
 DEFAULT_ERROR_GCODE = """
 {% if 'heaters' in printer %}
@@ -14,11 +18,144 @@ DEFAULT_ERROR_GCODE = """
 {% endif %}
 """
 
+# Memory mapped access to a g-code file being printed
+class PrintFile:
+    def __init__(self, filename):
+        self.name = filename
+        self.file = io.open(filename, 'rb')
+        try:
+            self.file_size = os.fstat(self.file.fileno()).st_size
+            self.mm = None
+            if self.file_size:
+                self.mm = mmap.mmap(self.file.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+                if hasattr(self.mm, 'madvise'):
+                    self.mm.madvise(mmap.MADV_SEQUENTIAL)
+        except:
+            self.file.close()
+            raise
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.file.close()
+    def get_size(self):
+        return self.file_size
+    def _get_mapping(self):
+        # Accessing the mapping past the end of a file that has since
+        # been truncated raises SIGBUS - so check the size before each
+        # access and treat a truncated file as ended.
+        if self.mm is not None:
+            if os.fstat(self.file.fileno()).st_size < self.file_size:
+                logging.warning("File %s truncated while printing",
+                                self.name)
+                self.mm.close()
+                self.mm = None
+        return self.mm
+    def read(self, pos, count):
+        mm = self._get_mapping()
+        return mm[pos:pos+count] if mm is not None else b""
+    def find_line_start(self, pos):
+        # Return the start of the line containing the given position
+        mm = self._get_mapping()
+        if mm is None or pos <= 0:
+            return 0
+        pos = min(pos, self.file_size)
+        return mm.rfind(b'\n', 0, pos) + 1
+    def read_lines(self, pos, count=8192):
+        # Return the complete lines found in roughly the next 'count'
+        # bytes along with the size in bytes (including newline) of each
+        fsize = self.file_size
+        mm = self._get_mapping()
+        if pos >= fsize or mm is None:
+            return [], []
+        end = fsize
+        if pos + count < fsize:
+            end = mm.rfind(b'\n', pos, pos + count) + 1
+            if not end:
+                # Very long line
+                end = mm.find(b'\n', pos + count) + 1 or fsize
+        data = mm[pos:end]
+        lines = data.decode().split('\n')
+        sizes = [len(l) + 1 for l in data.split(b'\n')]
+        if end == fsize and not data.endswith(b'\n'):
+            sizes[-1] -= 1
+        else:
+            lines.pop()
+            sizes.pop()
+        return lines, sizes
+
+# Track the heater, fan, positioning, and tool state set by a print file
+class PrintStateTracker:
+    state_r = re.compile(br'^[ \t]*(?:N[0-9]+[ \t]*)?'
+                         br'(M10[4679]|M1[49][01]|G9[01]|T[0-9]+)'
+                         br'(?![0-9.])([^;\n]*)', re.M | re.I)
+    def __init__(self, position=0, state=None):
+        self.position = position
+        self.state = dict(state or {})
+    def get_checkpoint(self):
+        return self.position, dict(self.state)
+    def get_state(self):
+        return dict(self.state)
+    def _note_command(self, cmd, args):
+        params = { a[:1].upper(): a[1:] for a in args.split() }
+        state = self.state
+        if cmd.startswith('T'):
+            state['tool'] = cmd
+        elif cmd in ('G90', 'G91'):
+            state['mode'] = cmd
+        elif cmd == 'M107':
+            if 'P' in params:
+                state['fan%s_speed' % (params['P'],)] = 'M106 S0 P%s' % (
+                    params['P'],)
+            else:
+                state['fan_speed'] = 'M106 S0'
+        elif 'S' not in params:
+            return
+        elif cmd == 'M106':
+            if 'P' in params:
+                state['fan%s_speed' % (params['P'],)] = 'M106 S%s P%s' % (
+                    params['S'], params['P'])
+            else:
+                state['fan_speed'] = 'M106 S%s' % (params['S'],)
+        elif cmd in ('M104', 'M109'):
+            if 'T' in params:
+                state['tool%s_temp' % (params['T'],)] = 'M109 S%s T%s' % (
+                    params['S'], params['T'])
+            else:
+                state['tool_temp'] = 'M109 S%s' % (params['S'],)
+        elif cmd in ('M140', 'M190'):
+            state['bed_temp'] = 'M190 S%s' % (params['S'],)
+        else:
+            state['chamber_temp'] = 'M141 S%s' % (params['S'],)
+    def scan(self, pfile, end):
+        # Scan up to one chunk of the file towards 'end' (which must be
+        # the start of a line).  Returns True if more data remains.
+        pos = self.position
+        if end <= pos:
+            # Rewound (eg, sdcard_loop) - state carries over
+            self.position = end
+            return False
+        data = pfile.read(pos, min(end - pos, STATE_SCAN_CHUNK))
+        if not data:
+            self.position = end
+            return False
+        if pos + len(data) < end:
+            nl = data.rfind(b'\n') + 1
+            if nl:
+                data = data[:nl]
+        for m in self.state_r.finditer(data):
+            self._note_command(m.group(1).decode().upper(),
+                               m.group(2).decode())
+        self.position = pos + len(data)
+        return self.position < end
+
 class VirtualSD:
     def __init__(self, config):
         self.printer = config.get_printer()
         self.printer.register_event_handler("klippy:shutdown",
                                             self.handle_shutdown)
+        self.printer.register_event_handler("klippy:disconnect",
+                                            self.handle_disconnect)
         # sdcard state
         sd = config.get('path')
         self.sdcard_dirname = os.path.normpath(os.path.expanduser(sd))
@@ -30,6 +167,11 @@ class VirtualSD:
         raw_script = config.get('post_resurrection', default='')
         self.post_resurrection = '\n' + raw_script.strip()
         self.resurrect_file = os.path.join(self.sdcard_dirname, '.resurrect')
+        self.progress_journal = progress_journal.ProgressJournal(
+            self.resurrect_file)
+        self.progress_interval = config.getfloat('progress_interval', 0.,
+                                                 minval=0.)
+        self.next_progress_time = 0.
         self.available_extruders = [n for n, o in self.printer.lookup_objects()
                    if isinstance(o, PrinterExtruder)]
         # Print Stat Tracking
@@ -39,6 +181,8 @@ class VirtualSD:
         self.must_pause_work = self.cmd_from_sd = False
         self.next_file_position = 0
         self.work_timer = None
+        self.batch_moves = config.getboolean('batch_moves', True)
+        self.state_tracker = PrintStateTracker()
         # Error handling
         gcode_macro = self.printer.load_object(config, 'gcode_macro')
         self.on_error_gcode = gcode_macro.load_template(
@@ -72,14 +216,15 @@ class VirtualSD:
             try:
                 readpos = max(self.file_position - 1024, 0)
                 readcount = self.file_position - readpos
-                self.current_file.seek(readpos)
-                data = self.current_file.read(readcount + 128)
+                data = self.current_file.read(readpos, readcount + 128)
             except:
                 logging.exception("virtual_sdcard shutdown read")
                 return
             logging.info("Virtual sdcard (%d): %s\nUpcoming (%d): %s",
                          readpos, repr(data[:readcount]),
                          self.file_position, repr(data[readcount:]))
+    def handle_disconnect(self):
+        self.progress_journal.stop()
     def stats(self, eventtime):
         if self.work_timer is None:
             return False, ""
@@ -116,7 +261,7 @@ class VirtualSD:
             'is_active': self.is_active(),
             'file_position': self.file_position,
             'file_size': self.file_size,
-            'can_resurrect': os.path.exists(self.resurrect_file)
+            'can_resurrect': self.progress_journal.exists()
         }
     def file_path(self):
         if self.current_file:
@@ -211,10 +356,8 @@ class VirtualSD:
             if fname not in flist:
                 fname = files_by_lower[fname.lower()]
             fname = os.path.join(self.sdcard_dirname, fname)
-            f = io.open(fname, 'r', newline='')
-            f.seek(0, os.SEEK_END)
-            fsize = f.tell()
-            f.seek(0)
+            f = PrintFile(fname)
+            fsize = f.get_size()
         except:
             logging.exception("virtual_sdcard file open")
             raise gcmd.error("Unable to open file")
@@ -222,6 +365,7 @@ class VirtualSD:
         gcmd.respond_raw("File selected")
         self.current_file = f
         self.file_position = 0
+        self.state_tracker = PrintStateTracker()
         self.file_size = fsize
         self.print_stats.set_current_file(filename)
     def cmd_M24(self, gcmd):
@@ -235,6 +379,8 @@ class VirtualSD:
         if self.work_timer is not None:
             raise gcmd.error("SD busy")
         pos = gcmd.get_int('S', minval=0)
+        if self.current_file is not None:
+            pos = self.current_file.find_line_start(pos)
         self.file_position = pos
     def cmd_M27(self, gcmd):
         # Report SD print status
@@ -243,45 +389,58 @@ class VirtualSD:
             return
         gcmd.respond_raw("SD printing byte %d/%d"
                          % (self.file_position, self.file_size))
+    def _save_progress(self, file_position):
+        current_print = self.file_path()
+        if not current_print:
+            return False
+        state_position, print_state = self.state_tracker.get_checkpoint()
+        self.progress_journal.append({
+            "file_position": file_position,
+            "filename": current_print,
+            "gcode_state": self.gcode_move.create_gcode_state(),
+            "extruder": self.get_toolhead().get_extruder().get_name(),
+            "state_position": state_position,
+            "print_state": print_state
+        })
+        return True
     cmd_SAVE_PROGRESS_help = "save the file progress into a file in order to recover a print after a power failure"
     def cmd_SAVE_PROGRESS(self, gcmd):
-        gcode_state = self.gcode_move.create_gcode_state()
-        current_print = self.file_path()
-        if current_print:
-            with open(self.resurrect_file, 'w') as destination_file:
-                json.dump({
-                    "file_position": self.get_file_position(),
-                    "filename": current_print,
-                    "gcode_state": gcode_state,
-                    "extruder": self.get_toolhead().get_extruder().get_name()
-                }, destination_file)
-                destination_file.flush()
-                destination_file.close()
-        else:
+        try:
+            res = self._save_progress(self.get_file_position())
+        except progress_journal.error as e:
+            raise gcmd.error(str(e))
+        if not res:
             gcmd.respond_raw("!! Can't save the progress, no files are selected!")
     cmd_RESUME_INTERRUPTED_help = "loads the file progress from a file and resume a print after a power failure"
     def handle_resume_interrupted(self, web_request):
-        if not os.path.exists(self.resurrect_file):
+        data = self.progress_journal.read_last()
+        if data is None:
             self.gcode.respond_raw('!! There is no interrupted print to resume')
             return
-        with open(self.resurrect_file, 'r') as f:
-            try:
-                data = json.load(f)
-                pos = data['file_position']
-                filename = data['filename']
-                extruder = data['extruder']
-                gcode_state = data['gcode_state']
-            except:
-                self.gcode.respond_raw("!! Can't resume the print")
-                return
+        try:
+            pos = data['file_position']
+            filename = data['filename']
+            extruder = data['extruder']
+            gcode_state = data['gcode_state']
+            tracker = PrintStateTracker(data.get('state_position', 0),
+                                        data.get('print_state'))
+        except:
+            self.gcode.respond_raw("!! Can't resume the print")
+            return
 
         self.gcode.respond_raw('Stampa precendetemente interrotta: ' + os.path.basename(filename))
         try:
             self.gcode.run_script('T' + self.available_extruders.index(extruder))
         except:
             logging.info(extruder + ' not found in the available ones: ' + str(self.available_extruders))
-        raw_state = self._create_restore_state_script(filename, pos)
-        move_mode = raw_state.pop('mode')
+        try:
+            self._scan_print_state(tracker, filename, pos)
+        except:
+            logging.exception("virtual_sdcard state scan")
+            self.gcode.respond_raw("!! Can't resume the print")
+            return
+        raw_state = tracker.get_state()
+        move_mode = raw_state.pop('mode', 'G90')
         restore_temp_script = '\n'.join([v for k, v in raw_state.items()])
         restore_state_script = self.pre_resurrection + restore_temp_script + self.post_resurrection
         self.gcode.respond_raw('Running restore script:\n' + str(restore_state_script))
@@ -294,91 +453,66 @@ class VirtualSD:
         self._reset_file()
         self._load_file(self.gcode, os.path.basename(filename))
         self.override_file_position(pos)
+        self.state_tracker = tracker
         self.do_resume()
     def remove_resurrect_file(self):
-        if os.path.exists(self.resurrect_file):
-            os.remove(self.resurrect_file)
+        if self.progress_journal.exists():
+            self.progress_journal.remove()
     def get_file_position(self):
         return self.next_file_position
     def set_file_position(self, pos):
-        self.next_file_positiongithub = pos
+        self.next_file_position = pos
     def override_file_position(self, pos):
+        if self.current_file is not None:
+            pos = self.current_file.find_line_start(pos)
         self.file_position = pos
     def is_cmd_from_sd(self):
         return self.cmd_from_sd
-    def _create_restore_state_script(self, filename, size):
-        all_re = "|".join([
-            r"((M106) S(\d+) P(\d+))",
-            r"((M104) S(\d+)( T(\d+))?)",
-            r"((M109) S(\d+)( T(\d+))?)",
-            r"((M140) S(\d+))",
-            r"((M190) S(\d+))",
-            r"((M141) S(\d+))",
-            r"((M191) S(\d+))",
-            r"((G90))",
-            r"((G91))",
-        ])
-        with open(filename, 'r') as f:
-            haystack = f.read(size)
-        raw_state = {}
-        for match in re.findall(all_re, haystack):
-            for match in re.findall(all_re, haystack):
-                match = [x for x in match if x != '']
-                match.pop(0)
-                if match[0] == 'M106':
-                    p = match[2]
-                    raw_state['fan%s_speed' % p] = 'M106 S%s P%s' % (match[1], p)
-                elif match[0] == 'M104':
-                    if len(match) == 2:
-                        raw_state['tool_temp'] = 'M109 S%s' % match[1]
-                    else:
-                        t = match[3]
-                        raw_state['tool%s_temp' % t] = 'M109 S%s T%s' % (match[1], t)
-                elif match[0] == 'M109':
-                    if len(match) == 2:
-                        raw_state['tool_temp'] = 'M109 S%s' % match[1]
-                    else:
-                        t = match[3]
-                        raw_state['tool%s_temp' % t] = 'M109 S%s T%s' % (match[1], t)
-                elif match[0] == 'M140':
-                    raw_state['bed_temp'] = 'M190 S%s' % match[1]
-                elif match[0] == 'M190':
-                    raw_state['bed_temp'] = 'M190 S%s' % match[1]
-                elif match[0] == 'M141':
-                    raw_state['chamber_temp'] = 'M141 S%s' % match[1]
-                elif match[0] == 'M191':
-                    raw_state['chamber_temp'] = 'M141 S%s' % match[1]
-                elif match[0] == 'G91':
-                    raw_state['mode'] = 'G91'
-                elif match[0] == 'G90':
-                    raw_state['mode'] = 'G90'
-
-        return raw_state
-            
+    def _scan_print_state(self, tracker, filename, pos):
+        # Bring a print state checkpoint up to the given file position
+        pfile = PrintFile(filename)
+        try:
+            while tracker.scan(pfile, pfile.find_line_start(pos)):
+                self.reactor.pause(self.reactor.NOW)
+        finally:
+            pfile.close()
     # Background work timer
+    def _gen_move_batch(self, lines, sizes, params):
+        # Consume a run of plain G0/G1 lines from the pending lines.  The
+        # file position of a line is only advanced once it is queued.
+        count = MOVE_BATCH_LINES
+        while 1:
+            line = lines.pop()
+            self.next_file_position = self.file_position + sizes.pop()
+            yield line.strip(), params
+            self.file_position = self.next_file_position
+            count -= 1
+            if not lines or not count or self.must_pause_work:
+                return
+            params = gcode.parse_move_line(lines[-1])
+            if params is None:
+                return
     def work_handler(self, eventtime):
         logging.info("Starting SD card print (position %d)", self.file_position)
         self.reactor.unregister_timer(self.work_timer)
-        try:
-            self.current_file.seek(self.file_position)
-        except:
-            logging.exception("virtual_sdcard seek")
-            self.work_timer = None
-            return self.reactor.NEVER
         self.print_stats.note_start()
         gcode_mutex = self.gcode.get_mutex()
-        partial_input = ""
         lines = []
+        sizes = []
         error_message = None
         while not self.must_pause_work:
             if not lines:
                 # Read more data
                 try:
-                    data = self.current_file.read(8192)
+                    while self.state_tracker.scan(self.current_file,
+                                                  self.file_position):
+                        self.reactor.pause(self.reactor.NOW)
+                    lines, sizes = self.current_file.read_lines(
+                        self.file_position)
                 except:
                     logging.exception("virtual_sdcard read")
                     break
-                if not data:
+                if not lines:
                     # End of file
                     self.current_file.close()
                     self.current_file = None
@@ -386,11 +520,18 @@ class VirtualSD:
                     self.gcode.respond_raw("Done printing file")
                     self.printer.send_event("virtual_sdcard:ended")
                     break
-                lines = data.split('\n')
-                lines[0] = partial_input + lines[0]
-                partial_input = lines.pop()
                 lines.reverse()
-                self.reactor.pause(self.reactor.NOW)
+                sizes.reverse()
+                curtime = self.reactor.pause(self.reactor.NOW)
+                if (self.progress_interval
+                    and curtime >= self.next_progress_time):
+                    # Periodic checkpoint (all prior lines are queued)
+                    try:
+                        self._save_progress(self.file_position)
+                    except progress_journal.error as e:
+                        logging.warning("Unable to save print progress: %s",
+                                        e)
+                    self.next_progress_time = curtime + self.progress_interval
                 continue
             # Pause if any other request is pending in the gcode class
             if gcode_mutex.test():
@@ -398,14 +539,21 @@ class VirtualSD:
                 continue
             # Dispatch command
             self.cmd_from_sd = True
-            line = lines.pop()
-            if sys.version_info.major >= 3:
-                next_file_position = self.file_position + len(line.encode()) + 1
-            else:
-                next_file_position = self.file_position + len(line) + 1
-            self.next_file_position = next_file_position
+            params = None
+            if self.batch_moves:
+                params = gcode.parse_move_line(lines[-1])
+                if not self.gcode_move.can_batch_moves():
+                    params = None
             try:
-                self.gcode.run_script(line)
+                if params is not None:
+                    # Dispatch a run of plain moves as a single batch
+                    self.gcode.run_move_batch(
+                        self._gen_move_batch(lines, sizes, params))
+                else:
+                    line = lines.pop()
+                    next_file_position = self.file_position + sizes.pop()
+                    self.next_file_position = next_file_position
+                    self.gcode.run_script(line)
             except self.gcode.error as e:
                 error_message = str(e)
                 try:
@@ -417,17 +565,16 @@ class VirtualSD:
                 logging.exception("virtual_sdcard dispatch")
                 break
             self.cmd_from_sd = False
+            if params is not None:
+                # File position is tracked by _gen_move_batch()
+                continue
             self.file_position = self.next_file_position
             # Do we need to skip around?
             if self.next_file_position != next_file_position:
-                try:
-                    self.current_file.seek(self.file_position)
-                except:
-                    logging.exception("virtual_sdcard seek")
-                    self.work_timer = None
-                    return self.reactor.NEVER
+                self.file_position = self.current_file.find_line_start(
+                    self.file_position)
                 lines = []
-                partial_input = ""
+                sizes = []
         logging.info("Exiting SD card print (position %d)", self.file_position)
         self.work_timer = None
         self.cmd_from_sd = False
@@ -85,6 +85,43 @@ class GCodeCommand:
         return self.get(name, default, parser=float, minval=minval,
                         maxval=maxval, above=above, below=below)
 
+# Break a line (with comments removed) into its command and parameters
+args_r = re.compile('([A-Z_]+|[A-Z*/])')
+def parse_line_regex(line):
+    # Break line into parts and determine command
+    parts = args_r.split(line.upper())
+    numparts = len(parts)
+    cmd = ""
+    if numparts >= 3 and parts[1] != 'N':
+        cmd = parts[1] + parts[2].strip()
+    elif numparts >= 5 and parts[1] == 'N':
+        # Skip line number at start of command
+        cmd = parts[3] + parts[4].strip()
+    # Build gcode "params" dictionary
+    params = { parts[i]: parts[i+1].strip()
+               for i in range(1, numparts, 2) }
+    return cmd, params
+
+# Fast path for the common "G1 X10 Y20 E.5 F3000" style of move.  Lines
+# with line numbers, checksums, or unusual spacing use the regex path.
+fast_move_r = re.compile(r'[Gg][0-3](?:[ \t]+[A-Za-z][-+.0-9]*)*[ \t]*\Z')
+fast_move_cmds = { c: 'G' + c for c in '0123' }
+def parse_line(line):
+    if fast_move_r.match(line) is None:
+        return parse_line_regex(line)
+    params = { p[0].upper(): p[1:] for p in line.split() }
+    return fast_move_cmds[line[1]], params
+
+# Return the parameters of a plain G0/G1 move line (or None otherwise)
+def parse_move_line(line):
+    cpos = line.find(';')
+    if cpos >= 0:
+        line = line[:cpos]
+    line = line.strip()
+    if fast_move_r.match(line) is None or line[1] not in '01':
+        return None
+    return { p[0].upper(): p[1:] for p in line.split() }
+
 # Parse and dispatch G-Code commands
 class GCodeDispatch:
     error = CommandError
@@ -157,6 +194,8 @@ class GCodeDispatch:
                 "mux command %s %s %s already registered (%s)" % (
                     cmd, key, value, prev_values))
         prev_values[value] = func
+    def get_command_handler(self, cmd):
+        return self.gcode_handlers.get(cmd)
     def get_command_help(self):
         return dict(self.gcode_help)
     def get_status(self, eventtime):
@@ -184,7 +223,6 @@ class GCodeDispatch:
         self._build_status_commands()
         self._respond_state("Ready")
     # Parse input into commands
-    args_r = re.compile('([A-Z_]+|[A-Z*/])')
     def _process_commands(self, commands, need_ack=True):
         for line in commands:
             # Ignore comments and leading/trailing spaces
@@ -192,18 +230,7 @@ class GCodeDispatch:
             cpos = line.find(';')
             if cpos >= 0:
                 line = line[:cpos]
-            # Break line into parts and determine command
-            parts = self.args_r.split(line.upper())
-            numparts = len(parts)
-            cmd = ""
-            if numparts >= 3 and parts[1] != 'N':
-                cmd = parts[1] + parts[2].strip()
-            elif numparts >= 5 and parts[1] == 'N':
-                # Skip line number at start of command
-                cmd = parts[3] + parts[4].strip()
-            # Build gcode "params" dictionary
-            params = { parts[i]: parts[i+1].strip()
-                       for i in range(1, numparts, 2) }
+            cmd, params = parse_line(line)
             gcmd = GCodeCommand(self, cmd, origline, params, need_ack)
             # Invoke handler for command
             handler = self.gcode_handlers.get(cmd, self.cmd_default)
@@ -222,6 +249,21 @@ class GCodeDispatch:
                 if not need_ack:
                     raise
             gcmd.ack()
+    def run_move_batch(self, commands):
+        # Run an iterable of (commandline, params) plain G0/G1 moves
+        with self.mutex:
+            try:
+                self.printer.lookup_object('gcode_move').move_batch(commands)
+            except self.error as e:
+                self._respond_error(str(e))
+                self.printer.send_event("gcode:command_error")
+                raise
+            except:
+                msg = 'Internal error on command:"G1"'
+                logging.exception(msg)
+                self.printer.invoke_shutdown(msg)
+                self._respond_error(msg)
+                raise
     def run_script_from_command(self, script):
         self._process_commands(script.split('\n'), need_ack=False)
     def run_script(self, script):
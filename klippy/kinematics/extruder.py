@@ -40,7 +40,7 @@ class ExtruderStepper:
                                    desc=self.cmd_SYNC_EXTRUDER_MOTION_help)
     def _handle_connect(self):
         toolhead = self.printer.lookup_object('toolhead')
-        toolhead.register_step_generator(self.stepper.generate_steps)
+        toolhead.register_stepper(self.stepper)
         self._set_pressure_advance(self.config_pa, self.config_smooth_time)
     def get_status(self, eventtime):
         return {'pressure_advance': self.pressure_advance,
@@ -164,7 +164,9 @@ class PrinterExtruder:
         # Setup extruder trapq (trapezoidal motion queue)
         ffi_main, ffi_lib = chelper.get_ffi()
         self.trapq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
-        self.trapq_append = ffi_lib.trapq_append
+        pconfig = config.getsection('printer')
+        if pconfig.getboolean('compact_move_history', False):
+            ffi_lib.trapq_set_history_compaction(self.trapq, 1)
         self.trapq_finalize_moves = ffi_lib.trapq_finalize_moves
         # Setup extruder stepper
         self.extruder_stepper = None
@@ -230,21 +232,13 @@ class PrinterExtruder:
         if diff_r:
             return (self.instant_corner_v / abs(diff_r))**2
         return move.max_cruise_v2
-    def move(self, print_time, move):
-        axis_r = move.axes_r[3]
-        accel = move.accel * axis_r
-        start_v = move.start_v * axis_r
-        cruise_v = move.cruise_v * axis_r
-        can_pressure_advance = False
-        if axis_r > 0. and (move.axes_d[0] or move.axes_d[1]):
-            can_pressure_advance = True
-        # Queue movement (x is extruder movement, y is pressure advance flag)
-        self.trapq_append(self.trapq, print_time,
-                          move.accel_t, move.cruise_t, move.decel_t,
-                          move.start_pos[3], 0., 0.,
-                          1., can_pressure_advance, 0.,
-                          start_v, cruise_v, accel)
-        self.last_position = move.end_pos[3]
+    def get_instant_corner_v(self):
+        return self.instant_corner_v
+    def get_move_trapq(self):
+        # The toolhead queues extrusion moves directly into this trapq
+        return self.trapq
+    def note_move_end(self, end_pos):
+        self.last_position = end_pos
     def find_past_position(self, print_time):
         if self.extruder_stepper is None:
             return 0.
@@ -292,6 +286,11 @@ class DummyExtruder:
         return 0.
     def calc_junction(self, prev_move, move):
         return move.max_cruise_v2
+    def get_instant_corner_v(self):
+        # Moves never extrude without an extruder, so this is not used
+        return 0.
+    def get_move_trapq(self):
+        return None
     def get_name(self):
         return ""
     def get_heater(self):
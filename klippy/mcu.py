@@ -555,6 +555,8 @@ class MCU:
         # Serial port
         wp = "mcu '%s': " % (self._name)
         self._serial = serialhdl.SerialReader(self._reactor, warn_prefix=wp)
+        clocksync.set_adaptive_query(
+            config.getboolean('adaptive_clock_query', False))
         self._baud = 0
         self._canbus_iface = None
         canbus_uuid = config.get('canbus_uuid', None)
@@ -873,6 +875,8 @@ class MCU:
         self._serial.register_response(cb, msg, oid)
     def alloc_command_queue(self):
         return self._serial.alloc_command_queue()
+    def get_serialqueue(self):
+        return self._serial.get_serialqueue()
     def lookup_command(self, msgformat, cq=None):
         return CommandWrapper(self._serial, msgformat, cq)
     def lookup_query_command(self, msgformat, respformat, oid=None,
@@ -991,6 +995,8 @@ class MCU:
     # Misc external commands
     def is_fileoutput(self):
         return self._printer.get_start_args().get('debugoutput') is not None
+    def get_serial_backlog_time(self):
+        return self._serial.get_backlog_time()
     def is_shutdown(self):
         return self._is_shutdown
     def get_shutdown_clock(self):
@@ -1005,6 +1011,8 @@ class MCU:
         parts = [s.split('=', 1) for s in stats.split()]
         last_stats = {k:(float(v) if '.' in v else int(v)) for k, v in parts}
         self._get_status_info['last_stats'] = last_stats
+        self._get_status_info['clock_sync'] = self._clocksync.get_status(
+            eventtime)
         return False, '%s: %s' % (self._name, stats)
 
 Common_MCU_errors = {
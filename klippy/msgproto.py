@@ -159,6 +159,78 @@ def convert_msg_format(msgformat):
         msgformat = msgformat.replace(c, '%s')
     return msgformat
 
+# Generate Python code to decode a VLQ integer at s[pos] into 'var'
+def _gen_parse_int(lines, var, t):
+    lines.extend([
+        "    c = s[pos]",
+        "    pos += 1",
+        "    v = c & 0x7f",
+        "    if (c & 0x60) == 0x60:",
+        "        v |= -0x20",
+        "    while c & 0x80:",
+        "        c = s[pos]",
+        "        pos += 1",
+        "        v = (v<<7) | (c & 0x7f)"])
+    if t.signed:
+        lines.append("    %s = v" % (var,))
+    else:
+        lines.append("    %s = v & 0xffffffff" % (var,))
+
+# Generate Python code to VLQ encode the integer 'value' onto 'out'
+def _gen_encode_int(lines, value):
+    lines.extend([
+        "    v = %s" % (value,),
+        "    if v >= 0xc000000 or v < -0x4000000:"
+        " out.append((v>>28) & 0x7f | 0x80)",
+        "    if v >= 0x180000 or v < -0x80000:"
+        " out.append((v>>21) & 0x7f | 0x80)",
+        "    if v >= 0x3000 or v < -0x1000:"
+        " out.append((v>>14) & 0x7f | 0x80)",
+        "    if v >= 0x60 or v < -0x20:"
+        " out.append((v>>7) & 0x7f | 0x80)",
+        "    out.append(v & 0x7f)"])
+
+# Build the encode(), encode_by_name(), and parse() functions of a
+# message format.  The generated code inlines the handling of each
+# parameter type so that high rate messages have a low host overhead.
+def compile_codec(msgid, param_names):
+    env = {}
+    enc_lines = ["def encode(params):", "    out = [%d]" % (msgid,)]
+    encn_lines = ["def encode_by_name(**params):",
+                  "    out = [%d]" % (msgid,)]
+    parse_lines = ["def parse(s, pos):", "    pos += 1"]
+    for i, (name, t) in enumerate(param_names):
+        var = "p%d" % (i,)
+        for lines, value in [(enc_lines, "params[%d]" % (i,)),
+                             (encn_lines, "params[%s]" % (repr(name),))]:
+            if t.is_int:
+                _gen_encode_int(lines, value)
+            elif t.is_dynamic_string:
+                lines.extend(["    v = %s" % (value,),
+                              "    out.append(len(v))",
+                              "    out.extend(bytearray(v))"])
+            else:
+                env["encode_" + var] = t.encode
+                lines.append("    encode_%s(out, %s)" % (var, value))
+        if t.is_int:
+            _gen_parse_int(parse_lines, var, t)
+        elif t.is_dynamic_string:
+            parse_lines.extend([
+                "    l = s[pos]",
+                "    %s = bytes(bytearray(s[pos+1:pos+l+1]))" % (var,),
+                "    pos += l + 1"])
+        else:
+            env["parse_" + var] = t.parse
+            parse_lines.append("    %s, pos = parse_%s(s, pos)" % (var, var))
+    enc_lines.append("    return out")
+    encn_lines.append("    return out")
+    parse_lines.append("    return {%s}, pos" % (", ".join([
+        "%s: p%d" % (repr(name), i)
+        for i, (name, t) in enumerate(param_names)]),))
+    code = "\n".join(enc_lines + encn_lines + parse_lines) + "\n"
+    exec(code, env)
+    return env['encode'], env['encode_by_name'], env['parse']
+
 class MessageFormat:
     def __init__(self, msgid, msgformat, enumerations={}):
         self.msgid = msgid
@@ -168,25 +240,8 @@ class MessageFormat:
         self.param_names = lookup_params(msgformat, enumerations)
         self.param_types = [t for name, t in self.param_names]
         self.name_to_type = dict(self.param_names)
-    def encode(self, params):
-        out = []
-        out.append(self.msgid)
-        for i, t in enumerate(self.param_types):
-            t.encode(out, params[i])
-        return out
-    def encode_by_name(self, **params):
-        out = []
-        out.append(self.msgid)
-        for name, t in self.param_names:
-            t.encode(out, params[name])
-        return out
-    def parse(self, s, pos):
-        pos += 1
-        out = {}
-        for name, t in self.param_names:
-            v, pos = t.parse(s, pos)
-            out[name] = v
-        return out, pos
+        self.encode, self.encode_by_name, self.parse = compile_codec(
+            msgid, self.param_names)
     def format_params(self, params):
         out = []
         for name, t in self.param_names:
@@ -223,6 +223,10 @@ class SerialReader:
         self.ffi_lib.serialqueue_get_stats(self.serialqueue,
                                            self.stats_buf, len(self.stats_buf))
         return str(self.ffi_main.string(self.stats_buf).decode())
+    def get_backlog_time(self):
+        if self.serialqueue is None:
+            return 0.
+        return self.ffi_lib.serialqueue_get_backlog_time(self.serialqueue)
     def get_reactor(self):
         return self.reactor
     def get_msgparser(self):
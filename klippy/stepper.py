@@ -50,6 +50,7 @@ class MCU_stepper:
         self._itersolve_generate_steps = ffi_lib.itersolve_generate_steps
         self._itersolve_check_active = ffi_lib.itersolve_check_active
         self._trapq = ffi_main.NULL
+        self._step_cache = ffi_main.NULL
         self._mcu.get_printer().register_event_handler('klippy:connect',
                                                        self._query_mcu_position)
     def get_mcu(self):
@@ -71,6 +72,14 @@ class MCU_stepper:
         ffi_main, ffi_lib = chelper.get_ffi()
         sk = ffi_main.gc(getattr(ffi_lib, alloc_func)(*params), ffi_lib.free)
         self.set_stepper_kinematics(sk)
+    def setup_step_cache(self, max_steps):
+        # Reuse generated step times when identical moves are repeated
+        ffi_main, ffi_lib = chelper.get_ffi()
+        self._step_cache = ffi_main.gc(ffi_lib.stepcache_alloc(max_steps),
+                                       ffi_lib.stepcache_free)
+        if self._stepper_kinematics is not None:
+            ffi_lib.itersolve_set_step_cache(self._stepper_kinematics,
+                                             self._step_cache)
     def _build_config(self):
         if self._step_pulse_duration is None:
             self._step_pulse_duration = .000002
@@ -169,6 +178,9 @@ class MCU_stepper:
             mcu_pos = self.get_mcu_position()
         self._stepper_kinematics = sk
         ffi_main, ffi_lib = chelper.get_ffi()
+        if old_sk is not None:
+            ffi_lib.itersolve_set_step_cache(old_sk, ffi_main.NULL)
+        ffi_lib.itersolve_set_step_cache(sk, self._step_cache)
         ffi_lib.itersolve_set_stepcompress(sk, self._stepqueue, self._step_dist)
         self.set_trapq(self._trapq)
         self._set_mcu_position(mcu_pos)
@@ -211,8 +223,7 @@ class MCU_stepper:
         return old_tq
     def add_active_callback(self, cb):
         self._active_callbacks.append(cb)
-    def generate_steps(self, flush_time):
-        # Check for activity if necessary
+    def _check_active(self, flush_time):
         if self._active_callbacks:
             sk = self._stepper_kinematics
             ret = self._itersolve_check_active(sk, flush_time)
@@ -221,16 +232,45 @@ class MCU_stepper:
                 self._active_callbacks = []
                 for cb in cbs:
                     cb(ret)
+    def generate_steps(self, flush_time):
+        # Check for activity if necessary
+        self._check_active(flush_time)
         # Generate steps
         sk = self._stepper_kinematics
         ret = self._itersolve_generate_steps(sk, flush_time)
         if ret:
             raise error("Internal error in stepcompress")
+    def queue_step_generation(self, flush_time, step_pool):
+        # Steps are generated later by the StepGenerationPool
+        self._check_active(flush_time)
+        step_pool.add_stepper_kinematics(self._stepper_kinematics)
     def is_active_axis(self, axis):
         ffi_main, ffi_lib = chelper.get_ffi()
         a = axis.encode()
         return ffi_lib.itersolve_is_active_axis(self._stepper_kinematics, a)
 
+# Generate the steps of several steppers at once using C worker threads
+class StepGenerationPool:
+    def __init__(self, num_threads):
+        ffi_main, ffi_lib = chelper.get_ffi()
+        pool = ffi_lib.stepgen_pool_alloc(num_threads)
+        if pool == ffi_main.NULL:
+            raise error("Unable to create step generation threads")
+        self._pool = ffi_main.gc(pool, ffi_lib.stepgen_pool_free)
+        self._stepgen_pool_generate = ffi_lib.stepgen_pool_generate
+        self._pending = []
+    def add_stepper_kinematics(self, sk):
+        self._pending.append(sk)
+    def generate_steps(self, flush_time):
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
+        ret = self._stepgen_pool_generate(self._pool, pending, len(pending),
+                                          flush_time)
+        if ret:
+            raise error("Internal error in stepcompress")
+
 # Helper code to build a stepper object from a config section
 def PrinterStepper(config, units_in_radians=False):
     printer = config.get_printer()
@@ -248,6 +288,10 @@ def PrinterStepper(config, units_in_radians=False):
     mcu_stepper = MCU_stepper(name, step_pin_params, dir_pin_params,
                               rotation_dist, steps_per_rotation,
                               step_pulse_duration, units_in_radians)
+    step_cache_size = config.getsection('printer').getint('step_cache_size',
+                                                         0, minval=0)
+    if step_cache_size:
+        mcu_stepper.setup_step_cache(step_cache_size)
     # Register with helper modules
     for mname in ['stepper_enable', 'force_move', 'motion_report']:
         m = printer.load_object(config, mname)
@@ -3,8 +3,8 @@
 # Copyright (C) 2016-2024  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import math, logging, importlib
-import mcu, chelper, kinematics.extruder
+import math, logging, importlib, array, bisect
+import mcu, chelper, stepper, kinematics.extruder
 
 # Common suffixes: _d is distance (in mm), _v is velocity (in
 #   mm/second), _v2 is velocity squared (mm^2/s^2), _t is time (in
@@ -12,23 +12,31 @@ import mcu, chelper, kinematics.extruder
 
 # Class to track each move request
 class Move:
+    __slots__ = (
+        'toolhead', 'start_pos', 'end_pos', 'accel', 'junction_deviation',
+        'timing_callbacks', 'is_kinematic_move', 'axes_d', 'move_d',
+        'axes_r', 'min_move_t', 'max_start_v2', 'max_cruise_v2', 'delta_v2',
+        'max_smoothed_v2', 'smooth_delta_v2', 'start_v', 'cruise_v', 'end_v',
+        'accel_t', 'cruise_t', 'decel_t')
     def __init__(self, toolhead, start_pos, end_pos, speed):
         self.toolhead = toolhead
-        self.start_pos = tuple(start_pos)
+        self.start_pos = sp = tuple(start_pos)
         self.end_pos = tuple(end_pos)
         self.accel = toolhead.max_accel
         self.junction_deviation = toolhead.junction_deviation
-        self.timing_callbacks = []
+        self.timing_callbacks = ()
         velocity = min(speed, toolhead.max_velocity)
         self.is_kinematic_move = True
-        self.axes_d = axes_d = [end_pos[i] - start_pos[i] for i in (0, 1, 2, 3)]
-        self.move_d = move_d = math.sqrt(sum([d*d for d in axes_d[:3]]))
+        dx = end_pos[0] - sp[0]
+        dy = end_pos[1] - sp[1]
+        dz = end_pos[2] - sp[2]
+        de = end_pos[3] - sp[3]
+        move_d = math.sqrt(dx*dx + dy*dy + dz*dz)
         if move_d < .000000001:
             # Extrude only move
-            self.end_pos = (start_pos[0], start_pos[1], start_pos[2],
-                            end_pos[3])
-            axes_d[0] = axes_d[1] = axes_d[2] = 0.
-            self.move_d = move_d = abs(axes_d[3])
+            self.end_pos = (sp[0], sp[1], sp[2], end_pos[3])
+            dx = dy = dz = 0.
+            move_d = abs(de)
             inv_move_d = 0.
             if move_d:
                 inv_move_d = 1. / move_d
@@ -37,7 +45,10 @@ class Move:
             self.is_kinematic_move = False
         else:
             inv_move_d = 1. / move_d
-        self.axes_r = [d * inv_move_d for d in axes_d]
+        self.move_d = move_d
+        self.axes_d = [dx, dy, dz, de]
+        self.axes_r = [dx * inv_move_d, dy * inv_move_d, dz * inv_move_d,
+                       de * inv_move_d]
         self.min_move_t = move_d / velocity
         # Junction speeds are tracked in velocity squared.  The
         # delta_v2 is the maximum amount of this squared-velocity that
@@ -60,6 +71,8 @@ class Move:
         m = "%s: %.3f %.3f %.3f [%.3f]" % (msg, ep[0], ep[1], ep[2], ep[3])
         return self.toolhead.printer.command_error(m)
     def calc_junction(self, prev_move):
+        # Batches of moves use lookahead_calc_junctions() in
+        # chelper/lookahead.c instead (it must give identical results)
         if not self.is_kinematic_move or not prev_move.is_kinematic_move:
             return
         # Allow extruder to calculate its maximum junction
@@ -72,7 +85,8 @@ class Move:
                                + axes_r[2] * prev_axes_r[2])
         if junction_cos_theta > 0.999999:
             return
-        junction_cos_theta = max(junction_cos_theta, -0.999999)
+        if junction_cos_theta < -0.999999:
+            junction_cos_theta = -0.999999
         sin_theta_d2 = math.sqrt(0.5*(1.0-junction_cos_theta))
         R_jd = sin_theta_d2 / (1. - sin_theta_d2)
         # Approximated circle must contact moves no further away than mid-move
@@ -107,6 +121,7 @@ class Move:
         self.decel_t = decel_d / ((end_v + cruise_v) * 0.5)
 
 LOOKAHEAD_FLUSH_TIME = 0.250
+JUNCTION_BATCH_MIN = 16
 
 # Class to track a list of pending move requests and to facilitate
 # "look-ahead" across moves to reduce acceleration between moves.
@@ -114,18 +129,65 @@ class LookAheadQueue:
     def __init__(self, toolhead):
         self.toolhead = toolhead
         self.queue = []
+        self.flush_period = LOOKAHEAD_FLUSH_TIME
         self.junction_flush = LOOKAHEAD_FLUSH_TIME
+        # Number of leading queued moves with a known junction speed
+        self.junction_count = 0
+        ffi_main, ffi_lib = chelper.get_ffi()
+        self.ffi_main = ffi_main
+        self.lookahead_calc_junctions = ffi_lib.lookahead_calc_junctions
     def reset(self):
         del self.queue[:]
-        self.junction_flush = LOOKAHEAD_FLUSH_TIME
+        self.junction_count = 0
+        self.junction_flush = self.flush_period
     def set_flush_time(self, flush_time):
         self.junction_flush = flush_time
+    def set_flush_period(self, flush_period):
+        self.flush_period = flush_period
     def get_last(self):
         if self.queue:
             return self.queue[-1]
         return None
+    def calc_junctions(self):
+        # Calculate the maximum junction speeds of newly queued moves
+        queue = self.queue
+        moves = queue[max(self.junction_count, 1) - 1:]
+        self.junction_count = len(queue)
+        count = len(moves)
+        if count < JUNCTION_BATCH_MIN:
+            # Not worth the overhead of packing the moves for the C code
+            for i in range(1, count):
+                moves[i].calc_junction(moves[i-1])
+            return
+        data = array.array('d')
+        for move in moves:
+            ar = move.axes_r
+            data.extend((ar[0], ar[1], ar[2], ar[3], move.move_d, move.accel,
+                         move.junction_deviation, move.max_cruise_v2,
+                         move.delta_v2, move.smooth_delta_v2,
+                         move.is_kinematic_move))
+        max_start_v2 = array.array('d', [moves[0].max_start_v2]) * count
+        max_smoothed_v2 = array.array('d', [moves[0].max_smoothed_v2]) * count
+        ffi_main = self.ffi_main
+        self.lookahead_calc_junctions(
+            ffi_main.from_buffer("struct junction_move[]", data), count,
+            self.toolhead.extruder.get_instant_corner_v(),
+            ffi_main.from_buffer("double[]", max_start_v2),
+            ffi_main.from_buffer("double[]", max_smoothed_v2))
+        for i in range(1, count):
+            move = moves[i]
+            move.max_start_v2 = max_start_v2[i]
+            move.max_smoothed_v2 = max_smoothed_v2[i]
     def flush(self, lazy=False):
-        self.junction_flush = LOOKAHEAD_FLUSH_TIME
+        profile = self.toolhead.profile
+        stage_start = profile.start_stage()
+        try:
+            self._flush(lazy)
+        finally:
+            profile.end_stage(profile.lookahead_flush, stage_start)
+    def _flush(self, lazy):
+        self.junction_flush = self.flush_period
+        self.calc_junctions()
         update_flush_count = lazy
         queue = self.queue
         flush_count = len(queue)
@@ -136,14 +198,17 @@ class LookAheadQueue:
         next_end_v2 = next_smoothed_v2 = peak_cruise_v2 = 0.
         for i in range(flush_count-1, -1, -1):
             move = queue[i]
+            # Inline min() calls - this loop runs for every queued move
             reachable_start_v2 = next_end_v2 + move.delta_v2
-            start_v2 = min(move.max_start_v2, reachable_start_v2)
-            reachable_smoothed_v2 = next_smoothed_v2 + move.smooth_delta_v2
-            smoothed_v2 = min(move.max_smoothed_v2, reachable_smoothed_v2)
+            start_v2 = move.max_start_v2
+            if reachable_start_v2 < start_v2:
+                start_v2 = reachable_start_v2
+            smooth_delta_v2 = move.smooth_delta_v2
+            reachable_smoothed_v2 = next_smoothed_v2 + smooth_delta_v2
+            smoothed_v2 = move.max_smoothed_v2
             if smoothed_v2 < reachable_smoothed_v2:
                 # It's possible for this move to accelerate
-                if (smoothed_v2 + move.smooth_delta_v2 > next_smoothed_v2
-                    or delayed):
+                if smoothed_v2 + smooth_delta_v2 > next_smoothed_v2 or delayed:
                     # This move can decelerate or this is a full accel
                     # move after a full decel move
                     if update_flush_count and peak_cruise_v2:
@@ -167,6 +232,7 @@ class LookAheadQueue:
                                       , min(next_end_v2, cruise_v2))
             else:
                 # Delay calculating this move until peak_cruise_v2 is known
+                smoothed_v2 = reachable_smoothed_v2
                 delayed.append((move, start_v2, next_end_v2))
             next_end_v2 = start_v2
             next_smoothed_v2 = smoothed_v2
@@ -176,16 +242,103 @@ class LookAheadQueue:
         self.toolhead._process_moves(queue[:flush_count])
         # Remove processed moves from the queue
         del queue[:flush_count]
+        self.junction_count = len(queue)
     def add_move(self, move):
-        self.queue.append(move)
-        if len(self.queue) == 1:
+        queue = self.queue
+        queue.append(move)
+        if len(queue) == 1:
             return
-        move.calc_junction(self.queue[-2])
         self.junction_flush -= move.min_move_t
         if self.junction_flush <= 0.:
             # Enough moves have been queued to reach the target flush time.
             self.flush(lazy=True)
 
+# Upper limit (in seconds) of each planner timing histogram bucket
+PROFILE_BUCKETS = (.0001, .0002, .0005, .001, .002, .005, .010, .020, .050,
+                   .100)
+
+# Run time statistics for one stage of the motion planner
+class StageTiming:
+    def __init__(self):
+        self.reset()
+    def reset(self):
+        self.histogram = [0] * (len(PROFILE_BUCKETS) + 1)
+        self.count = 0
+        self.total_time = self.max_time = 0.
+    def note(self, duration):
+        self.histogram[bisect.bisect_left(PROFILE_BUCKETS, duration)] += 1
+        self.count += 1
+        self.total_time += duration
+        if duration > self.max_time:
+            self.max_time = duration
+    def get_status(self):
+        avg_time = 0.
+        if self.count:
+            avg_time = self.total_time / self.count
+        return {'count': self.count, 'total_time': round(self.total_time, 6),
+                'avg_time': round(avg_time, 6),
+                'max_time': round(self.max_time, 6),
+                'histogram': list(self.histogram)}
+
+# Track host processing time of the lookahead and step generation code.
+# Stages may call other stages - the time noted for a stage excludes
+# the time spent in the stages it calls.
+class PlannerProfile:
+    def __init__(self, monotonic):
+        self.monotonic = monotonic
+        self.busy_time = self.recent_max_time = 0.
+        self.lookahead_flush = StageTiming()
+        self.process_moves = StageTiming()
+        self.advance_flush_time = StageTiming()
+        self.step_generation = StageTiming()
+        self.stages = [('lookahead_flush', self.lookahead_flush),
+                       ('process_moves', self.process_moves),
+                       ('advance_flush_time', self.advance_flush_time),
+                       ('step_generation', self.step_generation)]
+        self.reset()
+    def reset(self):
+        for name, stage in self.stages:
+            stage.reset()
+        self.moves = self.stall_checks = 0
+        self.last_rate_time = self.last_moves = self.last_flushes = 0
+        self.moves_per_sec = self.flushes_per_sec = 0.
+    def start_stage(self):
+        return self.monotonic(), self.busy_time
+    def end_stage(self, stage, stage_start):
+        start_time, start_busy_time = stage_start
+        duration = self.monotonic() - start_time
+        stage.note(duration - (self.busy_time - start_busy_time))
+        # Total time spent in all stages (never reset)
+        self.busy_time = start_busy_time + duration
+        if duration > self.recent_max_time:
+            self.recent_max_time = duration
+    def pop_recent_max_time(self):
+        # Return the longest run of any stage (including the stages it
+        # calls) since the last call to this function
+        recent_max_time = self.recent_max_time
+        self.recent_max_time = 0.
+        return recent_max_time
+    def update_rates(self, eventtime):
+        flushes = self.process_moves.count
+        if self.last_rate_time and eventtime > self.last_rate_time:
+            inv_dt = 1. / (eventtime - self.last_rate_time)
+            self.moves_per_sec = (self.moves - self.last_moves) * inv_dt
+            self.flushes_per_sec = (flushes - self.last_flushes) * inv_dt
+        self.last_rate_time = eventtime
+        self.last_moves = self.moves
+        self.last_flushes = flushes
+    def get_summary(self):
+        return {'moves_per_sec': round(self.moves_per_sec, 1),
+                'flushes_per_sec': round(self.flushes_per_sec, 1),
+                'stall_checks': self.stall_checks}
+    def get_status(self):
+        res = {name: stage.get_status() for name, stage in self.stages}
+        res.update({'moves': self.moves, 'stall_checks': self.stall_checks,
+                    'moves_per_sec': round(self.moves_per_sec, 1),
+                    'flushes_per_sec': round(self.flushes_per_sec, 1),
+                    'histogram_buckets': list(PROFILE_BUCKETS)})
+        return res
+
 BUFFER_TIME_LOW = 1.0
 BUFFER_TIME_HIGH = 2.0
 BUFFER_TIME_START = 0.250
@@ -198,6 +351,73 @@ STEPCOMPRESS_FLUSH_TIME = 0.050
 SDS_CHECK_TIME = 0.001 # step+dir+step filter in stepcompress.c
 MOVE_HISTORY_EXPIRE = 30.
 
+# Adaptive buffer time limits
+ADAPT_UPDATE_TIME = 1.0
+ADAPT_MIN_SCALE = 0.5
+ADAPT_MAX_SCALE = 2.0
+ADAPT_LATENCY_MARGIN = 20.
+ADAPT_MAX_LOAD = 0.8
+ADAPT_DECAY = 0.9
+
+# Scale the toolhead buffering windows based on measured host load
+class BufferTimeController:
+    def __init__(self, toolhead, enabled):
+        self.toolhead = toolhead
+        self.enabled = enabled
+        self.scale = 1.
+        self.reactor_lag = self.planner_load = self.serial_backlog = 0.
+        self.host_latency = self.last_busy_time = self.waketime = 0.
+        if enabled:
+            reactor = toolhead.reactor
+            reactor.register_timer(self._update_event, reactor.NOW)
+        self._build_status()
+    def _build_status(self):
+        th = self.toolhead
+        self.status = {
+            'enabled': self.enabled, 'scale': round(self.scale, 3),
+            'reactor_lag': round(self.reactor_lag, 6),
+            'planner_load': round(self.planner_load, 3),
+            'serial_backlog': round(self.serial_backlog, 6),
+            'host_latency': round(self.host_latency, 6),
+            'buffer_time_low': round(th.buffer_time_low, 3),
+            'buffer_time_high': round(th.buffer_time_high, 3),
+            'buffer_time_start': round(th.buffer_time_start, 3),
+            'bgflush_low_time': round(th.bgflush_low_time, 3),
+            'bgflush_batch_time': round(th.bgflush_batch_time, 3),
+            'move_batch_time': round(th.move_batch_time, 3),
+            'lookahead_flush_time': round(th.lookahead.flush_period, 3)}
+    def _update_event(self, eventtime):
+        th = self.toolhead
+        profile = th.profile
+        # Reactor lag is the delay in running this timer
+        if self.waketime:
+            self.reactor_lag = max(0., eventtime - self.waketime)
+        self.waketime = eventtime + ADAPT_UPDATE_TIME
+        # Approximate fraction of host time spent in the motion planner
+        busy_time = profile.busy_time
+        self.planner_load = min(1., (busy_time - self.last_busy_time)
+                                / ADAPT_UPDATE_TIME)
+        self.last_busy_time = busy_time
+        self.serial_backlog = max([m.get_serial_backlog_time()
+                                   for m in th.all_mcus])
+        planner_max = profile.pop_recent_max_time()
+        self.host_latency = (max(self.reactor_lag, planner_max)
+                             + self.serial_backlog)
+        # Buffer enough time to ride out the worst recent host delay
+        load = min(self.planner_load, ADAPT_MAX_LOAD)
+        want_low = self.host_latency * ADAPT_LATENCY_MARGIN / (1. - load)
+        scale = min(ADAPT_MAX_SCALE, max(ADAPT_MIN_SCALE,
+                                         want_low / BUFFER_TIME_LOW))
+        if scale < self.scale:
+            # Increase buffering immediately, but reduce it slowly
+            scale = max(scale, self.scale * ADAPT_DECAY)
+        self.scale = scale
+        th.set_buffer_scale(scale)
+        self._build_status()
+        return self.waketime
+    def get_status(self, eventtime):
+        return self.status
+
 DRIP_SEGMENT_TIME = 0.050
 DRIP_TIME = 0.100
 class DripModeEndSignal(Exception):
@@ -235,6 +455,19 @@ class ToolHead:
         # Input stall detection
         self.check_stall_time = 0.
         self.print_stall = 0
+        # Host processing time tracking
+        self.profile = PlannerProfile(self.reactor.monotonic)
+        # Buffering windows (may be tuned by the BufferTimeController)
+        self.buffer_time_low = BUFFER_TIME_LOW
+        self.buffer_time_high = BUFFER_TIME_HIGH
+        self.buffer_time_start = BUFFER_TIME_START
+        self.bgflush_low_time = BGFLUSH_LOW_TIME
+        self.bgflush_batch_time = BGFLUSH_BATCH_TIME
+        self.move_batch_time = MOVE_BATCH_TIME
+        adaptive = config.getboolean('adaptive_buffer_time', False)
+        if self.mcu.is_fileoutput():
+            adaptive = False
+        self.buffer_control = BufferTimeController(self, adaptive)
         # Input pause tracking
         self.can_pause = True
         if self.mcu.is_fileoutput():
@@ -256,9 +489,21 @@ class ToolHead:
         # Setup iterative solver
         ffi_main, ffi_lib = chelper.get_ffi()
         self.trapq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
-        self.trapq_append = ffi_lib.trapq_append
+        if config.getboolean('compact_move_history', False):
+            ffi_lib.trapq_set_history_compaction(self.trapq, 1)
+        self.trapq_append_batch = ffi_lib.trapq_append_batch
+        self.ffi_main = ffi_main
         self.trapq_finalize_moves = ffi_lib.trapq_finalize_moves
         self.step_generators = []
+        self.pool_steppers = []
+        self.step_pool = None
+        num_threads = config.getint('step_generation_threads', 1, minval=1)
+        if num_threads > 1:
+            # The calling thread also generates steps
+            try:
+                self.step_pool = stepper.StepGenerationPool(num_threads - 1)
+            except stepper.error as e:
+                raise config.error(str(e))
         # Create kinematics class
         gcode = self.printer.lookup_object('gcode')
         self.Coord = gcode.Coord
@@ -282,6 +527,9 @@ class ToolHead:
                                self.cmd_SET_VELOCITY_LIMIT,
                                desc=self.cmd_SET_VELOCITY_LIMIT_help)
         gcode.register_command('M204', self.cmd_M204)
+        webhooks = self.printer.lookup_object('webhooks')
+        webhooks.register_endpoint("toolhead/profile",
+                                   self._handle_profile_request)
         self.printer.register_event_handler("klippy:shutdown",
                                             self._handle_shutdown)
         # Load some default modules
@@ -291,13 +539,22 @@ class ToolHead:
             self.printer.load_object(config, module_name)
     # Print time and flush tracking
     def _advance_flush_time(self, flush_time):
+        profile = self.profile
+        stage_start = profile.start_stage()
         flush_time = max(flush_time, self.last_flush_time)
         # Generate steps via itersolve
         sg_flush_want = min(flush_time + STEPCOMPRESS_FLUSH_TIME,
                             self.print_time - self.kin_flush_delay)
         sg_flush_time = max(sg_flush_want, flush_time)
+        step_pool = self.step_pool
+        stepgen_start = profile.start_stage()
         for sg in self.step_generators:
             sg(sg_flush_time)
+        if self.pool_steppers:
+            for stepper in self.pool_steppers:
+                stepper.queue_step_generation(sg_flush_time, step_pool)
+            step_pool.generate_steps(sg_flush_time)
+        profile.end_stage(profile.step_generation, stepgen_start)
         self.min_restart_time = max(self.min_restart_time, sg_flush_time)
         # Free trapq entries that are no longer needed
         clear_history_time = self.clear_history_time
@@ -310,13 +567,15 @@ class ToolHead:
         for m in self.all_mcus:
             m.flush_moves(flush_time, clear_history_time)
         self.last_flush_time = flush_time
+        profile.end_stage(profile.advance_flush_time, stage_start)
     def _advance_move_time(self, next_print_time):
         pt_delay = self.kin_flush_delay + STEPCOMPRESS_FLUSH_TIME
         flush_time = max(self.last_flush_time, self.print_time - pt_delay)
         self.print_time = max(self.print_time, next_print_time)
         want_flush_time = max(flush_time, self.print_time - pt_delay)
         while 1:
-            flush_time = min(flush_time + MOVE_BATCH_TIME, want_flush_time)
+            flush_time = min(flush_time + self.move_batch_time,
+                             want_flush_time)
             self._advance_flush_time(flush_time)
             if flush_time >= want_flush_time:
                 break
@@ -325,12 +584,15 @@ class ToolHead:
         est_print_time = self.mcu.estimated_print_time(curtime)
         kin_time = max(est_print_time + MIN_KIN_TIME, self.min_restart_time)
         kin_time += self.kin_flush_delay
-        min_print_time = max(est_print_time + BUFFER_TIME_START, kin_time)
+        min_print_time = max(est_print_time + self.buffer_time_start,
+                             kin_time)
         if min_print_time > self.print_time:
             self.print_time = min_print_time
             self.printer.send_event("toolhead:sync_print_time",
                                     curtime, est_print_time, self.print_time)
     def _process_moves(self, moves):
+        profile = self.profile
+        stage_start = profile.start_stage()
         # Resync print_time if necessary
         if self.special_queuing_state:
             if self.special_queuing_state != "Drip":
@@ -338,34 +600,54 @@ class ToolHead:
                 self.special_queuing_state = ""
                 self.need_check_pause = -1.
             self._calc_print_time()
-        # Queue moves into trapezoid motion queue (trapq)
+        # Queue moves into trapezoid motion queues (trapq).  Moves are
+        # packed into a buffer that the C code appends in one call - the
+        # buffer is only split at moves that have timing callbacks.
         next_move_time = self.print_time
+        data = array.array('d')
         for move in moves:
-            if move.is_kinematic_move:
-                self.trapq_append(
-                    self.trapq, next_move_time,
-                    move.accel_t, move.cruise_t, move.decel_t,
-                    move.start_pos[0], move.start_pos[1], move.start_pos[2],
-                    move.axes_r[0], move.axes_r[1], move.axes_r[2],
-                    move.start_v, move.cruise_v, move.accel)
+            sp = move.start_pos
+            ad = move.axes_d
+            ar = move.axes_r
+            data.extend((move.accel_t, move.cruise_t, move.decel_t,
+                         sp[0], sp[1], sp[2], sp[3], ad[0], ad[1], ad[2], ad[3],
+                         ar[0], ar[1], ar[2], ar[3],
+                         move.start_v, move.cruise_v, move.accel))
+            if move.timing_callbacks:
+                next_move_time = self._queue_move_batch(next_move_time, data)
+                data = array.array('d')
+                for cb in move.timing_callbacks:
+                    cb(next_move_time)
+        next_move_time = self._queue_move_batch(next_move_time, data)
+        for move in reversed(moves):
             if move.axes_d[3]:
-                self.extruder.move(next_move_time, move)
-            next_move_time = (next_move_time + move.accel_t
-                              + move.cruise_t + move.decel_t)
-            for cb in move.timing_callbacks:
-                cb(next_move_time)
+                self.extruder.note_move_end(move.end_pos[3])
+                break
+        profile.moves += len(moves)
         # Generate steps for moves
-        if self.special_queuing_state:
-            self._update_drip_move_time(next_move_time)
-        self.note_mcu_movequeue_activity(next_move_time + self.kin_flush_delay,
-                                         set_step_gen_time=True)
-        self._advance_move_time(next_move_time)
+        try:
+            if self.special_queuing_state:
+                self._update_drip_move_time(next_move_time)
+            self.note_mcu_movequeue_activity(
+                next_move_time + self.kin_flush_delay, set_step_gen_time=True)
+            self._advance_move_time(next_move_time)
+        finally:
+            profile.end_stage(profile.process_moves, stage_start)
+    def _queue_move_batch(self, print_time, data):
+        if not data:
+            return print_time
+        moves = self.ffi_main.from_buffer("struct trapq_batch_move[]", data)
+        etrapq = self.extruder.get_move_trapq()
+        if etrapq is None:
+            etrapq = self.ffi_main.NULL
+        return self.trapq_append_batch(self.trapq, etrapq, print_time,
+                                       moves, len(moves))
     def _flush_lookahead(self):
         # Transit from "NeedPrime"/"Priming"/"Drip"/main state to "NeedPrime"
         self.lookahead.flush()
         self.special_queuing_state = "NeedPrime"
         self.need_check_pause = -1.
-        self.lookahead.set_flush_time(BUFFER_TIME_HIGH)
+        self.lookahead.set_flush_time(self.buffer_time_high)
         self.check_stall_time = 0.
     def flush_step_generation(self):
         self._flush_lookahead()
@@ -394,11 +676,12 @@ class ToolHead:
             if self.priming_timer is None:
                 self.priming_timer = self.reactor.register_timer(
                     self._priming_handler)
-            wtime = eventtime + max(0.100, buffer_time - BUFFER_TIME_LOW)
+            wtime = eventtime + max(0.100,
+                                    buffer_time - self.buffer_time_low)
             self.reactor.update_timer(self.priming_timer, wtime)
         # Check if there are lots of queued moves and pause if so
         while 1:
-            pause_time = buffer_time - BUFFER_TIME_HIGH
+            pause_time = buffer_time - self.buffer_time_high
             if pause_time <= 0.:
                 break
             if not self.can_pause:
@@ -409,7 +692,8 @@ class ToolHead:
             buffer_time = self.print_time - est_print_time
         if not self.special_queuing_state:
             # In main state - defer pause checking until needed
-            self.need_check_pause = est_print_time + BUFFER_TIME_HIGH + 0.100
+            self.need_check_pause = (est_print_time + self.buffer_time_high
+                                     + 0.100)
     def _priming_handler(self, eventtime):
         self.reactor.unregister_timer(self.priming_timer)
         self.priming_timer = None
@@ -417,6 +701,7 @@ class ToolHead:
             if self.special_queuing_state == "Priming":
                 self._flush_lookahead()
                 self.check_stall_time = self.print_time
+                self.profile.stall_checks += 1
         except:
             logging.exception("Exception in priming_handler")
             self.printer.invoke_shutdown("Exception in priming_handler")
@@ -428,13 +713,14 @@ class ToolHead:
                 # In "main" state - flush lookahead if buffer runs low
                 print_time = self.print_time
                 buffer_time = print_time - est_print_time
-                if buffer_time > BUFFER_TIME_LOW:
+                if buffer_time > self.buffer_time_low:
                     # Running normally - reschedule check
-                    return eventtime + buffer_time - BUFFER_TIME_LOW
+                    return eventtime + buffer_time - self.buffer_time_low
                 # Under ran low buffer mark - flush lookahead queue
                 self._flush_lookahead()
                 if print_time != self.print_time:
                     self.check_stall_time = self.print_time
+                    self.profile.stall_checks += 1
             # In "NeedPrime"/"Priming" state - flush queues if needed
             while 1:
                 end_flush = self.need_flush_time + BGFLUSH_EXTRA_TIME
@@ -442,9 +728,10 @@ class ToolHead:
                     self.do_kick_flush_timer = True
                     return self.reactor.NEVER
                 buffer_time = self.last_flush_time - est_print_time
-                if buffer_time > BGFLUSH_LOW_TIME:
-                    return eventtime + buffer_time - BGFLUSH_LOW_TIME
-                ftime = est_print_time + BGFLUSH_LOW_TIME + BGFLUSH_BATCH_TIME
+                if buffer_time > self.bgflush_low_time:
+                    return eventtime + buffer_time - self.bgflush_low_time
+                ftime = (est_print_time + self.bgflush_low_time
+                         + self.bgflush_batch_time)
                 self._advance_flush_time(min(end_flush, ftime))
         except:
             logging.exception("Exception in flush_handler")
@@ -473,6 +760,26 @@ class ToolHead:
         self.lookahead.add_move(move)
         if self.print_time > self.need_check_pause:
             self._check_pause()
+    def move_batch(self, moves):
+        # Queue an iterable of (newpos, speed) moves with less per-move
+        # overhead than move().  Moves are consumed one at a time, so on
+        # error all moves prior to the failing one remain queued and no
+        # later move has been read.
+        kin_check_move = self.kin.check_move
+        add_move = self.lookahead.add_move
+        commanded_pos = self.commanded_pos
+        for newpos, speed in moves:
+            move = Move(self, commanded_pos, newpos, speed)
+            if not move.move_d:
+                continue
+            if move.is_kinematic_move:
+                kin_check_move(move)
+            if move.axes_d[3]:
+                self.extruder.check_move(move)
+            commanded_pos[:] = move.end_pos
+            add_move(move)
+            if self.print_time > self.need_check_pause:
+                self._check_pause()
     def manual_move(self, coord, speed):
         curpos = list(self.commanded_pos)
         for i in range(len(coord)):
@@ -522,7 +829,7 @@ class ToolHead:
         self.need_check_pause = self.reactor.NEVER
         self.reactor.update_timer(self.flush_timer, self.reactor.NEVER)
         self.do_kick_flush_timer = False
-        self.lookahead.set_flush_time(BUFFER_TIME_HIGH)
+        self.lookahead.set_flush_time(self.buffer_time_high)
         self.check_stall_time = 0.
         self.drip_completion = drip_completion
         # Submit move
@@ -548,6 +855,7 @@ class ToolHead:
             m.check_active(max_queue_time, eventtime)
         est_print_time = self.mcu.estimated_print_time(eventtime)
         self.clear_history_time = est_print_time - MOVE_HISTORY_EXPIRE
+        self.profile.update_rates(eventtime)
         buffer_time = self.print_time - est_print_time
         is_active = buffer_time > -60. or not self.special_queuing_state
         if self.special_queuing_state == "Drip":
@@ -570,17 +878,38 @@ class ToolHead:
                      'max_velocity': self.max_velocity,
                      'max_accel': self.max_accel,
                      'minimum_cruise_ratio': self.min_cruise_ratio,
-                     'square_corner_velocity': self.square_corner_velocity})
+                     'square_corner_velocity': self.square_corner_velocity,
+                     'profile': self.profile.get_summary(),
+                     'buffer_control': self.buffer_control.get_status(
+                         eventtime)})
         return res
     def _handle_shutdown(self):
         self.can_pause = False
         self.lookahead.reset()
+    def _handle_profile_request(self, web_request):
+        res = self.profile.get_status()
+        if web_request.get_int('reset', 0):
+            self.profile.reset()
+        web_request.send(res)
+    def set_buffer_scale(self, scale):
+        self.buffer_time_low = BUFFER_TIME_LOW * scale
+        self.buffer_time_high = BUFFER_TIME_HIGH * scale
+        self.buffer_time_start = BUFFER_TIME_START * scale
+        self.bgflush_low_time = BGFLUSH_LOW_TIME * scale
+        self.bgflush_batch_time = BGFLUSH_BATCH_TIME * scale
+        self.move_batch_time = MOVE_BATCH_TIME * scale
+        self.lookahead.set_flush_period(LOOKAHEAD_FLUSH_TIME * scale)
     def get_kinematics(self):
         return self.kin
     def get_trapq(self):
         return self.trapq
     def register_step_generator(self, handler):
         self.step_generators.append(handler)
+    def register_stepper(self, stepper):
+        if self.step_pool is None:
+            self.register_step_generator(stepper.generate_steps)
+        else:
+            self.pool_steppers.append(stepper)
     def note_step_generation_scan_time(self, delay, old_delay=0.):
         self.flush_step_generation()
         if old_delay:
@@ -594,6 +923,9 @@ class ToolHead:
         if last_move is None:
             callback(self.get_last_move_time())
             return
+        # Moves share an empty tuple until a callback is registered
+        if not last_move.timing_callbacks:
+            last_move.timing_callbacks = []
         last_move.timing_callbacks.append(callback)
     def note_mcu_movequeue_activity(self, mq_time, set_step_gen_time=False):
         self.need_flush_time = max(self.need_flush_time, mq_time)
@@ -26,6 +26,35 @@ if sys.version_info.major < 3:
                     for k, v in data.items()}
         return data
 
+# Use a faster json encoder/decoder if one is available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+json_encoder = json.JSONEncoder(separators=(',', ':'))
+def json_dumps(data):
+    return json_encoder.encode(data).encode()
+
+def json_loads(data):
+    return json.loads(data, object_hook=json_loads_byteify)
+
+if orjson is not None:
+    ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+    def orjson_default(obj):
+        # Encode named tuples (eg, toolhead.Coord) as lists
+        if isinstance(obj, tuple):
+            return list(obj)
+        raise TypeError
+    def json_dumps(data):
+        try:
+            return orjson.dumps(data, default=orjson_default,
+                                option=ORJSON_OPTS)
+        except TypeError:
+            # Fall back to the standard encoder (eg, for very large ints)
+            return json_encoder.encode(data).encode()
+    json_loads = orjson.loads
+
 class WebRequestError(gcode.CommandError):
     def __init__(self, message,):
         Exception.__init__(self, message)
@@ -42,7 +71,7 @@ class WebRequest:
     error = WebRequestError
     def __init__(self, client_conn, request):
         self.client_conn = client_conn
-        base_request = json.loads(request, object_hook=json_loads_byteify)
+        base_request = json_loads(request)
         if type(base_request) != dict:
             raise ValueError("Not a top-level dictionary")
         self.id = base_request.get('id', None)
@@ -71,8 +100,11 @@ class WebRequest:
     def get_int(self, item, default=Sentinel):
         return self.get(item, default, types=(int,))
 
-    def get_float(self, item, default=Sentinel):
-        return float(self.get(item, default, types=(int, float)))
+    def get_float(self, item, default=Sentinel, minval=None):
+        value = float(self.get(item, default, types=(int, float)))
+        if minval is not None and value < minval:
+            raise WebRequestError("Invalid Argument [%s]" % (item,))
+        return value
 
     def get_dict(self, item, default=Sentinel):
         return self.get(item, default, types=(dict,))
@@ -137,6 +169,7 @@ class ServerSocket:
 
     def _handle_disconnect(self):
         for client in list(self.clients.values()):
+            client.flush()
             client.close()
         if self.sock is not None:
             self.reactor.unregister_fd(self.fd_handle)
@@ -183,6 +216,7 @@ class ClientConnection:
         self.fd_handle = self.reactor.register_fd(
             self.sock.fileno(), self.process_received, self._do_send)
         self.partial_data = self.send_buffer = b""
+        self.pending_sends = []
         self.is_blocking = False
         self.blocking_count = 0
         self.set_client_info("?", "New connection")
@@ -267,21 +301,41 @@ class ClientConnection:
             return
         self.send(result)
 
-    def send(self, data):
+    def encode(self, data):
         try:
-            jmsg = json.dumps(data, separators=(',', ':'))
-            self.send_buffer += jmsg.encode() + b"\x03"
+            return json_dumps(data) + b"\x03"
         except (TypeError, ValueError) as e:
             msg = ("json encoding error: %s" % (str(e),))
             logging.exception(msg)
             self.printer.invoke_shutdown(msg)
+            return None
+
+    def send(self, data):
+        self.send_encoded(self.encode(data))
+
+    def send_encoded(self, encoded_data):
+        # Send a message previously encoded with encode()
+        if encoded_data is None:
             return
+        # Messages queued during a reactor tick are sent together
+        if not self.pending_sends and not self.is_blocking:
+            self.reactor.register_callback(self._flush_sends)
+        self.pending_sends.append(encoded_data)
+
+    def _flush_sends(self, eventtime):
         if not self.is_blocking:
             self._do_send()
 
+    def flush(self):
+        if self.pending_sends or self.send_buffer:
+            self._do_send()
+
     def _do_send(self, eventtime=None):
         if self.fd_handle is None:
             return
+        if self.pending_sends:
+            self.send_buffer += b"".join(self.pending_sends)
+            self.pending_sends = []
         try:
             sent = self.sock.send(self.send_buffer)
         except socket.error as e:
@@ -456,13 +510,56 @@ class GCodeHelper:
 
 SUBSCRIPTION_REFRESH_TIME = .25
 
+# Clients with identical subscriptions share a single status payload
+class SubscriptionGroup:
+    def __init__(self, subscription, template, update_interval):
+        self.subscription = subscription
+        self.update_interval = update_interval
+        self.clients = []
+        self.pending = {}
+        self.next_update = 0.
+        # Pre-encode the start of the message
+        tmp = dict(template)
+        tmp.pop('params', None)
+        self.msg_prefix = json_dumps(tmp)[:-1]
+        if tmp:
+            self.msg_prefix += b','
+    def note_changes(self, cquery):
+        pending = self.pending
+        for obj_name, cres in cquery.items():
+            pending.setdefault(obj_name, []).append(cres)
+    def flush(self, eventtime, encode_fragment):
+        if not self.pending or eventtime < self.next_update:
+            return
+        self.next_update = eventtime + self.update_interval
+        parts = []
+        for obj_name, cres_list in self.pending.items():
+            if len(cres_list) == 1:
+                frag = encode_fragment(cres_list[0])
+            else:
+                # Merge changes from several updates
+                cres = {}
+                for c in cres_list:
+                    cres.update(c)
+                frag = json_dumps(cres)
+            parts.append(json_dumps(obj_name) + b':' + frag)
+        self.pending = {}
+        encoded = (self.msg_prefix + b'"params":{"eventtime":'
+                   + json_dumps(eventtime) + b',"status":{'
+                   + b','.join(parts) + b'}}}\x03')
+        for cconn in self.clients:
+            cconn.send_encoded(encoded)
+
 class QueryStatusHelper:
     def __init__(self, printer):
         self.printer = printer
         self.clients = {}
+        self.groups = {}
         self.pending_queries = []
         self.query_timer = None
         self.last_query = {}
+        self.last_versions = {}
+        self.fragments = {}
         # Register webhooks
         webhooks = printer.lookup_object('webhooks')
         webhooks.register_endpoint("objects/list", self._handle_list)
@@ -472,45 +569,94 @@ class QueryStatusHelper:
         objects = [n for n, o in self.printer.lookup_objects()
                    if hasattr(o, 'get_status')]
         web_request.send({'objects': objects})
+    def _query_object(self, obj_name, eventtime, query, versions):
+        # Objects may implement get_status_version() to report a value
+        # that changes whenever their get_status() result changes
+        po = self.printer.lookup_object(obj_name, None)
+        if po is None or not hasattr(po, 'get_status'):
+            res = query[obj_name] = {}
+            return res, True
+        get_version = getattr(po, 'get_status_version', None)
+        if get_version is not None:
+            version = versions[obj_name] = get_version()
+            if (obj_name in self.last_query
+                and self.last_versions.get(obj_name) == version):
+                res = query[obj_name] = self.last_query[obj_name]
+                return res, False
+        res = query[obj_name] = po.get_status(eventtime)
+        return res, True
+    def _encode_fragment(self, cres):
+        # Diffs are shared between groups, so only encode them once
+        frag = self.fragments.get(id(cres))
+        if frag is None:
+            frag = self.fragments[id(cres)] = json_dumps(cres)
+        return frag
     def _do_query(self, eventtime):
         last_query = self.last_query
-        query = self.last_query = {}
+        query = {}
+        versions = {}
+        changed = {}
+        diffs = {}
+        def lookup(obj_name):
+            if obj_name not in query:
+                res, changed[obj_name] = self._query_object(
+                    obj_name, eventtime, query, versions)
+            return query[obj_name]
+        # Generate get_status() info for one time queries
         msglist = self.pending_queries
         self.pending_queries = []
-        msglist.extend(self.clients.values())
-        # Generate get_status() info for each client
         for cconn, subscription, send_func, template in msglist:
-            is_query = cconn is None
-            if not is_query and cconn.is_closed():
-                del self.clients[cconn]
+            cquery = {}
+            for obj_name, req_items in subscription.items():
+                res = lookup(obj_name)
+                if req_items is None:
+                    req_items = list(res.keys())
+                    if req_items:
+                        subscription[obj_name] = req_items
+                cquery[obj_name] = {ri: res.get(ri, None) for ri in req_items}
+            tmp = dict(template)
+            tmp['params'] = {'eventtime': eventtime, 'status': cquery}
+            send_func(tmp)
+        # Generate changes for each group of subscribed clients
+        for key, group in list(self.groups.items()):
+            for cconn in [c for c in group.clients if c.is_closed()]:
+                self._remove_client(cconn)
+            if not group.clients:
+                del self.groups[key]
                 continue
-            # Query each requested printer object
             cquery = {}
+            subscription = group.subscription
             for obj_name, req_items in subscription.items():
-                res = query.get(obj_name, None)
-                if res is None:
-                    po = self.printer.lookup_object(obj_name, None)
-                    if po is None or not hasattr(po, 'get_status'):
-                        res = query[obj_name] = {}
-                    else:
-                        res = query[obj_name] = po.get_status(eventtime)
+                res = lookup(obj_name)
+                if not changed[obj_name]:
+                    continue
                 if req_items is None:
                     req_items = list(res.keys())
                     if req_items:
                         subscription[obj_name] = req_items
-                lres = last_query.get(obj_name, {})
-                cres = {}
-                for ri in req_items:
-                    rd = res.get(ri, None)
-                    if is_query or rd != lres.get(ri):
-                        cres[ri] = rd
-                if cres or is_query:
+                # Share the diff between groups requesting the same items
+                dkey = (obj_name, tuple(req_items))
+                cres = diffs.get(dkey)
+                if cres is None:
+                    lres = last_query.get(obj_name, {})
+                    cres = diffs[dkey] = {}
+                    for ri in req_items:
+                        rd = res.get(ri, None)
+                        if rd != lres.get(ri):
+                            cres[ri] = rd
+                if cres:
                     cquery[obj_name] = cres
-            # Send data
-            if cquery or is_query:
-                tmp = dict(template)
-                tmp['params'] = {'eventtime': eventtime, 'status': cquery}
-                send_func(tmp)
+            group.note_changes(cquery)
+            try:
+                group.flush(eventtime, self._encode_fragment)
+            except (TypeError, ValueError) as e:
+                msg = ("json encoding error: %s" % (str(e),))
+                logging.exception(msg)
+                self.printer.invoke_shutdown(msg)
+                group.pending = {}
+        self.fragments.clear()
+        self.last_query = query
+        self.last_versions = versions
         if not query:
             # Unregister timer if there are no longer any subscriptions
             reactor = self.printer.get_reactor()
@@ -518,6 +664,19 @@ class QueryStatusHelper:
             self.query_timer = None
             return reactor.NEVER
         return eventtime + SUBSCRIPTION_REFRESH_TIME
+    def _remove_client(self, cconn):
+        group = self.clients.pop(cconn, None)
+        if group is not None and cconn in group.clients:
+            group.clients.remove(cconn)
+    def _add_client(self, cconn, subscription, template, update_interval):
+        key = json.dumps([subscription, template, update_interval],
+                         sort_keys=True)
+        group = self.groups.get(key)
+        if group is None:
+            group = SubscriptionGroup(subscription, template, update_interval)
+            self.groups[key] = group
+        group.clients.append(cconn)
+        self.clients[cconn] = group
     def _handle_query(self, web_request, is_subscribe=False):
         objects = web_request.get_dict('objects')
         # Validate subscription format
@@ -531,8 +690,11 @@ class QueryStatusHelper:
         # Add to pending queries
         cconn = web_request.get_client_connection()
         template = web_request.get_dict('response_template', {})
-        if is_subscribe and cconn in self.clients:
-            del self.clients[cconn]
+        update_interval = SUBSCRIPTION_REFRESH_TIME
+        if is_subscribe:
+            update_interval = web_request.get_float('update_interval',
+                                                    update_interval, minval=0.)
+            self._remove_client(cconn)
         reactor = self.printer.get_reactor()
         complete = reactor.completion()
         self.pending_queries.append((None, objects, complete.complete, {}))
@@ -544,7 +706,7 @@ class QueryStatusHelper:
         msg = complete.wait()
         web_request.send(msg['params'])
         if is_subscribe:
-            self.clients[cconn] = (cconn, objects, cconn.send, template)
+            self._add_client(cconn, objects, template, update_interval)
     def _handle_subscribe(self, web_request):
         self._handle_query(web_request, is_subscribe=True)
 
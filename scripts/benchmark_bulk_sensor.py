@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Verify and benchmark bulk sensor sample extraction
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import optparse, os, sys, time, random
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import numpy
+import extras.bulk_sensor as bulk_sensor
+
+SENSORS = [("adxl345", "BBBBB"), ("lis2dw", "<hhh"), ("mpu9250", ">hhh"),
+           ("ldc1612", ">I"), ("hx711", "<i")]
+MCU_FREQ = 100000000.
+
+class DummyMCU:
+    def clock_to_print_time(self, clock):
+        return clock / MCU_FREQ
+
+# Provide previously generated sensor_bulk_data messages
+class DummyBulkQueue:
+    def __init__(self, messages):
+        self.params = [{'sequence': seq, 'data': data}
+                       for seq, data in messages]
+        self.blocks = numpy.zeros(len(messages),
+                                  numpy.dtype(bulk_sensor.BULK_BLOCK_FIELDS))
+        for i, (seq, data) in enumerate(messages):
+            self.blocks['sequence'][i] = seq
+            self.blocks['len'][i] = len(data)
+            self.blocks['data'][i, :len(data)] = bytearray(data)
+    def pull_queue(self):
+        return list(self.params)
+    def pull_blocks(self):
+        return self.blocks
+
+def generate_messages(rnd, reader, count, start_seq):
+    block_size = reader.samples_per_block * reader.bytes_per_sample
+    messages = []
+    for i in range(count):
+        size = block_size
+        if i == count - 1:
+            # Final message may be a partial block
+            size = rnd.randrange(reader.bytes_per_sample, block_size + 1)
+            size -= size % reader.bytes_per_sample
+        data = bytes([rnd.randrange(256) for j in range(size)])
+        messages.append(((start_seq + i) & 0xffff, data))
+    return messages
+
+def make_reader(unpack_fmt, messages, start_seq):
+    reader = bulk_sensor.FixedFreqReader(DummyMCU(), 1000, unpack_fmt)
+    reader.bulk_queue = DummyBulkQueue(messages)
+    # Use a fixed clock synchronization instead of querying the mcu
+    reader._update_clock = (lambda is_reset=False: None)
+    reader.last_sequence = start_seq
+    chip_clock = start_seq * reader.samples_per_block
+    reader.clock_sync.reset(123456789., chip_clock)
+    reader.clock_sync.update(123456789. + 31250. * 1000, chip_clock + 1000.)
+    return reader
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-n", "--messages", type="int", dest="messages",
+                    default=1000, help="number of messages per batch")
+    opts.add_option("-b", "--batches", type="int", dest="batches",
+                    default=20, help="number of batches to time")
+    opts.add_option("-s", "--seed", type="int", dest="seed",
+                    default=0, help="random number seed")
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    rnd = random.Random(options.seed)
+    for name, unpack_fmt in SENSORS:
+        # Start near a 16bit sequence wrap (at 0x20000)
+        start_seq = 0x20000 - rnd.randrange(options.messages)
+        reader = make_reader(unpack_fmt, [], start_seq)
+        messages = generate_messages(rnd, reader, options.messages, start_seq)
+        times = []
+        results = []
+        for mode in ["python", "tuples", "arrays"]:
+            elapsed = 0.
+            for i in range(options.batches):
+                reader = make_reader(unpack_fmt, messages, start_seq)
+                if mode == "python":
+                    reader.sample_dtype = None
+                start = time.perf_counter()
+                if mode == "arrays":
+                    res = reader.pull_sample_arrays()
+                else:
+                    res = reader.pull_samples()
+                elapsed += time.perf_counter() - start
+            if mode == "arrays":
+                res = list(zip(*[a.tolist() for a in res]))
+            results.append((res, reader.clock_sync.last_chip_clock))
+            times.append(elapsed / options.batches)
+        if results[1] != results[0] or results[2] != results[0]:
+            sys.stdout.write("%s: samples do NOT match\n" % (name,))
+            sys.exit(1)
+        count = len(results[0][0])
+        sys.stdout.write(
+            "%-8s %6d samples: python %.2fms, pull_samples() %.2fms,"
+            " pull_sample_arrays() %.2fms (%.1fx)\n"
+            % (name, count, times[0] * 1000., times[1] * 1000.,
+               times[2] * 1000., times[0] / times[2]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# Benchmark host CAN bus command transmission to several simulated nodes
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import optparse, os, sys, time, random, socket, struct, threading, select
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import chelper, msgproto
+
+CAN_FMT = "<IB3x8s"
+CAN_FRAME_SIZE = struct.calcsize(CAN_FMT)
+CANBUS_ID_BASE = 256
+
+def node_txid(node):
+    return CANBUS_ID_BASE + node * 2
+
+# Simulated mcus that acknowledge each message block received
+class SimulatedNodes:
+    def __init__(self, socks, nodes):
+        self.socks = socks
+        self.input_bufs = [bytearray() for n in range(nodes)]
+        self.should_exit = False
+        self.thread = threading.Thread(target=self._run)
+    def _send_ack(self, sock, node, seq):
+        block = [msgproto.MESSAGE_MIN, msgproto.MESSAGE_DEST | seq]
+        block += msgproto.crc16_ccitt(block) + [msgproto.MESSAGE_SYNC]
+        sock.send(struct.pack(CAN_FMT, node_txid(node) + 1, len(block),
+                              bytes(block)))
+    def _handle_frame(self, sock, frame):
+        can_id, dlc, data = struct.unpack(CAN_FMT, frame)
+        node = (can_id - CANBUS_ID_BASE) // 2
+        buf = self.input_bufs[node]
+        buf.extend(data[:dlc])
+        while buf:
+            if buf[0] == msgproto.MESSAGE_SYNC:
+                del buf[0]
+                continue
+            blen = buf[0]
+            if len(buf) < blen:
+                break
+            seq = (buf[1] + 1) & msgproto.MESSAGE_SEQ_MASK
+            del buf[:blen]
+            self._send_ack(sock, node, seq)
+    def _run(self):
+        while not self.should_exit:
+            ready, w, x = select.select(self.socks, [], [], .100)
+            for sock in ready:
+                self._handle_frame(sock, sock.recv(CAN_FRAME_SIZE))
+    def start(self):
+        self.thread.start()
+    def stop(self):
+        self.should_exit = True
+        self.thread.join()
+
+# Open a CAN socket per node (as done in serialhdl.py connect_canbus())
+def open_vcan(iface, nodes):
+    host_socks = []
+    for node in range(nodes):
+        sock = socket.socket(socket.PF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        sock.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER,
+                        struct.pack("=II", node_txid(node) + 1, 0x7ff))
+        sock.bind((iface,))
+        host_socks.append(sock)
+    mcu_sock = socket.socket(socket.PF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+    mcu_sock.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER,
+                        struct.pack("=II", CANBUS_ID_BASE, 0x781))
+    mcu_sock.bind((iface,))
+    return host_socks, [mcu_sock]
+
+# Connect each node via a socket pair (for hosts without vcan support)
+def open_socketpairs(nodes):
+    pairs = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+             for node in range(nodes)]
+    return [p[0] for p in pairs], [p[1] for p in pairs]
+
+# Wait for (and record) the send notifications of a node's commands
+def pull_notifications(ffi_main, ffi_lib, sq, count, latencies):
+    response = ffi_main.new('struct pull_queue_message *')
+    for i in range(count):
+        ffi_lib.serialqueue_pull(sq, response)
+        if response.len < 0:
+            break
+        latencies.append(response.receive_time - response.sent_time)
+
+def run(options, host_socks):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    rnd = random.Random(options.seed)
+    cmds = [bytes([rnd.randrange(256)
+                   for j in range(rnd.randrange(2, options.max_size + 1))])
+            for i in range(options.count)]
+    queues = []
+    for node, sock in enumerate(host_socks):
+        sq = ffi_main.gc(ffi_lib.serialqueue_alloc(sock.fileno(), b'c',
+                                                    node_txid(node)),
+                         ffi_lib.serialqueue_free)
+        cq = ffi_main.gc(ffi_lib.serialqueue_alloc_commandqueue(),
+                         ffi_lib.serialqueue_free_commandqueue)
+        latencies = []
+        thread = threading.Thread(target=pull_notifications, args=(
+            ffi_main, ffi_lib, sq, len(cmds), latencies))
+        thread.start()
+        queues.append((sq, cq, thread, latencies))
+    # Queue all commands (requesting a notification when each is acked)
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for i, cmd in enumerate(cmds):
+        for sq, cq, thread, latencies in queues:
+            ffi_lib.serialqueue_send(sq, cq, cmd, len(cmd), 0, 0, i + 1)
+    for sq, cq, thread, latencies in queues:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    stats = ffi_main.new('char[4096]')
+    ffi_lib.serialqueue_get_stats(queues[0][0], stats, len(stats))
+    for sq, cq, thread, latencies in queues:
+        ffi_lib.serialqueue_exit(sq)
+    latencies = sorted([l for q in queues for l in q[3]])
+    return elapsed, cpu, latencies, ffi_main.string(stats).decode()
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-i", "--interface", type="string", dest="iface",
+                    default="vcan0", help="CAN interface to use")
+    opts.add_option("--socketpair", action="store_true", dest="socketpair",
+                    help="use socket pairs instead of a CAN interface")
+    opts.add_option("-n", "--nodes", type="int", dest="nodes",
+                    default=4, help="number of simulated CAN nodes")
+    opts.add_option("-c", "--count", type="int", dest="count",
+                    default=20000, help="number of commands per node")
+    opts.add_option("--max-size", type="int", dest="max_size",
+                    default=12, help="maximum command size (in bytes)")
+    opts.add_option("-s", "--seed", type="int", dest="seed",
+                    default=0, help="random number seed")
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    if options.socketpair:
+        host_socks, mcu_socks = open_socketpairs(options.nodes)
+    else:
+        host_socks, mcu_socks = open_vcan(options.iface, options.nodes)
+    nodes = SimulatedNodes(mcu_socks, options.nodes)
+    nodes.start()
+    try:
+        elapsed, cpu, latencies, stats = run(options, host_socks)
+    finally:
+        nodes.stop()
+    total = options.nodes * options.count
+    if len(latencies) != total:
+        sys.stdout.write("Only %d of %d commands acknowledged\n"
+                         % (len(latencies), total))
+        sys.exit(1)
+    sys.stdout.write("Node 0 stats: %s\n" % (stats,))
+    sys.stdout.write("%d nodes, %d commands: %.0f commands per second,"
+                     " %.2fus cpu per command\n"
+                     % (options.nodes, total, total / elapsed,
+                        cpu * 1000000. / total))
+    sys.stdout.write("Block ack latency: median %.3fms, 99%% %.3fms,"
+                     " max %.3fms\n"
+                     % (latencies[total // 2] * 1000.,
+                        latencies[total * 99 // 100] * 1000.,
+                        latencies[-1] * 1000.))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Benchmark and verify the g-code line tokenizer
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import optparse, os, sys, glob, time, random
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import gcode
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                        '..', 'test', 'klippy')
+
+def load_lines(filenames):
+    lines = []
+    for fname in filenames:
+        with open(fname, 'r') as f:
+            for line in f:
+                line = line.strip()
+                cpos = line.find(';')
+                if cpos >= 0:
+                    line = line[:cpos]
+                lines.append(line)
+    return lines
+
+def gen_moves(count):
+    # Dense, arc-fitted style print moves
+    rnd = random.Random(0)
+    out = []
+    e = 0.
+    for i in range(count):
+        e += rnd.uniform(0.001, 0.05)
+        out.append("G1 X%.3f Y%.3f E%.5f" % (rnd.uniform(0., 200.),
+                                             rnd.uniform(0., 200.), e))
+        if not i % 50:
+            out.append("G1 Z%.2f F%d" % (i / 1000., rnd.choice([1800, 6000])))
+    return out
+
+def verify(lines):
+    bad = 0
+    for line in lines:
+        if gcode.parse_line(line) != gcode.parse_line_regex(line):
+            sys.stdout.write("Mismatch on %s\n" % (repr(line),))
+            bad += 1
+    return bad
+
+def bench(func, lines, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            func(line)
+        t = time.perf_counter() - start
+        if best is None or t < best:
+            best = t
+    return len(lines) / best
+
+def main():
+    usage = "%prog [options] [<gcode_file> ...]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-n", "--count", type="int", dest="count", default=100000,
+                    help="number of synthetic moves to generate")
+    opts.add_option("-r", "--repeat", type="int", dest="repeat", default=5,
+                    help="number of timing runs (best is reported)")
+    options, args = opts.parse_args()
+    if args:
+        corpus = load_lines(args)
+    else:
+        fnames = (glob.glob(os.path.join(TEST_DIR, '*.test'))
+                  + glob.glob(os.path.join(TEST_DIR, '*.gcode'))
+                  + glob.glob(os.path.join(TEST_DIR, '*', '*.gcode')))
+        corpus = load_lines(sorted(fnames))
+    moves = gen_moves(options.count)
+    bad = verify(corpus + moves)
+    sys.stdout.write("Verified %d lines (%d mismatches)\n"
+                     % (len(corpus) + len(moves), bad))
+    for name, lines in [("corpus", corpus), ("moves", moves)]:
+        slow = bench(gcode.parse_line_regex, lines, options.repeat)
+        fast = bench(gcode.parse_line, lines, options.repeat)
+        sys.stdout.write("%-6s regex: %10.0f lines/s  fast: %10.0f lines/s"
+                         "  (%.2fx)\n" % (name, slow, fast, fast / slow))
+    if bad:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
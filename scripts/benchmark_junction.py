@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# Verify and benchmark the C look-ahead junction speed calculation
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import optparse, os, sys, time, random, math
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import toolhead
+
+class DummyExtruder:
+    def __init__(self, instant_corner_v):
+        self.instant_corner_v = instant_corner_v
+    def calc_junction(self, prev_move, move):
+        diff_r = move.axes_r[3] - prev_move.axes_r[3]
+        if diff_r:
+            return (self.instant_corner_v / abs(diff_r))**2
+        return move.max_cruise_v2
+    def get_instant_corner_v(self):
+        return self.instant_corner_v
+
+class DummyToolHead:
+    def __init__(self, instant_corner_v):
+        self.max_velocity = 300.
+        self.max_accel = 3000.
+        self.max_accel_to_decel = 1500.
+        self.junction_deviation = 0.013
+        self.extruder = DummyExtruder(instant_corner_v)
+
+# Generate random moves that exercise the junction calculation corner
+# cases (straight lines, reversals, extrude only moves, speed limits)
+def generate_moves(th, rnd, count):
+    moves = []
+    pos = [100., 100., 1., 0.]
+    for i in range(count):
+        kind = rnd.random()
+        newpos = list(pos)
+        if kind < .05:
+            # Extrude only move (or retraction)
+            newpos[3] += rnd.uniform(-2., 2.)
+        elif kind < .15 and moves:
+            # Continue in a straight line
+            prev = moves[-1]
+            dist = rnd.uniform(.1, 5.)
+            for j in range(3):
+                newpos[j] += prev.axes_r[j] * dist
+        elif kind < .20 and moves:
+            # Reverse direction
+            prev = moves[-1]
+            for j in range(3):
+                newpos[j] -= prev.axes_d[j]
+        else:
+            angle = rnd.uniform(0., 2. * math.pi)
+            dist = rnd.choice([.05, .5, 2., 20.]) * rnd.random()
+            newpos[0] += dist * math.cos(angle)
+            newpos[1] += dist * math.sin(angle)
+            if kind > .95:
+                newpos[2] += rnd.uniform(-.5, .5)
+            newpos[3] += dist * rnd.choice([0., 0., .03, .05])
+        if rnd.random() < .01:
+            th.junction_deviation = rnd.choice([0., .005, .013, .05])
+        move = toolhead.Move(th, pos, newpos, rnd.uniform(5., 400.))
+        if not move.move_d:
+            continue
+        if rnd.random() < .05:
+            move.limit_speed(rnd.uniform(1., 50.), rnd.uniform(10., 500.))
+        moves.append(move)
+        pos = move.end_pos
+    return moves
+
+# Calculate junctions using the Python Move.calc_junction() code
+def python_junctions(moves):
+    start = time.perf_counter()
+    for prev_move, move in zip(moves[:-1], moves[1:]):
+        move.calc_junction(prev_move)
+    host_time = time.perf_counter() - start
+    return host_time, [(m.max_start_v2, m.max_smoothed_v2) for m in moves]
+
+# Calculate junctions using the look-ahead queue (and its C code)
+def queue_junctions(th, moves, rnd):
+    lookahead = toolhead.LookAheadQueue(th)
+    # Calculate junctions in random sized batches
+    batches = [rnd.random() < .02 for m in moves]
+    start = time.perf_counter()
+    for move, do_calc in zip(moves, batches):
+        lookahead.queue.append(move)
+        if do_calc:
+            lookahead.calc_junctions()
+    lookahead.calc_junctions()
+    host_time = time.perf_counter() - start
+    return host_time, [(m.max_start_v2, m.max_smoothed_v2) for m in moves]
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-n", "--moves", type="int", dest="moves",
+                    default=100000, help="number of moves per test")
+    opts.add_option("-s", "--seed", type="int", dest="seed",
+                    default=0, help="random number seed")
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    py_time = c_time = 0.
+    for instant_corner_v in [1., 0., 5.]:
+        th = DummyToolHead(instant_corner_v)
+        rnd = random.Random(options.seed)
+        moves = generate_moves(th, rnd, options.moves)
+        host_time, ref = python_junctions(moves)
+        py_time += host_time
+        for m in moves:
+            m.max_start_v2 = m.max_smoothed_v2 = 0.
+        host_time, res = queue_junctions(th, moves, rnd)
+        c_time += host_time
+        if res != ref:
+            count = len([1 for r, c in zip(ref, res) if r != c])
+            sys.stdout.write("instant_corner_v=%.3f: %d of %d junctions"
+                             " do NOT match\n"
+                             % (instant_corner_v, count, len(moves)))
+            sys.exit(1)
+        sys.stdout.write("instant_corner_v=%.3f: %d junctions identical\n"
+                         % (instant_corner_v, len(moves)))
+    sys.stdout.write("Python %.4fs, look-ahead queue %.4fs (%.2fx)\n"
+                     % (py_time, c_time, py_time / c_time))
+
+if __name__ == '__main__':
+    main()
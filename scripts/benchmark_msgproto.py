@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Verify and benchmark the message encoding and parsing code
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import optparse, os, sys, time, random
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import msgproto
+
+# Reference implementation that encodes one parameter type at a time
+def ref_encode(mp, params):
+    out = [mp.msgid]
+    for i, t in enumerate(mp.param_types):
+        t.encode(out, params[i])
+    return out
+
+# Reference implementation that parses one parameter type at a time
+def ref_parse(mp, s, pos):
+    pos += 1
+    out = {}
+    for name, t in mp.param_names:
+        v, pos = t.parse(s, pos)
+        out[name] = v
+    return out, pos
+
+def random_param(rnd, t):
+    if isinstance(t, msgproto.Enumeration):
+        return rnd.choice(list(t.enums.keys()))
+    if t.is_dynamic_string:
+        return bytes([rnd.randrange(256)
+                      for i in range(rnd.randrange(32))])
+    bits = {5: 32, 3: 16, 2: 8}[t.max_length]
+    if t.signed:
+        return rnd.randrange(-(1 << (bits-1)), 1 << (bits-1))
+    return rnd.choice([rnd.randrange(1 << bits), rnd.randrange(128)])
+
+# Build message blocks (with header and trailer) from encoded messages
+def build_blocks(cmds):
+    blocks = []
+    for cmd in cmds:
+        block = [msgproto.MESSAGE_MIN + len(cmd), msgproto.MESSAGE_DEST]
+        block += cmd
+        block += msgproto.crc16_ccitt(block) + [msgproto.MESSAGE_SYNC]
+        blocks.append(bytearray(block))
+    return blocks
+
+def main():
+    usage = "%prog [options] <dictionary file>"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-n", "--count", type="int", dest="count",
+                    default=10000, help="number of messages per format")
+    opts.add_option("-s", "--seed", type="int", dest="seed",
+                    default=0, help="random number seed")
+    options, args = opts.parse_args()
+    if len(args) != 1:
+        opts.error("Incorrect number of arguments")
+    f = open(args[0], 'rb')
+    dictionary = f.read()
+    f.close()
+    msgparser = msgproto.MessageParser()
+    msgparser.process_identify(dictionary, decompress=False)
+    rnd = random.Random(options.seed)
+    messages = [m for m in msgparser.messages_by_id.values()
+                if isinstance(m, msgproto.MessageFormat)]
+    ref_enc_time = enc_time = ref_time = parse_time = 0.
+    for mp in sorted(messages, key=(lambda m: m.msgformat)):
+        all_params = [[random_param(rnd, t) for t in mp.param_types]
+                      for i in range(options.count)]
+        start = time.perf_counter()
+        ref_cmds = [ref_encode(mp, params) for params in all_params]
+        ref_enc_time += time.perf_counter() - start
+        start = time.perf_counter()
+        cmds = [mp.encode(params) for params in all_params]
+        enc_time += time.perf_counter() - start
+        if cmds != ref_cmds:
+            sys.stdout.write("Encoding of '%s' does NOT match\n"
+                             % (mp.msgformat,))
+            sys.exit(1)
+        blocks = build_blocks(cmds)
+        start = time.perf_counter()
+        ref = []
+        for s in blocks:
+            params, pos = ref_parse(mp, s, msgproto.MESSAGE_HEADER_SIZE)
+            params['#name'] = mp.name
+            ref.append(params)
+        ref_time += time.perf_counter() - start
+        start = time.perf_counter()
+        res = [msgparser.parse(s) for s in blocks]
+        parse_time += time.perf_counter() - start
+        if res != ref:
+            sys.stdout.write("Parsing of '%s' does NOT match\n"
+                             % (mp.msgformat,))
+            sys.exit(1)
+    total = len(messages) * options.count
+    sys.stdout.write("%d message formats identical\n" % (len(messages),))
+    sys.stdout.write("Encode per message: reference %.0fns, encode() %.0fns\n"
+                     % (ref_enc_time * 1e9 / total, enc_time * 1e9 / total))
+    sys.stdout.write("Parse per message: reference %.0fns, parse() %.0fns\n"
+                     % (ref_time * 1e9 / total, parse_time * 1e9 / total))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Benchmark print state reconstruction used to resume interrupted prints
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import importlib, optparse, os, sys, time, random, tempfile, tracemalloc
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+virtual_sdcard = importlib.import_module('.virtual_sdcard', 'extras')
+
+def gen_file(fname, size_mb):
+    rnd = random.Random(0)
+    target = size_mb * 1024 * 1024
+    with open(fname, 'w') as f:
+        f.write("M140 S60\nM104 S200 T0\nG90\nM83\nT0\n")
+        size = layer = 0
+        while size < target:
+            layer += 1
+            out = [";LAYER:%d" % (layer,), "G1 Z%.2f F600" % (layer * .2,),
+                   "M106 S%d" % (rnd.randint(0, 255),)]
+            if not layer % 50:
+                out.append("M104 S%d T%d" % (rnd.randint(190, 230),
+                                             rnd.randint(0, 1)))
+            for i in range(2000):
+                out.append("G1 X%.3f Y%.3f E%.5f" % (
+                    rnd.uniform(0., 200.), rnd.uniform(0., 200.),
+                    rnd.uniform(0.001, 0.05)))
+            data = "\n".join(out) + "\n"
+            f.write(data)
+            size += len(data)
+
+def stream_file(pfile, save_pos):
+    # Simulate virtual_sdcard reading the file and checkpointing the state
+    tracker = virtual_sdcard.PrintStateTracker()
+    pos = 0
+    checkpoint = None
+    while 1:
+        while tracker.scan(pfile, pos):
+            pass
+        if pos <= save_pos:
+            checkpoint = tracker.get_checkpoint()
+        lines, sizes = pfile.read_lines(pos)
+        if not lines:
+            break
+        pos += sum(sizes)
+    return checkpoint
+
+def main():
+    usage = "%prog [options] [<gcode_file>]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-s", "--size", type="int", dest="size", default=100,
+                    help="size (in MB) of the generated test file")
+    opts.add_option("-p", "--position", type="float", dest="position",
+                    default=0.95, help="interruption point (ratio of file)")
+    options, args = opts.parse_args()
+    tmpname = None
+    if args:
+        fname = args[0]
+    else:
+        fd, tmpname = tempfile.mkstemp(suffix=".gcode")
+        os.close(fd)
+        fname = tmpname
+        gen_file(fname, options.size)
+    try:
+        pfile = virtual_sdcard.PrintFile(fname)
+        fsize = pfile.get_size()
+        save_pos = pfile.find_line_start(int(fsize * options.position))
+        sys.stdout.write("File size %d bytes, interrupted at %d\n"
+                         % (fsize, save_pos))
+        # Cost of tracking state while streaming the file
+        start = time.perf_counter()
+        checkpoint = stream_file(pfile, save_pos)
+        stream_t = time.perf_counter() - start
+        # Resume without a checkpoint (full scan of the file prefix)
+        start = time.perf_counter()
+        full = virtual_sdcard.PrintStateTracker()
+        while full.scan(pfile, save_pos):
+            pass
+        full_t = time.perf_counter() - start
+        tracemalloc.start()
+        full = virtual_sdcard.PrintStateTracker()
+        while full.scan(pfile, save_pos):
+            pass
+        peak_mem = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        # Resume from the saved checkpoint
+        start = time.perf_counter()
+        tracker = virtual_sdcard.PrintStateTracker(*checkpoint)
+        while tracker.scan(pfile, save_pos):
+            pass
+        resume_t = time.perf_counter() - start
+        pfile.close()
+    finally:
+        if tmpname is not None:
+            os.unlink(tmpname)
+    sys.stdout.write("Streaming with state tracking: %.3fs (%.1f MB/s)\n"
+                     % (stream_t, fsize / stream_t / 1e6))
+    sys.stdout.write("Full prefix scan:  %.6fs\n" % (full_t,))
+    sys.stdout.write("Checkpoint resume: %.6fs (tail %d bytes)\n"
+                     % (resume_t, save_pos - checkpoint[0]))
+    sys.stdout.write("Full scan peak allocations: %.1f KB\n"
+                     % (peak_mem / 1024.,))
+    if tracker.get_state() != full.get_state():
+        sys.stdout.write("State mismatch!\n  %s\n  %s\n"
+                         % (tracker.get_state(), full.get_state()))
+        sys.exit(1)
+    sys.stdout.write("Restored state: %s\n" % (tracker.get_state(),))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# Benchmark step generation by replaying recorded move streams
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import optparse, os, sys, time, random
+import numpy
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import chelper
+
+MCU_FREQ = 100000000.
+MAX_ERROR = 2500
+
+######################################################################
+# Move stream generation
+######################################################################
+
+# Generate random back and forth moves for a series of steppers.  Each
+# move is stored as (print_time, start_pos, end_pos, velocity, accel).
+def generate_streams(options):
+    streams = []
+    for i in range(options.steppers):
+        rnd = random.Random(i)
+        moves = []
+        print_time = 0.1
+        pos = 100.
+        while print_time < options.duration:
+            npos = pos + rnd.uniform(-1., 1.) * options.move_dist
+            npos = min(max(npos, 20.), 180.)
+            if abs(npos - pos) < options.step_dist:
+                continue
+            velocity = rnd.uniform(.1, 1.) * options.velocity
+            moves.append((print_time, pos, npos, velocity, options.accel))
+            print_time += calc_move_times(abs(npos - pos), velocity,
+                                          options.accel)[3]
+            pos = npos
+        streams.append(moves)
+    return streams
+
+# Return the accel_t, cruise_t, cruise_v, and total time of a move
+def calc_move_times(dist, velocity, accel):
+    accel_t = velocity / accel
+    accel_d = .5 * velocity * accel_t
+    if 2. * accel_d > dist:
+        accel_t = (dist / accel)**.5
+        accel_d = .5 * dist
+        velocity = accel * accel_t
+    cruise_t = (dist - 2. * accel_d) / velocity
+    return accel_t, cruise_t, velocity, 2. * accel_t + cruise_t
+
+# Recorded streams are stored in a numpy .npz file
+def save_streams(filename, streams, step_dist):
+    data = {'step_dist': numpy.array(step_dist)}
+    for i, moves in enumerate(streams):
+        data['moves_%d' % (i,)] = numpy.array(moves)
+    numpy.savez(filename, **data)
+
+def load_streams(filename):
+    data = numpy.load(filename)
+    streams = []
+    i = 0
+    while 'moves_%d' % (i,) in data:
+        streams.append([tuple(m) for m in data['moves_%d' % (i,)].tolist()])
+        i += 1
+    return streams, float(data['step_dist'])
+
+######################################################################
+# Step compression
+######################################################################
+
+def extract_history(ffi_main, ffi_lib, sc):
+    steps = []
+    data = ffi_main.new('struct pull_history_steps[4096]')
+    end_clock = 0xffffffffffffffff
+    while 1:
+        count = ffi_lib.stepcompress_extract_old(sc, data, len(data),
+                                                 0, end_clock)
+        steps.extend([(d.first_clock, d.last_clock, d.start_position,
+                       d.step_count, d.interval, d.add)
+                      for d in data[0:count]])
+        if count < len(data):
+            break
+        end_clock = steps[-1][0]
+    return steps
+
+# Generate and compress the steps of each stream (via the same itersolve
+# and stepcompress code used when printing) and return the host time,
+# step count, and resulting history
+def compress_streams(streams, step_dist):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    total_time = 0.
+    step_count = 0
+    history = []
+    for i, moves in enumerate(streams):
+        sc = ffi_main.gc(ffi_lib.stepcompress_alloc(i),
+                         ffi_lib.stepcompress_free)
+        ffi_lib.stepcompress_fill(sc, MAX_ERROR, 1, 2)
+        # The steppersync is only used to set the print_time to clock rate
+        ss = ffi_main.gc(
+            ffi_lib.steppersync_alloc(ffi_main.NULL, [sc], 1, 16),
+            ffi_lib.steppersync_free)
+        ffi_lib.steppersync_set_time(ss, 0., MCU_FREQ)
+        tq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
+        sk = ffi_main.gc(ffi_lib.cartesian_stepper_alloc(b'x'), ffi_lib.free)
+        ffi_lib.itersolve_set_stepcompress(sk, sc, step_dist)
+        ffi_lib.itersolve_set_trapq(sk, tq)
+        ffi_lib.itersolve_set_position(sk, moves[0][1], 0., 0.)
+        start = time.perf_counter()
+        for print_time, start_pos, end_pos, velocity, accel in moves:
+            accel_t, cruise_t, cruise_v, move_t = calc_move_times(
+                abs(end_pos - start_pos), velocity, accel)
+            axes_r = 1. if end_pos > start_pos else -1.
+            ffi_lib.trapq_append(tq, print_time, accel_t, cruise_t, accel_t,
+                                 start_pos, 0., 0., axes_r, 0., 0.,
+                                 0., cruise_v, accel)
+            # Generate (and periodically flush) steps prior to this move
+            ret = ffi_lib.itersolve_generate_steps(sk, print_time)
+            if ret:
+                raise Exception("Internal error in stepcompress")
+            ffi_lib.trapq_finalize_moves(tq, print_time, 0.)
+        ret = ffi_lib.itersolve_generate_steps(sk, print_time + move_t)
+        if ret:
+            raise Exception("Internal error in stepcompress")
+        ret = ffi_lib.stepcompress_reset(sc, 0)
+        if ret:
+            raise Exception("Internal error in stepcompress")
+        total_time += time.perf_counter() - start
+        steps = extract_history(ffi_main, ffi_lib, sc)
+        step_count += sum([abs(h[3]) for h in steps])
+        history.append(steps)
+    return total_time, step_count, history
+
+def main():
+    usage = "%prog [options] [<movefile>]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-s", "--steppers", type="int", dest="steppers",
+                    default=4, help="number of generated move streams")
+    opts.add_option("-d", "--duration", type="float", dest="duration",
+                    default=5., help="seconds of generated motion")
+    opts.add_option("--step-dist", type="float", dest="step_dist",
+                    default=0.0003125, help="stepper step distance (mm)")
+    opts.add_option("--move-dist", type="float", dest="move_dist",
+                    default=10., help="maximum move distance (mm)")
+    opts.add_option("--velocity", type="float", dest="velocity",
+                    default=500., help="maximum move velocity (mm/s)")
+    opts.add_option("--accel", type="float", dest="accel",
+                    default=20000., help="move acceleration (mm/s^2)")
+    opts.add_option("-r", "--record", type="string", dest="record",
+                    help="store generated move streams in the given file")
+    opts.add_option("-o", "--output", type="string", dest="output",
+                    help="store the compressed steps in the given file")
+    opts.add_option("-c", "--compare", type="string", dest="compare",
+                    help="verify compressed steps match the given file")
+    options, args = opts.parse_args()
+    if len(args) > 1:
+        opts.error("Incorrect number of arguments")
+    step_dist = options.step_dist
+    if args:
+        streams, step_dist = load_streams(args[0])
+    else:
+        streams = generate_streams(options)
+        if options.record:
+            save_streams(options.record, streams, step_dist)
+    host_time, step_count, history = compress_streams(streams, step_dist)
+    msg_count = sum([len(h) for h in history])
+    sys.stdout.write("%d steps compressed to %d queue_step commands in"
+                     " %.4fs (%.1fns per step)\n"
+                     % (step_count, msg_count, host_time,
+                        host_time * 1e9 / step_count))
+    history = numpy.array([h for steps in history for h in steps],
+                          dtype=numpy.int64)
+    if options.output:
+        numpy.save(options.output, history)
+    if options.compare:
+        ref = numpy.load(options.compare)
+        if ref.shape != history.shape or (ref != history).any():
+            sys.stdout.write("Compressed steps do NOT match %s\n"
+                             % (options.compare,))
+            sys.exit(1)
+        sys.stdout.write("Compressed steps identical to %s\n"
+                         % (options.compare,))
+
+if __name__ == '__main__':
+    main()
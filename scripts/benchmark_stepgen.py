@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# Benchmark serial and parallel (thread pool) step generation
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import optparse, os, sys, time, random
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import chelper
+
+MCU_FREQ = 100000000.
+FLUSH_TIME = 0.500
+MAX_ERROR = 2500
+START_POS = 100.
+
+# Fill a trapq with random zig-zag moves on the xy plane
+def fill_trapq(ffi_lib, trapq, duration, velocity, accel):
+    rnd = random.Random(0)
+    print_time = 0.1
+    x = y = START_POS
+    while print_time < duration:
+        nx, ny = rnd.uniform(20., 180.), rnd.uniform(20., 180.)
+        dx, dy = nx - x, ny - y
+        dist = (dx*dx + dy*dy)**.5
+        accel_t = velocity / accel
+        accel_d = .5 * velocity * accel_t
+        if 2. * accel_d > dist:
+            accel_t = (dist / accel)**.5
+            cruise_v = accel * accel_t
+            cruise_t = 0.
+        else:
+            cruise_v = velocity
+            cruise_t = (dist - 2. * accel_d) / velocity
+        ffi_lib.trapq_append(trapq, print_time, accel_t, cruise_t, accel_t,
+                             x, y, 0., dx / dist, dy / dist, 0.,
+                             0., cruise_v, accel)
+        print_time += 2. * accel_t + cruise_t
+        x, y = nx, ny
+    ffi_lib.trapq_append(trapq, print_time, 0.1, 0., 0., x, y, 0.,
+                         1., 0., 0., 0., 0., 0.)
+    return print_time
+
+class Steppers:
+    def __init__(self, trapq, count, step_dist):
+        ffi_main, ffi_lib = chelper.get_ffi()
+        self.ffi_main, self.ffi_lib = ffi_main, ffi_lib
+        self.scs = []
+        self.sks = []
+        for i in range(count):
+            sc = ffi_main.gc(ffi_lib.stepcompress_alloc(i),
+                             ffi_lib.stepcompress_free)
+            ffi_lib.stepcompress_fill(sc, MAX_ERROR, 1, 2)
+            axis = (b'x', b'y')[i % 2]
+            sk = ffi_main.gc(ffi_lib.cartesian_stepper_alloc(axis),
+                             ffi_lib.free)
+            ffi_lib.itersolve_set_stepcompress(sk, sc, step_dist)
+            ffi_lib.itersolve_set_trapq(sk, trapq)
+            ffi_lib.itersolve_set_position(sk, START_POS, START_POS, 0.)
+            self.scs.append(sc)
+            self.sks.append(sk)
+        # The steppersync is only used to set the print_time to clock rate
+        self.ss = ffi_main.gc(ffi_lib.steppersync_alloc(
+            ffi_main.NULL, self.scs, len(self.scs), 16),
+                              ffi_lib.steppersync_free)
+        ffi_lib.steppersync_set_time(self.ss, 0., MCU_FREQ)
+    def summarize(self):
+        # Return the compressed step history of each stepper
+        ffi_main, ffi_lib = self.ffi_main, self.ffi_lib
+        res = []
+        data = ffi_main.new('struct pull_history_steps[4096]')
+        for sc in self.scs:
+            steps = []
+            end_clock = 0xffffffffffffffff
+            while 1:
+                count = ffi_lib.stepcompress_extract_old(sc, data, len(data),
+                                                         0, end_clock)
+                steps.extend([(d.first_clock, d.last_clock,
+                               d.start_position, d.step_count, d.interval,
+                               d.add) for d in data[0:count]])
+                if count < len(data):
+                    break
+                end_clock = steps[-1][0]
+            res.append(steps)
+        return res
+
+def run(options, threads):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    trapq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
+    end_time = fill_trapq(ffi_lib, trapq, options.duration, options.velocity,
+                          options.accel)
+    steppers = Steppers(trapq, options.steppers, options.step_dist)
+    pool = None
+    if threads > 1:
+        pool = ffi_main.gc(ffi_lib.stepgen_pool_alloc(threads - 1),
+                           ffi_lib.stepgen_pool_free)
+    flush_time = 0.
+    start = time.perf_counter()
+    while flush_time < end_time:
+        flush_time = min(flush_time + FLUSH_TIME, end_time + 0.2)
+        if pool is None:
+            for sk in steppers.sks:
+                ret = ffi_lib.itersolve_generate_steps(sk, flush_time)
+                if ret:
+                    raise Exception("Internal error in stepcompress")
+        else:
+            ret = ffi_lib.stepgen_pool_generate(pool, steppers.sks,
+                                                len(steppers.sks), flush_time)
+            if ret:
+                raise Exception("Internal error in stepcompress")
+    host_time = time.perf_counter() - start
+    return host_time / end_time, steppers.summarize()
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-s", "--steppers", type="int", dest="steppers",
+                    default=8, help="number of steppers")
+    opts.add_option("-t", "--threads", type="string", dest="threads",
+                    default="1,2,4", help="comma separated thread counts")
+    opts.add_option("-d", "--duration", type="float", dest="duration",
+                    default=10., help="seconds of motion to generate")
+    opts.add_option("--step-dist", type="float", dest="step_dist",
+                    default=0.0025, help="stepper step distance (mm)")
+    opts.add_option("--velocity", type="float", dest="velocity",
+                    default=300., help="move velocity (mm/s)")
+    opts.add_option("--accel", type="float", dest="accel",
+                    default=10000., help="move acceleration (mm/s^2)")
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    threads = [int(t) for t in options.threads.split(',')]
+    base_time = base_steps = None
+    for t in threads:
+        host_time, steps = run(options, t)
+        if base_steps is None:
+            base_time, base_steps = host_time, steps
+        same = "identical" if steps == base_steps else "MISMATCH"
+        sys.stdout.write("threads=%d: %.4fs host time per second of motion"
+                         " (%.2fx) steps %s\n"
+                         % (t, host_time, base_time / host_time, same))
+        if steps != base_steps:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
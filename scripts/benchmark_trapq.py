@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Benchmark trapq move queuing, history storage, and history extraction
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import optparse, os, sys, time, random, math
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import chelper
+
+MOVE_SIZE = 96 # sizeof(struct move) in chelper/trapq.h
+FLUSH_TIME = 0.500
+FLUSH_DELAY = 0.100
+
+# Generate straight lines that are split into many short segments (as
+# is common in sliced files).  Returns trapq_append() parameters.
+def generate_moves(options):
+    rnd = random.Random(0)
+    moves = []
+    print_time = 0.1
+    x = y = 100.
+    velocity, accel = options.velocity, options.accel
+    while print_time < options.duration:
+        angle = rnd.uniform(0., 2. * math.pi)
+        dist = rnd.uniform(5., 50.)
+        x_r, y_r = math.cos(angle), math.sin(angle)
+        accel_t = velocity / accel
+        accel_d = .5 * velocity * accel_t
+        count = max(3, int(dist / options.segment))
+        seg_d = dist / count
+        if accel_d > seg_d:
+            accel_t = math.sqrt(2. * seg_d / accel)
+            accel_d = seg_d
+        cruise_v = accel * accel_t
+        for i in range(count):
+            start_v = cruise_v
+            a_t = d_t = 0.
+            if not i:
+                a_t, start_v = accel_t, 0.
+            elif i == count - 1:
+                d_t = accel_t
+            cruise_t = (seg_d - (a_t + d_t) * .5 * cruise_v) / cruise_v
+            moves.append((print_time, a_t, cruise_t, d_t, x, y, 0.,
+                          x_r, y_r, 0., start_v, cruise_v, accel))
+            print_time += a_t + cruise_t + d_t
+            x += x_r * seg_d
+            y += y_r * seg_d
+    return moves
+
+def extract_history(ffi_main, ffi_lib, trapq):
+    res = []
+    data = ffi_main.new('struct pull_move[4096]')
+    end_time = 9999999999999999.9
+    while 1:
+        count = ffi_lib.trapq_extract_old(trapq, data, len(data),
+                                          0., end_time)
+        res.extend([(d.print_time, d.move_t, d.start_v, d.accel,
+                     d.start_x, d.start_y, d.x_r, d.y_r)
+                    for d in data[0:count]])
+        if count < len(data):
+            break
+        end_time = res[-1][0]
+    return res
+
+# Return the xy position at a given time from extracted history
+def history_position(history, print_time):
+    for (ptime, move_t, start_v, accel,
+         start_x, start_y, x_r, y_r) in history:
+        if ptime <= print_time:
+            t = min(print_time - ptime, move_t)
+            dist = (start_v + .5 * accel * t) * t
+            return start_x + x_r * dist, start_y + y_r * dist
+    return None
+
+def run(options, moves, compact):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    trapq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
+    ffi_lib.trapq_set_history_compaction(trapq, compact)
+    trapq_append = ffi_lib.trapq_append
+    trapq_finalize_moves = ffi_lib.trapq_finalize_moves
+    # Queue moves and expire them into the history
+    flush_time = FLUSH_TIME
+    start = time.perf_counter()
+    for move in moves:
+        if move[0] > flush_time:
+            trapq_finalize_moves(trapq, flush_time - FLUSH_DELAY,
+                                 flush_time - options.history)
+            flush_time += FLUSH_TIME
+        trapq_append(trapq, *move)
+    end_time = moves[-1][0] + moves[-1][1] + moves[-1][2] + moves[-1][3]
+    trapq_finalize_moves(trapq, end_time, end_time - options.history)
+    queue_time = time.perf_counter() - start
+    # Time extraction of the full history
+    start = time.perf_counter()
+    for i in range(options.extract):
+        history = extract_history(ffi_main, ffi_lib, trapq)
+    extract_time = (time.perf_counter() - start) / options.extract
+    return queue_time, extract_time, history
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-d", "--duration", type="float", dest="duration",
+                    default=120., help="seconds of motion to queue")
+    opts.add_option("--segment", type="float", dest="segment",
+                    default=0.5, help="length of each move segment (mm)")
+    opts.add_option("--velocity", type="float", dest="velocity",
+                    default=150., help="move velocity (mm/s)")
+    opts.add_option("--accel", type="float", dest="accel",
+                    default=3000., help="move acceleration (mm/s^2)")
+    opts.add_option("--history", type="float", dest="history",
+                    default=30., help="seconds of history to keep")
+    opts.add_option("-e", "--extract", type="int", dest="extract",
+                    default=10, help="number of history extractions to time")
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    moves = generate_moves(options)
+    sys.stdout.write("%d moves (%.0f moves per second)\n"
+                     % (len(moves), len(moves) / options.duration))
+    results = {}
+    for compact in [0, 1]:
+        queue_time, extract_time, history = run(options, moves, compact)
+        results[compact] = history
+        sys.stdout.write(
+            "compaction=%d: queue %.4fs (%.0fns per move),"
+            " history %d moves (%.1fKiB), extract %.2fms\n"
+            % (compact, queue_time, queue_time * 1e9 / len(moves),
+               len(history), len(history) * MOVE_SIZE / 1024.,
+               extract_time * 1000.))
+    # Verify the compacted history describes the same motion
+    history, compacted = results[0], results[1]
+    start_time = history[-1][0]
+    end_time = history[0][0] + history[0][1]
+    max_error = 0.
+    for i in range(1000):
+        print_time = start_time + (end_time - start_time) * i / 1000.
+        pos = history_position(history, print_time)
+        cpos = history_position(compacted, print_time)
+        max_error = max(max_error, abs(pos[0] - cpos[0]),
+                        abs(pos[1] - cpos[1]))
+    sys.stdout.write("Maximum position difference of compacted history:"
+                     " %.9fmm\n" % (max_error,))
+    if max_error > .000001:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
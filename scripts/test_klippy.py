@@ -37,6 +37,7 @@ class TestCase:
         config_fname = gcode_fname = dict_fnames = None
         should_fail = multi_tests = False
         gcode = []
+        expect_log = []
         f = open(self.fname, 'r')
         for line in f:
             cpos = line.find('#')
@@ -51,11 +52,13 @@ class TestCase:
                     if not multi_tests:
                         multi_tests = True
                         self.launch_test(config_fname, dict_fnames,
-                                         gcode_fname, gcode, should_fail)
+                                         gcode_fname, gcode, should_fail,
+                                         expect_log)
                 config_fname = self.relpath(parts[1])
                 if multi_tests:
                     self.launch_test(config_fname, dict_fnames,
-                                     gcode_fname, gcode, should_fail)
+                                     gcode_fname, gcode, should_fail,
+                                     expect_log)
             elif parts[0] == "DICTIONARY":
                 dict_fnames = [self.relpath(parts[1], 'dict')]
                 for mcu_dict in parts[2:]:
@@ -66,14 +69,16 @@ class TestCase:
                 gcode_fname = self.relpath(parts[1])
             elif parts[0] == "SHOULD_FAIL":
                 should_fail = True
+            elif parts[0] == "EXPECT_LOG":
+                expect_log.append(line.strip()[len("EXPECT_LOG"):].strip())
             else:
                 gcode.append(line.strip())
         f.close()
         if not multi_tests:
             self.launch_test(config_fname, dict_fnames,
-                             gcode_fname, gcode, should_fail)
+                             gcode_fname, gcode, should_fail, expect_log)
     def launch_test(self, config_fname, dict_fnames, gcode_fname, gcode,
-                    should_fail):
+                    should_fail, expect_log):
         gcode_is_temp = False
         if gcode_fname is None:
             gcode_fname = self.relpath(TEMP_GCODE_FILE, 'temp')
@@ -94,23 +99,33 @@ class TestCase:
                  '-i', gcode_fname, '-o', TEMP_OUTPUT_FILE, '-v' ]
         for df in dict_fnames:
             args += ['-d', df]
-        if not self.verbose:
+        use_log = not self.verbose or expect_log
+        if use_log:
             args += ['-l', TEMP_LOG_FILE]
         res = subprocess.call(args)
         is_fail = (should_fail and not res) or (not should_fail and res)
         if is_fail:
-            if not self.verbose:
+            if use_log:
                 self.show_log()
             if should_fail:
                 raise error("Test failed to raise an error")
             raise error("Error during test")
+        if expect_log:
+            data = self.read_log()
+            if self.verbose:
+                sys.stdout.write(data)
+            for msg in expect_log:
+                if msg not in data:
+                    if not self.verbose:
+                        sys.stdout.write(data)
+                    raise error("Expected log message not found: %s" % (msg,))
         # Do cleanup
         if self.keepfiles:
             return
         for fname in os.listdir(self.tempdir):
             if fname.startswith(TEMP_OUTPUT_FILE):
                 os.unlink(fname)
-        if not self.verbose:
+        if use_log:
             os.unlink(TEMP_LOG_FILE)
         else:
             sys.stderr.write('\n')
@@ -125,11 +140,13 @@ class TestCase:
             logging.exception("Unhandled exception during test run")
             return "internal error"
         return "success"
-    def show_log(self):
+    def read_log(self):
         f = open(TEMP_LOG_FILE, 'r')
         data = f.read()
         f.close()
-        sys.stdout.write(data)
+        return data
+    def show_log(self):
+        sys.stdout.write(self.read_log())
 
 
 ######################################################################
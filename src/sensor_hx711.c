@@ -0,0 +1,163 @@
+// Support for reading samples from hx711 load cell amplifiers
+//
+// Copyright (C) 2026  agent <agent@local>
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+
+#include "basecmd.h" // oid_alloc
+#include "board/gpio.h" // gpio_out_write
+#include "board/irq.h" // irq_disable
+#include "board/misc.h" // timer_read_time
+#include "command.h" // DECL_COMMAND
+#include "sched.h" // DECL_TASK
+#include "sensor_bulk.h" // sensor_bulk_report
+
+enum { HX_PENDING = 1<<0 };
+
+struct hx711 {
+    struct timer timer;
+    uint32_t rest_ticks;
+    struct gpio_in dout;
+    struct gpio_out sclk;
+    uint8_t gain_pulses, flags;
+    struct sensor_bulk sb;
+};
+
+static struct task_wake hx711_wake;
+
+// Check for new hx711 data
+static uint_fast8_t
+hx711_event(struct timer *timer)
+{
+    struct hx711 *hx = container_of(timer, struct hx711, timer);
+    if (hx->flags & HX_PENDING)
+        hx->sb.possible_overflows++;
+    hx->flags |= HX_PENDING;
+    sched_wake_task(&hx711_wake);
+    hx->timer.waketime += hx->rest_ticks;
+    return SF_RESCHEDULE;
+}
+
+void
+command_config_hx711(uint32_t *args)
+{
+    struct hx711 *hx = oid_alloc(args[0], command_config_hx711
+                                 , sizeof(*hx));
+    hx->timer.func = hx711_event;
+    hx->dout = gpio_in_setup(args[1], 0);
+    // Holding sclk high places the chip in power down mode
+    hx->sclk = gpio_out_setup(args[2], 1);
+    hx->gain_pulses = args[3];
+    if (hx->gain_pulses < 1 || hx->gain_pulses > 3)
+        shutdown("Invalid hx711 gain pulses");
+}
+DECL_COMMAND(command_config_hx711, "config_hx711 oid=%c dout_pin=%u"
+             " sclk_pin=%u gain_pulses=%c");
+
+// Short delay to meet the chip's minimum sclk pulse width
+static void
+hx711_delay(void)
+{
+    uint32_t end = timer_read_time() + timer_from_us(1);
+    while (timer_is_before(timer_read_time(), end))
+        ;
+}
+
+#define BYTES_PER_SAMPLE 4
+
+// Clock out a sample (and select the gain of the next sample)
+static void
+hx711_query(struct hx711 *hx, uint8_t oid)
+{
+    // Clear pending flag
+    irq_disable();
+    hx->flags &= ~HX_PENDING;
+    irq_enable();
+
+    // The chip pulls dout low when a sample is ready
+    if (gpio_in_read(hx->dout))
+        return;
+
+    // The chip powers down if sclk is high for more than 60us, so
+    // don't let irqs extend the high part of each pulse
+    uint32_t data = 0;
+    uint_fast8_t i, pulses = 24 + hx->gain_pulses;
+    for (i = 0; i < pulses; i++) {
+        irq_disable();
+        gpio_out_write(hx->sclk, 1);
+        hx711_delay();
+        uint_fast8_t bit = gpio_in_read(hx->dout);
+        gpio_out_write(hx->sclk, 0);
+        irq_enable();
+        hx711_delay();
+        if (i < 24)
+            data = (data << 1) | !!bit;
+    }
+
+    // Store sign extended sample
+    int32_t val = (int32_t)(data << 8) >> 8;
+    uint8_t *d = &hx->sb.data[hx->sb.data_count];
+    d[0] = val;
+    d[1] = val >> 8;
+    d[2] = val >> 16;
+    d[3] = val >> 24;
+    hx->sb.data_count += BYTES_PER_SAMPLE;
+
+    // Flush local buffer if needed
+    if (hx->sb.data_count + BYTES_PER_SAMPLE > ARRAY_SIZE(hx->sb.data))
+        sensor_bulk_report(&hx->sb, oid);
+}
+
+void
+command_query_hx711(uint32_t *args)
+{
+    struct hx711 *hx = oid_lookup(args[0], command_config_hx711);
+
+    sched_del_timer(&hx->timer);
+    hx->flags = 0;
+    if (!args[1]) {
+        // End measurements and power down chip
+        gpio_out_write(hx->sclk, 1);
+        return;
+    }
+
+    // Start new measurements query
+    gpio_out_write(hx->sclk, 0);
+    hx->rest_ticks = args[1];
+    sensor_bulk_reset(&hx->sb);
+    irq_disable();
+    hx->timer.waketime = timer_read_time() + hx->rest_ticks;
+    sched_add_timer(&hx->timer);
+    irq_enable();
+}
+DECL_COMMAND(command_query_hx711, "query_hx711 oid=%c rest_ticks=%u");
+
+void
+command_query_hx711_status(uint32_t *args)
+{
+    struct hx711 *hx = oid_lookup(args[0], command_config_hx711);
+
+    uint32_t time1 = timer_read_time();
+    uint_fast8_t ready = !gpio_in_read(hx->dout);
+    uint32_t time2 = timer_read_time();
+
+    uint32_t fifo = ready ? BYTES_PER_SAMPLE : 0;
+    sensor_bulk_status(&hx->sb, args[0], time1, time2-time1, fifo);
+}
+DECL_COMMAND(command_query_hx711_status, "query_hx711_status oid=%c");
+
+void
+hx711_task(void)
+{
+    if (!sched_check_wake(&hx711_wake))
+        return;
+    uint8_t oid;
+    struct hx711 *hx;
+    foreach_oid(oid, hx, command_config_hx711) {
+        uint_fast8_t flags = hx->flags;
+        if (!(flags & HX_PENDING))
+            continue;
+        hx711_query(hx, oid);
+    }
+}
+DECL_TASK(hx711_task);
@@ -0,0 +1,25 @@
+G90
+G1 X10 Y10 F6000
+G1 X20 Y20
+G1 X30 Y30
+G1 X250 Y40 ; out of range
+G1 X40 Y40
+G1 X41 Y41
+G1 X42 Y42
+G1 X43 Y43
+G1 X44 Y44
+G1 X45 Y45
+G1 X46 Y46
+G1 X47 Y47
+G1 X48 Y48
+G1 X49 Y49
+G1 X50 Y50
+G1 X51 Y51
+G1 X52 Y52
+G1 X53 Y53
+G1 X54 Y54
+G1 X55 Y55
+G1 X56 Y56
+G1 X57 Y57
+G1 X58 Y58
+G1 X59 Y59
@@ -0,0 +1,4 @@
+G90
+G1 X10 Y10 F6000
+G1 X20 Y20
+G1 X30 Y30